@@ -0,0 +1,617 @@
+# benchmark.py - performance checks for mainoperations
+
+import contextlib
+import io
+import itertools
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import diagnostics
+import inventory
+import mainoperations
+import persistence
+import querycache
+import sharding
+import sqlitestore
+import synthetic
+from records import Book, Member
+
+
+# Helpers
+
+def _seed_members(count):
+    """Reset the library and create `count` members plus one book to borrow."""
+    mainoperations.reset_data()
+    for i in range(count):
+        mainoperations.add_member(f"M{i:07d}", f"Member {i}", f"member{i}@library.test")
+    mainoperations.add_book("978-BENCH", "Benchmark Book", "Bench Author", "Fiction", 1)
+
+
+# Checkout latency
+
+def benchmark_checkout_latency(sizes=(1_000, 10_000, 100_000, 200_000), checkouts=2_000):
+    """Time borrow/return pairs against growing member counts.
+
+    Members are picked from the end of the registry, which was the worst case
+    for the old linear member scan. Returns a list of (size, microseconds per
+    checkout) tuples.
+    """
+    results = []
+    for size in sizes:
+        _seed_members(size)
+        member_ids = [f"M{i:07d}" for i in range(max(0, size - checkouts), size)]
+
+        start = time.perf_counter()
+        for member_id in member_ids:
+            mainoperations.borrow_book("978-BENCH", member_id)
+            mainoperations.return_book("978-BENCH", member_id)
+        elapsed = time.perf_counter() - start
+
+        per_checkout_us = elapsed / len(member_ids) * 1_000_000
+        results.append((size, per_checkout_us))
+        print(f"  members={size:>9,} | {per_checkout_us:8.2f} us per borrow+return")
+
+    mainoperations.reset_data()
+    return results
+
+
+# Search latency
+
+def _seed_books(count):
+    """Reset the library and create `count` books with varied titles and authors."""
+    mainoperations.reset_data()
+    words = ("Shadow", "River", "Python", "Empire", "Garden", "Winter", "Engine", "Secret")
+    for i in range(count):
+        title = f"{words[i % 8]} {words[(i // 8) % 8]} Volume {i}"
+        author = f"Author {i % 997}"
+        mainoperations.add_book(f"978-{i:09d}", title, author, "Fiction", 1)
+
+
+def benchmark_search_latency(sizes=(1_000, 10_000, 100_000), query="volume 12345", repeats=200):
+    """Time a selective search_books query against growing catalog sizes.
+
+    Returns a list of (size, microseconds per search) tuples.
+    """
+    results = []
+    for size in sizes:
+        _seed_books(size)
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            mainoperations.search_books(query)
+        elapsed = time.perf_counter() - start
+
+        per_search_us = elapsed / repeats * 1_000_000
+        results.append((size, per_search_us))
+        print(f"  books={size:>9,} | {per_search_us:8.2f} us per search '{query}'")
+
+    mainoperations.reset_data()
+    return results
+
+
+def benchmark_broad_search(sizes=(10_000, 100_000, 300_000), query="e", page=20, repeats=5):
+    """Time a one-letter query: every match copied by search_books vs. the first page of views."""
+    results = []
+    for size in sizes:
+        _seed_books(size)
+        timings = {}
+        for name, run in (("full list", lambda: mainoperations.search_books(query)),
+                          ("first page", lambda: mainoperations.search_page(query, limit=page)),
+                          ("ranked page", lambda: mainoperations.search_page(query, limit=page, ranked=True))):
+            start = time.perf_counter()
+            for _ in range(repeats):
+                run()
+            timings[name] = (time.perf_counter() - start) / repeats * 1000
+        results.append((size, timings))
+        print(f"  books={size:>9,} | " + " | ".join(f"{name} {ms:9.3f} ms" for name, ms in timings.items()))
+
+    mainoperations.reset_data()
+    return results
+
+
+def benchmark_query_cache(size=100_000, distinct_queries=200, lookups=20_000, borrow_every=10, capacity=128):
+    """Time a skewed stream of repeated searches, with and without the query cache.
+
+    Every borrow_every-th step borrows or returns a copy, which invalidates
+    only the cached results that show that book.
+    """
+    _seed_books(size)
+    mainoperations.add_member("M-CACHE", "Cache Reader", "cache@library.test")
+    # Three-digit author numbers, so each query names one author (about size / 997 books)
+    queries = [f"author {100 + i}" for i in range(distinct_queries)]
+    rng = random.Random(size)
+    # Skewed popularity: a few staff favourites dominate the traffic
+    stream = rng.choices(queries, weights=[1 / (rank + 1) for rank in range(distinct_queries)], k=lookups)
+    isbns = list(mainoperations.books)
+
+    results = {}
+    for name in ("uncached", "cached"):
+        cache = querycache.attach_query_cache(capacity) if name == "cached" else None
+        search = cache.search if cache is not None else mainoperations.search_books
+        borrowed = []
+        start = time.perf_counter()
+        for step, query in enumerate(stream):
+            if step % borrow_every == 0:
+                if borrowed:
+                    mainoperations.return_book(borrowed.pop(), "M-CACHE")
+                else:
+                    isbn = rng.choice(isbns)
+                    if mainoperations.borrow_book(isbn, "M-CACHE"):
+                        borrowed.append(isbn)
+            search(query, "author")
+        elapsed = time.perf_counter() - start
+        for isbn in borrowed:
+            mainoperations.return_book(isbn, "M-CACHE")
+
+        results[name] = elapsed / lookups * 1e6
+        line = f"  {name:<8} | {results[name]:8.2f} us per query"
+        if cache is not None:
+            stats = cache.stats()
+            cache.detach()
+            results["stats"] = stats
+            line += (f" | hit rate {stats['hit_rate']:.1%}, {stats['evictions']:,} evictions, "
+                     f"{stats['invalidations']:,} invalidations")
+        print(line)
+
+    mainoperations.reset_data()
+    return results
+
+
+# Restart time
+
+def _load_book_records(count):
+    """Reset the library to `count` books like _seed_books, loaded as records without a search index."""
+    words = ("Shadow", "River", "Python", "Empire", "Garden", "Winter", "Engine", "Secret")
+    state = {"books": {}, "_book_order": {}, "_next_book_order": count}
+    for i in range(count):
+        isbn = f"978-{i:09d}"
+        state["books"][isbn] = Book(f"{words[i % 8]} {words[(i // 8) % 8]} Volume {i}", f"Author {i % 997}", "Fiction", 1)
+        state["_book_order"][isbn] = i
+    mainoperations._import_state(state)
+
+
+def benchmark_restart(sizes=(10_000, 100_000, 1_000_000), tail=1_000, index_limit=100_000):
+    """Time a restart from a snapshot plus a `tail`-record log at several catalog sizes.
+
+    The catalog is loaded as records, leaving its search index to the backlog,
+    so sizes whose full index would not fit in memory can be measured too. Up to
+    index_limit books, the time until the background indexer is done is also
+    reported. Returns a list of (size, seconds to restore, seconds until indexed or None) tuples.
+    """
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            mainoperations.reset_data()
+            store = persistence.open_store(directory, snapshot_every=0)
+            _load_book_records(size)
+            store.snapshot()
+            for i in range(tail):
+                mainoperations.update_book(f"978-{i % size:09d}", total_copies=2)
+            store.close()
+
+            mainoperations.reset_data()
+            start = time.perf_counter()
+            store = persistence.open_store(directory)
+            elapsed = time.perf_counter() - start
+            indexed = None
+            if size <= index_limit:
+                store._indexer.join()
+                indexed = time.perf_counter() - start
+            store.close()
+            mainoperations.reset_data()   # Also stops an indexer still running
+
+        results.append((size, elapsed, indexed))
+        index_note = f" | search index rebuilt after {indexed:.3f} s" if indexed is not None else ""
+        print(f"  books={size:>9,} | {elapsed:8.3f} s to load snapshot and replay {tail:,} records{index_note}")
+
+    return results
+
+
+# Record memory
+
+def _bytes_per_record(make_record, count):
+    """Measure traced allocation per record for `count` records built by make_record(i)."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    records = [make_record(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Ignore the list holding the records; only the records themselves count
+    return (after - before - sys.getsizeof(records)) / count
+
+
+def benchmark_record_memory(count=100_000):
+    """Compare bytes per book and member for the old dict layout and the __slots__ records.
+
+    Titles are unique while authors and genres repeat, as in a real catalog.
+    Members carry two loans each. Returns a dict of bytes-per-record figures.
+    """
+    authors = [f"Author {i}" for i in range(1_000)]
+    genres = mainoperations.GENRES
+
+    def dict_book(i):
+        return {"title": f"Title {i}", "author": f"Author {i % 1_000}", "genre": str(genres[i % 6]),
+                "total_copies": 3, "original_copies": 3}
+
+    def slot_book(i):
+        return Book(f"Title {i}", authors[i % 1_000], genres[i % 6], 3)
+
+    def dict_member(i):
+        return {"member_id": f"M{i:07d}", "name": f"Member {i}", "email": f"m{i}@library.test",
+                "borrowed_books": ["978-000000001", "978-000000002"]}
+
+    def slot_member(i):
+        member = Member(f"M{i:07d}", f"Member {i}", f"m{i}@library.test")
+        member.add_loan("978-000000001")
+        member.add_loan("978-000000002")
+        return member
+
+    results = {
+        "book_dict": _bytes_per_record(dict_book, count),
+        "book_slots": _bytes_per_record(slot_book, count),
+        "member_dict": _bytes_per_record(dict_member, count),
+        "member_slots": _bytes_per_record(slot_member, count),
+    }
+    for kind in ("book", "member"):
+        old, new = results[f"{kind}_dict"], results[f"{kind}_slots"]
+        print(f"  {kind:<6} | dict {old:7.1f} B | slots {new:7.1f} B | {100 * (old - new) / old:5.1f}% smaller")
+    return results
+
+
+# Inventory reports
+
+def benchmark_inventory_reports(sizes=(100_000, 1_000_000), repeats=20):
+    """Time the columnar genre report against the same report as a Python loop.
+
+    Books are loaded straight into the inventory arrays through the listener,
+    so large sizes stay quick to set up. Returns (size, loop ms, columnar ms) tuples.
+    """
+    results = []
+    for size in sizes:
+        _seed_books(size)
+        columns = inventory.attach_inventory()
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            on_loan = {genre: 0 for genre in mainoperations.GENRES}
+            for book in mainoperations.books.values():
+                on_loan[book["genre"]] += book["original_copies"] - book["total_copies"]
+        loop_ms = (time.perf_counter() - start) / repeats * 1000
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            columns.genre_report()
+        columnar_ms = (time.perf_counter() - start) / repeats * 1000
+
+        columns.detach()
+        results.append((size, loop_ms, columnar_ms))
+        print(f"  books={size:>9,} | loop {loop_ms:8.2f} ms | columnar {columnar_ms:8.2f} ms")
+
+    mainoperations.reset_data()
+    return results
+
+
+# Overdue queries
+
+def benchmark_overdue_queries(sizes=(10_000, 100_000, 300_000), top=20, repeats=50):
+    """Time "next N overdue" against a scan of every member's loans."""
+    results = {}
+    for size in sizes:
+        rng = random.Random(size)
+        _seed_members(size)
+        mainoperations.add_book("978-0", "Popular", "Author", "Fiction", size)
+        for member_id in list(mainoperations.members.ids()):
+            mainoperations.borrow_book("978-0", member_id, now=rng.uniform(0, 365 * 86400))
+        as_of = 200 * 86400
+
+        start = time.perf_counter()
+        for _ in range(repeats):
+            mainoperations.overdue_loans(as_of=as_of, limit=top)
+        heap_us = (time.perf_counter() - start) / repeats * 1e6
+
+        start = time.perf_counter()
+        scanned = sorted((mainoperations.get_loan(isbn, member_id)
+                          for member_id, member in mainoperations.members.items()
+                          for isbn in member.borrowed_books),
+                         key=lambda loan: loan.due_at)
+        scanned = [loan for loan in scanned if loan.due_at < as_of][:top]
+        scan_us = (time.perf_counter() - start) * 1e6
+
+        results[size] = heap_us
+        print(f"  loans={size:>9,} | heap {heap_us:10.2f} us | scan {scan_us:12.2f} us for the first {top} overdue")
+    mainoperations.reset_data()
+    return results
+
+
+# Rejection path
+
+def benchmark_rejections(attempts=20_000):
+    """Time rejected checkouts with the print, buffered and quiet diagnostics sinks."""
+    mainoperations.reset_data()
+    mainoperations.add_book("978-0", "Sold Out", "Nobody", "Fiction", 0)
+    mainoperations.add_member("M0", "Reader", "reader@library.test")
+    sinks = [("print", diagnostics.PrintSink()),
+             ("buffered", diagnostics.BufferedSink(stream=io.StringIO())),
+             ("quiet", None)]
+    results = {}
+    for name, sink in sinks:
+        old_sink = mainoperations.set_diagnostics_sink(sink)
+        try:
+            # The print sink writes to a discarded stream so the terminal stays readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                for _ in range(attempts):
+                    mainoperations.borrow_book("978-0", "M0")
+                elapsed = time.perf_counter() - start
+        finally:
+            mainoperations.set_diagnostics_sink(old_sink)
+        results[name] = elapsed / attempts * 1e6
+        print(f"  sink={name:<8} | {results[name]:8.2f} us per rejected borrow")
+    mainoperations.reset_data()
+    return results
+
+
+# SQLite backend
+
+def benchmark_sqlite_backend(sizes=(10_000, 100_000, 300_000), operations=2_000, seed=11):
+    """Compare the in-memory engine with SQLiteLibrary: load time, checkout, search and email lookup."""
+
+    def per_call_us(call, arguments):
+        start = time.perf_counter()
+        for args in arguments:
+            call(*args)
+        return (time.perf_counter() - start) / len(arguments) * 1e6
+
+    results = {}
+    for size in sizes:
+        member_count = max(100, size // 10)
+        rng = random.Random(seed)
+        pairs = [(synthetic.book_isbn(rng.randrange(size)), synthetic.member_id(rng.randrange(member_count)))
+                 for _ in range(operations)]
+        terms = [term for term in synthetic.search_terms(operations // 10, size, seed) if term[1] == "author"]
+        emails = [(row["email"],) for row in itertools.islice(synthetic.generate_members(member_count, seed), 0,
+                                                               member_count, max(1, member_count // 200))]
+        engines = {}
+
+        start = time.perf_counter()
+        synthetic.build_library(size, member_count, seed)
+        engines["memory"] = (time.perf_counter() - start, mainoperations)
+
+        directory = tempfile.TemporaryDirectory()
+        start = time.perf_counter()
+        library = sqlitestore.SQLiteLibrary(os.path.join(directory.name, "library.db"), diagnostics_sink=None)
+        library.import_books(synthetic.generate_books(size, seed))
+        library.import_members(synthetic.generate_members(member_count, seed))
+        engines["sqlite"] = (time.perf_counter() - start, library)
+
+        old_sink = mainoperations.set_diagnostics_sink(None)
+        try:
+            for name, (load_seconds, engine) in engines.items():
+                timings = {
+                    "load_s": load_seconds,
+                    "borrow_us": per_call_us(engine.borrow_book, pairs),
+                    "return_us": per_call_us(engine.return_book, pairs),
+                    "search_us": per_call_us(engine.search_books, terms),
+                    "email_us": per_call_us(engine.find_member_by_email, emails),
+                }
+                results[(size, name)] = timings
+                print(f"  books={size:>9,} {name:<6} | load {timings['load_s']:7.2f} s | "
+                      f"borrow {timings['borrow_us']:8.1f} us | return {timings['return_us']:8.1f} us | "
+                      f"author search {timings['search_us']:9.1f} us | email {timings['email_us']:6.1f} us")
+        finally:
+            mainoperations.set_diagnostics_sink(old_sink)
+            library.close()
+            directory.cleanup()
+            mainoperations.reset_data()
+    return results
+
+
+# Sharded circulation
+
+def benchmark_sharded_circulation(shard_counts=(2, 4), threads=16, book_count=20_000, member_count=5_000,
+                                  ops_per_thread=2_000, seed=3):
+    """Compare borrow/return throughput of one process with ShardedLibrary at several shard counts.
+
+    Shards only pay off with as many free cores as shards: every call crosses
+    a pipe, so on a single core the sharded library is slower.
+    """
+
+    def run(borrow, give_back):
+        def worker(worker_seed):
+            rng = random.Random(worker_seed)
+            for _ in range(ops_per_thread):
+                isbn = synthetic.book_isbn(rng.randrange(book_count))
+                member_id = synthetic.member_id(rng.randrange(member_count))
+                borrow(isbn, member_id)
+                give_back(isbn, member_id)
+
+        workers = [threading.Thread(target=worker, args=(seed + i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return threads * ops_per_thread * 2 / (time.perf_counter() - start)
+
+    results = {}
+    synthetic.build_library(book_count, member_count, seed)
+    old_sink = mainoperations.set_diagnostics_sink(None)
+    try:
+        results[1] = run(mainoperations.borrow_book, mainoperations.return_book)
+    finally:
+        mainoperations.set_diagnostics_sink(old_sink)
+    mainoperations.reset_data()
+    print(f"  single process   | {results[1]:>10,.0f} ops/s")
+    for shard_count in shard_counts:
+        with sharding.ShardedLibrary(shard_count, diagnostics_sink=None) as library:
+            library.import_books(synthetic.generate_books(book_count, seed))
+            library.import_members(synthetic.generate_members(member_count, seed))
+            results[shard_count] = run(library.borrow_book, library.return_book)
+            problems = library.consistency_problems()
+        print(f"  shards={shard_count:<9} | {results[shard_count]:>10,.0f} ops/s | "
+              f"{'CONSISTENT' if not problems else f'{len(problems)} VIOLATION(S)'}")
+    return results
+
+
+# Concurrency stress test
+
+def _check_circulation_invariants():
+    """Return a list of broken copy-count or borrowing-limit invariants (empty if consistent)."""
+    holders = {isbn: 0 for isbn in mainoperations.books}
+    problems = []
+    for member in mainoperations.members.values():
+        if len(member["borrowed_books"]) > mainoperations.MAX_BORROWED_BOOKS:
+            problems.append(f"Member {member['member_id']} holds {len(member['borrowed_books'])} books.")
+        for isbn in member["borrowed_books"]:
+            holders[isbn] += 1
+            if mainoperations.get_loan(isbn, member["member_id"]) is None:
+                problems.append(f"Member {member['member_id']} holds {isbn} without a ledger entry.")
+    for isbn, book in mainoperations.books.items():
+        if book["total_copies"] < 0:
+            problems.append(f"Book {isbn} has {book['total_copies']} copies available.")
+        if book["original_copies"] - book["total_copies"] != holders[isbn]:
+            problems.append(f"Book {isbn} counts {book['original_copies'] - book['total_copies']} loans "
+                            f"but {holders[isbn]} members hold it.")
+    if len(mainoperations._loans) != sum(holders.values()):
+        problems.append(f"Ledger has {len(mainoperations._loans)} loans for {sum(holders.values())} borrowed copies.")
+    for isbn, count in holders.items():
+        if len(mainoperations.holders_of(isbn)) != count:
+            problems.append(f"Holder index lists {len(mainoperations.holders_of(isbn))} members for {isbn}, "
+                            f"but {count} hold it.")
+    waiting = {}
+    for isbn, queue in mainoperations._holds.items():
+        for member_id in queue:
+            waiting.setdefault(member_id, set()).add(isbn)
+            if mainoperations.books[isbn]["total_copies"] > 0 and mainoperations._can_receive(isbn, member_id):
+                problems.append(f"Member {member_id} still waits for {isbn} although a copy is free.")
+    if waiting != mainoperations._member_holds:
+        problems.append("Hold queues and the member hold index disagree.")
+    return problems
+
+
+def stress_test_circulation(threads=8, book_count=20, copies=2, member_count=100, ops_per_thread=5_000, seed=7):
+    """Hammer borrow/return from many threads on a few scarce books, then check the invariants.
+
+    Copies must never go negative, every loan must be held by exactly one
+    member, nobody may exceed the borrowing limit, and no eligible member may
+    be left waiting while a copy is free. Returns the list of
+    violations found (empty means the run was consistent).
+    """
+    mainoperations.reset_data()
+    for i in range(book_count):
+        mainoperations.add_book(f"978-S{i:04d}", f"Stress Book {i}", "Stress Author", "Fiction", copies)
+    for i in range(member_count):
+        mainoperations.add_member(f"S{i:05d}", f"Stress Member {i}", f"stress{i}@library.test")
+    isbns = list(mainoperations.books)
+    member_ids = list(mainoperations.members.ids())
+
+    def worker(worker_seed):
+        rng = random.Random(worker_seed)
+        for _ in range(ops_per_thread):
+            member_id = rng.choice(member_ids)
+            action = rng.random()
+            if action < 0.35:
+                mainoperations.borrow_book(rng.choice(isbns), member_id)
+            elif action < 0.7:
+                mainoperations.return_book(rng.choice(isbns), member_id)
+            elif action < 0.75:
+                mainoperations.place_hold(rng.choice(isbns), member_id)
+            elif action < 0.8:
+                mainoperations.cancel_hold(rng.choice(isbns), member_id)
+            elif action < 0.9:
+                mainoperations.borrow_books(member_id, rng.sample(isbns, 2))
+            else:
+                mainoperations.return_books(member_id, rng.sample(isbns, 2))
+
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads as often as possible to provoke races
+    start = time.perf_counter()
+    # Rejected operations would print an error each; run quiet to keep the report readable
+    old_sink = mainoperations.set_diagnostics_sink(None)
+    try:
+        workers = [threading.Thread(target=worker, args=(seed + i,)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    finally:
+        sys.setswitchinterval(old_interval)
+        mainoperations.set_diagnostics_sink(old_sink)
+    elapsed = time.perf_counter() - start
+
+    problems = _check_circulation_invariants()
+    total_ops = threads * ops_per_thread
+    print(f"  threads={threads} ops={total_ops:,} | {total_ops / elapsed:,.0f} ops/s | "
+          f"{'CONSISTENT' if not problems else f'{len(problems)} VIOLATION(S)'}")
+    for problem in problems[:10]:
+        print(f"    {problem}")
+    mainoperations.reset_data()
+    return problems
+
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("   CHECKOUT LATENCY vs MEMBER COUNT")
+    print("=" * 50)
+    benchmark_checkout_latency()
+
+    print("=" * 50)
+    print("   SEARCH LATENCY vs CATALOG SIZE")
+    print("=" * 50)
+    benchmark_search_latency()
+
+    print("=" * 50)
+    print("   BROAD SEARCH: FULL LIST vs FIRST PAGE")
+    print("=" * 50)
+    benchmark_broad_search()
+
+    print("=" * 50)
+    print("   REPEATED QUERIES: UNCACHED vs QUERY CACHE")
+    print("=" * 50)
+    benchmark_query_cache()
+
+    print("=" * 50)
+    print("   RESTART TIME vs CATALOG SIZE")
+    print("=" * 50)
+    benchmark_restart()
+
+    print("=" * 50)
+    print("   OVERDUE QUERY LATENCY vs LOAN COUNT")
+    print("=" * 50)
+    benchmark_overdue_queries()
+
+    print("=" * 50)
+    print("   IN-MEMORY ENGINE vs SQLITE BACKEND")
+    print("=" * 50)
+    benchmark_sqlite_backend()
+
+    print("=" * 50)
+    print("   CIRCULATION THROUGHPUT: ONE PROCESS vs SHARDS")
+    print("=" * 50)
+    benchmark_sharded_circulation()
+
+    print("=" * 50)
+    print("   REJECTED CHECKOUT COST PER DIAGNOSTICS SINK")
+    print("=" * 50)
+    benchmark_rejections()
+
+    print("=" * 50)
+    print("   BYTES PER RECORD: dict vs __slots__")
+    print("=" * 50)
+    benchmark_record_memory()
+
+    if inventory.np is not None:
+        print("=" * 50)
+        print("   GENRE REPORT: Python loop vs NumPy columns")
+        print("=" * 50)
+        benchmark_inventory_reports()
+
+    print("=" * 50)
+    print("   CONCURRENT CIRCULATION STRESS TEST")
+    print("=" * 50)
+    stress_test_circulation()
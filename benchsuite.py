@@ -0,0 +1,535 @@
+# benchsuite.py - scalable performance suite with JSON output and regression thresholds
+#
+# For each scale tier (books, members) the suite builds a synthetic library
+# (synthetic.py), then runs a seeded mixed workload that calls every public
+# mainoperations entry point, timing each call. The report gives ops/sec and
+# latency percentiles per operation as JSON, and lists regressions: absolute
+# limits from a thresholds file, and operations whose latency grows much faster
+# than the catalog between the smallest and largest tier (a scaling cliff).
+#
+#   python benchsuite.py --tiers 10k:1k,100k:10k --ops 20000 --output bench.json
+#
+# Thresholds file (all keys optional):
+#   {"max_scaling_ratio": 5.0,
+#    "operations": {"borrow_book": {"p99_us": 500, "min_ops_per_sec": 20000, "max_scaling_ratio": 3.0},
+#                   "search_page": {"max_scaling_ratio": "linear"}}}
+
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import time
+
+import mainoperations
+import synthetic
+
+# Relative frequency of each operation in the mixed workload (read-heavy, like a branch library)
+WORKLOAD_MIX = {
+    "search_page": 15, "count_matches": 3, "search_books": 2, "iter_search": 2, "facet_search": 3,
+    "find_member_by_email": 5, "get_loan": 3, "holders_of": 2, "overdue_loans": 2, "next_due": 1,
+    "borrow_book": 18, "return_book": 16, "borrow_books": 3, "return_books": 3, "bulk_return": 2,
+    "place_hold": 3, "cancel_hold": 1, "hold_position": 2, "hold_queue": 1, "member_holds": 1,
+    "add_book": 3, "update_book": 3, "delete_book": 2,
+    "add_member": 2, "update_member": 2, "delete_member": 1,
+}
+
+# Share of the catalog that is in high demand; borrows and holds concentrate on it
+HOT_FRACTION = 0.01
+
+# Share of the hot titles fully lent out before timing starts, so holds have titles to wait for
+DRAINED_FRACTION = 0.25
+
+# Headroom over the catalog growth for "linear" limits: per-item costs rise a little
+# as posting sets outgrow the CPU caches, and ordering the matches adds a log factor
+LINEAR_SLACK = 2.0
+
+DEFAULT_THRESHOLDS = {
+    "max_scaling_ratio": 5.0,
+    "operations": {
+        # search_books returns every match, so its cost grows with the catalog by design
+        "search_books": {"max_scaling_ratio": None},
+        # The other searches intersect n-gram posting sets, whose size follows the catalog;
+        # "linear" allows growth up to LINEAR_SLACK times the catalog growth between tiers
+        "search_page": {"max_scaling_ratio": "linear"},
+        "count_matches": {"max_scaling_ratio": "linear"},
+        "iter_search": {"max_scaling_ratio": "linear"},
+        "facet_search": {"max_scaling_ratio": "linear"},
+    },
+}
+
+# Operations with fewer timed calls than this are not checked for scaling (too noisy)
+MIN_SAMPLES_FOR_SCALING = 50
+
+
+class _Pool:
+    """Set of items with O(1) add, remove and uniform random choice."""
+
+    def __init__(self):
+        self.items = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item):
+        if item not in self.positions:
+            self.positions[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        position = self.positions.pop(item, None)
+        if position is None:
+            return
+        last = self.items.pop()
+        if position < len(self.items):
+            self.items[position] = last
+            self.positions[last] = position
+
+    def choice(self, rng):
+        return self.items[rng.randrange(len(self.items))] if self.items else None
+
+
+class _Workload:
+    """Seeded generator of realistic calls against the current library, one method per operation.
+
+    Each method performs one call and returns whether it succeeded, or None
+    when there is nothing to call it on yet (such calls are not timed); the
+    workload tracks the loans, holds and records it created so later calls
+    mostly hit valid targets.
+    """
+
+    def __init__(self, book_count, member_count, seed):
+        self.rng = random.Random(seed)
+        self.isbns = list(mainoperations.books)
+        self.member_ids = list(mainoperations.members.ids())
+        self.emails = [mainoperations.members[member_id].email for member_id in self.member_ids]
+        self.hot = self.isbns[:max(1, int(len(self.isbns) * HOT_FRACTION))]
+        self.terms = synthetic.search_terms(1000, book_count, seed)
+        self.loans = _Pool()
+        self.holds = _Pool()
+        self.lent_out = _Pool()
+        self.waiting = {}
+        self.waiting_by_member = {}
+        self.new_books = _Pool()
+        self.new_members = _Pool()
+        self.serial = itertools.count()
+        self.as_of = time.time() + (mainoperations.LOAN_PERIOD_DAYS + 1) * 86400
+        self._drain(self.hot[:max(1, int(len(self.hot) * DRAINED_FRACTION))])
+
+    def _drain(self, isbns):
+        """Lend every copy of some hot titles (untimed setup), so holds can be placed on them."""
+        borrowers = (self.member_ids[index % len(self.member_ids)] for index in itertools.count())
+        for isbn in isbns:
+            for _ in range(len(self.member_ids)):
+                if mainoperations.books[isbn].total_copies == 0:
+                    break
+                member_id = next(borrowers)
+                if mainoperations.borrow_book(isbn, member_id):
+                    self.loans.add((isbn, member_id))
+            self._track(isbn)
+
+    # Helpers
+
+    def _member(self):
+        return self.member_ids[self.rng.randrange(len(self.member_ids))]
+
+    def _isbn(self):
+        # Half of all demand goes to the hot titles
+        pool = self.hot if self.rng.random() < 0.5 else self.isbns
+        return pool[self.rng.randrange(len(pool))]
+
+    def _term(self):
+        return self.terms[self.rng.randrange(len(self.terms))]
+
+    def _track(self, isbn):
+        """Keep lent_out in step with whether a title has no copy left."""
+        book = mainoperations.books.get(isbn)
+        if book is not None and book.total_copies == 0:
+            self.lent_out.add(isbn)
+        else:
+            self.lent_out.discard(isbn)
+
+    def _forget_hold(self, isbn, member_id):
+        self.holds.discard((isbn, member_id))
+        self.waiting.get(isbn, set()).discard(member_id)
+        self.waiting_by_member.get(member_id, set()).discard(isbn)
+
+    def _returned(self, pairs):
+        """Record returned loans, and the holds they handed off, which are loans now."""
+        for isbn, member_id in pairs:
+            self.loans.discard((isbn, member_id))
+        for isbn, member_id in pairs:
+            handed = [(isbn, waiter) for waiter in self.waiting.get(isbn, ())]
+            handed += [(waited, member_id) for waited in self.waiting_by_member.get(member_id, ())]
+            for pair in handed:
+                member = mainoperations.members.get(pair[1])
+                if member is not None and pair[0] in member.borrowed_books:
+                    self._forget_hold(*pair)
+                    self.loans.add(pair)
+                    self._track(pair[0])
+            self._track(isbn)
+
+    # Queries
+
+    def search_page(self):
+        query, by = self._term()
+        mainoperations.search_page(query, by, limit=20, ranked=self.rng.random() < 0.3)
+        return True
+
+    def count_matches(self):
+        query, by = self._term()
+        mainoperations.count_matches(query, by)
+        return True
+
+    def search_books(self):
+        query, by = self._term()
+        mainoperations.search_books(query, by)
+        return True
+
+    def iter_search(self):
+        query, by = self._term()
+        for _ in itertools.islice(mainoperations.iter_search(query, by, page_size=25), 50):
+            pass
+        return True
+
+    def facet_search(self):
+        query, by = self._term()
+        genres = [self.rng.choice(mainoperations.GENRES)] if self.rng.random() < 0.5 else None
+        mainoperations.facet_search(query, by, genres=genres, available=self.rng.random() < 0.5 or None)
+        return True
+
+    def find_member_by_email(self):
+        return mainoperations.find_member_by_email(self.emails[self.rng.randrange(len(self.emails))]) is not None
+
+    def get_loan(self):
+        pair = self.loans.choice(self.rng)
+        return None if pair is None else mainoperations.get_loan(*pair) is not None
+
+    def holders_of(self):
+        mainoperations.holders_of(self.hot[self.rng.randrange(len(self.hot))])
+        return True
+
+    def overdue_loans(self):
+        mainoperations.overdue_loans(as_of=self.as_of, limit=20)
+        return True
+
+    def next_due(self):
+        mainoperations.next_due(20)
+        return True
+
+    def hold_position(self):
+        pair = self.holds.choice(self.rng)
+        return None if pair is None else mainoperations.hold_position(*pair) is not None
+
+    def hold_queue(self):
+        mainoperations.hold_queue(self.hot[self.rng.randrange(len(self.hot))])
+        return True
+
+    def member_holds(self):
+        mainoperations.member_holds(self._member())
+        return True
+
+    # Circulation
+
+    def borrow_book(self):
+        isbn, member_id = self._isbn(), self._member()
+        if mainoperations.borrow_book(isbn, member_id):
+            self.loans.add((isbn, member_id))
+            self._forget_hold(isbn, member_id)
+            self._track(isbn)
+            return True
+        return False
+
+    def return_book(self):
+        pair = self.loans.choice(self.rng)
+        if pair is None:
+            return None
+        success = mainoperations.return_book(*pair)
+        self._returned([pair])
+        return success
+
+    def borrow_books(self):
+        member_id = self._member()
+        isbns = list({self._isbn(), self._isbn()})
+        success, _ = mainoperations.borrow_books(member_id, isbns)
+        if success:
+            for isbn in isbns:
+                self.loans.add((isbn, member_id))
+                self._forget_hold(isbn, member_id)
+                self._track(isbn)
+        return success
+
+    def return_books(self):
+        pair = self.loans.choice(self.rng)
+        if pair is None:
+            return None
+        member = mainoperations.members.get(pair[1])
+        isbns = list(member.borrowed_books) if member is not None else [pair[0]]
+        success, _ = mainoperations.return_books(pair[1], isbns)
+        if success:
+            self._returned([(isbn, pair[1]) for isbn in isbns])
+        return success
+
+    def bulk_return(self):
+        pairs = list({self.loans.choice(self.rng) for _ in range(5)} - {None})
+        if not pairs:
+            return None
+        success, _ = mainoperations.bulk_return(pairs)
+        self._returned(pairs)
+        return success
+
+    # Holds
+
+    def place_hold(self):
+        # Holds are only accepted on titles with no copy left
+        isbn, member_id = self.lent_out.choice(self.rng), self._member()
+        if isbn is None:
+            return None
+        if mainoperations.place_hold(isbn, member_id):
+            self.holds.add((isbn, member_id))
+            self.waiting.setdefault(isbn, set()).add(member_id)
+            self.waiting_by_member.setdefault(member_id, set()).add(isbn)
+            return True
+        return False
+
+    def cancel_hold(self):
+        pair = self.holds.choice(self.rng)
+        if pair is None:
+            return None
+        self._forget_hold(*pair)
+        return mainoperations.cancel_hold(*pair)
+
+    # Catalog and registry changes
+
+    def add_book(self):
+        isbn = f"978-B{next(self.serial):09d}"
+        query, _ = self._term()
+        if mainoperations.add_book(isbn, f"New {query.title()}", "Bench Author", "Fiction", 2):
+            self.new_books.add(isbn)
+            return True
+        return False
+
+    def update_book(self):
+        isbn = self.isbns[self.rng.randrange(len(self.isbns))]
+        if self.rng.random() < 0.5:
+            return mainoperations.update_book(isbn, genre=mainoperations.GENRES[self.rng.randrange(6)])
+        query, _ = self._term()
+        return mainoperations.update_book(isbn, title=f"Revised {query.title()} {next(self.serial)}")
+
+    def delete_book(self):
+        isbn = self.new_books.choice(self.rng)
+        if isbn is None:
+            return None
+        self.new_books.discard(isbn)
+        return mainoperations.delete_book(isbn)
+
+    def add_member(self):
+        serial = next(self.serial)
+        member_id = f"B{serial:09d}"
+        if mainoperations.add_member(member_id, "Bench Member", f"bench.{serial}@example.test"):
+            self.new_members.add(member_id)
+            return True
+        return False
+
+    def update_member(self):
+        return mainoperations.update_member(self._member(), name=f"Renamed Member {next(self.serial)}")
+
+    def delete_member(self):
+        member_id = self.new_members.choice(self.rng)
+        if member_id is None:
+            return None
+        self.new_members.discard(member_id)
+        return mainoperations.delete_member(member_id)
+
+
+# Measurement
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def _summarize(latencies_ns, successes):
+    """Turn one operation's latencies (ns) into its report entry."""
+    latencies_ns.sort()
+    total_seconds = sum(latencies_ns) / 1e9
+    return {
+        "count": len(latencies_ns),
+        "succeeded": successes,
+        "ops_per_sec": round(len(latencies_ns) / total_seconds, 1) if total_seconds else 0.0,
+        "p50_us": round(_percentile(latencies_ns, 0.50) / 1000, 3),
+        "p90_us": round(_percentile(latencies_ns, 0.90) / 1000, 3),
+        "p99_us": round(_percentile(latencies_ns, 0.99) / 1000, 3),
+        "max_us": round((latencies_ns[-1] if latencies_ns else 0) / 1000, 3),
+    }
+
+
+def run_tier(book_count, member_count, operations=20_000, seed=0, mix=None):
+    """Build a synthetic library of the given size and time a mixed workload on it.
+
+    Returns a dict with the load time, overall throughput and one entry per operation.
+    """
+    mix = mix or WORKLOAD_MIX
+    start = time.perf_counter()
+    synthetic.build_library(book_count, member_count, seed)
+    load_seconds = time.perf_counter() - start
+
+    old_sink = mainoperations.set_diagnostics_sink(None)
+    try:
+        workload = _Workload(book_count, member_count, seed)
+        names = list(mix)
+        calls = [getattr(workload, name) for name in names]
+        cumulative = list(itertools.accumulate(mix[name] for name in names))
+        latencies = [[] for _ in names]
+        successes = [0] * len(names)
+        rng = random.Random(f"mix-{seed}")
+        clock = time.perf_counter_ns
+
+        start = time.perf_counter()
+        for chosen in rng.choices(range(len(names)), cum_weights=cumulative, k=operations):
+            call = calls[chosen]
+            began = clock()
+            ok = call()
+            elapsed = clock() - began
+            if ok is None:
+                continue
+            latencies[chosen].append(elapsed)
+            successes[chosen] += bool(ok)
+        wall_seconds = time.perf_counter() - start
+    finally:
+        mainoperations.set_diagnostics_sink(old_sink)
+
+    every_call = sorted(itertools.chain.from_iterable(latencies))
+    report = {
+        "books": book_count,
+        "members": member_count,
+        "load_seconds": round(load_seconds, 3),
+        "operations": operations,
+        "wall_seconds": round(wall_seconds, 3),
+        "ops_per_sec": round(operations / wall_seconds, 1),
+        "p50_us": round(_percentile(every_call, 0.50) / 1000, 3),
+        "p99_us": round(_percentile(every_call, 0.99) / 1000, 3),
+        "by_operation": {name: _summarize(latencies[index], successes[index])
+                         for index, name in enumerate(names) if latencies[index]},
+    }
+    mainoperations.reset_data()
+    return report
+
+
+# Regression checks
+
+def _merge_thresholds(thresholds):
+    merged = {"max_scaling_ratio": DEFAULT_THRESHOLDS["max_scaling_ratio"],
+              "operations": {name: dict(limits) for name, limits in DEFAULT_THRESHOLDS["operations"].items()}}
+    if thresholds:
+        if "max_scaling_ratio" in thresholds:
+            merged["max_scaling_ratio"] = thresholds["max_scaling_ratio"]
+        for name, limits in thresholds.get("operations", {}).items():
+            merged["operations"].setdefault(name, {}).update(limits)
+    return merged
+
+
+def check_regressions(tiers, thresholds=None):
+    """Return a list of regression descriptions for the tier reports (empty if all limits hold).
+
+    Absolute limits (p50_us, p90_us, p99_us, max_us, min_ops_per_sec) apply to
+    every tier. The scaling check compares each operation's p50 between the
+    smallest and largest tier against the growth of the catalog: a ratio above
+    max_scaling_ratio flags latency that grows with library size. A limit of
+    "linear" allows growth proportional to the catalog, with LINEAR_SLACK
+    headroom; None disables the check.
+    """
+    limits = _merge_thresholds(thresholds)
+    regressions = []
+    for tier in tiers:
+        label = f"{tier['books']} books / {tier['members']} members"
+        for name, result in tier["by_operation"].items():
+            op_limits = limits["operations"].get(name, {})
+            for metric in ("p50_us", "p90_us", "p99_us", "max_us"):
+                if metric in op_limits and result[metric] > op_limits[metric]:
+                    regressions.append(f"{name} at {label}: {metric} {result[metric]} > {op_limits[metric]}")
+            if "min_ops_per_sec" in op_limits and result["ops_per_sec"] < op_limits["min_ops_per_sec"]:
+                regressions.append(f"{name} at {label}: ops_per_sec {result['ops_per_sec']} "
+                                   f"< {op_limits['min_ops_per_sec']}")
+
+    if len(tiers) >= 2:
+        smallest = min(tiers, key=lambda tier: tier["books"] + tier["members"])
+        largest = max(tiers, key=lambda tier: tier["books"] + tier["members"])
+        for name, small in smallest["by_operation"].items():
+            large = largest["by_operation"].get(name)
+            ratio_limit = limits["operations"].get(name, {}).get("max_scaling_ratio", limits["max_scaling_ratio"])
+            if ratio_limit == "linear":
+                ratio_limit = round(LINEAR_SLACK * largest["books"] / max(1, smallest["books"]), 1)
+            if (large is None or ratio_limit is None or small["p50_us"] <= 0
+                    or min(small["count"], large["count"]) < MIN_SAMPLES_FOR_SCALING):
+                continue
+            ratio = large["p50_us"] / small["p50_us"]
+            if ratio > ratio_limit:
+                regressions.append(f"{name}: p50 grew {ratio:.1f}x from {smallest['books']} to {largest['books']} "
+                                   f"books (limit {ratio_limit}x)")
+    return regressions
+
+
+def run_suite(tiers, operations=20_000, seed=0, thresholds=None):
+    """Run every tier and return the full report: environment, tier results and regressions."""
+    results = [run_tier(books, members, operations, seed) for books, members in tiers]
+    return {
+        "suite": "mainoperations",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "tiers": results,
+        "regressions": check_regressions(results, thresholds),
+    }
+
+
+# Command line
+
+def _parse_count(text):
+    """Parse 10000, 10k or 1M."""
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def parse_tiers(text):
+    """Parse "10k:1k,100k:10k" into [(10000, 1000), (100000, 10000)]."""
+    tiers = []
+    for part in text.split(","):
+        books, _, members = part.partition(":")
+        tiers.append((_parse_count(books), _parse_count(members or books)))
+    return tiers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every mainoperations entry point at several library sizes.")
+    parser.add_argument("--tiers", default="10k:1k,100k:10k",
+                        help="Comma-separated books:members sizes, e.g. 10k:1k,1M:100k,10M:1M.")
+    parser.add_argument("--ops", type=int, default=20_000, help="Operations in the mixed workload per tier.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--thresholds", help="JSON file with regression limits.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args(argv)
+
+    thresholds = None
+    if args.thresholds:
+        with open(args.thresholds, encoding="utf-8") as source:
+            thresholds = json.load(source)
+
+    report = run_suite(parse_tiers(args.tiers), args.ops, args.seed, thresholds)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as target:
+            target.write(text + "\n")
+    else:
+        print(text)
+    for regression in report["regressions"]:
+        print(f"REGRESSION: {regression}", file=sys.stderr)
+    return 1 if report["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
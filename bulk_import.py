@@ -0,0 +1,222 @@
+# bulk_import.py - streaming CSV / JSONL loaders for books and members
+#
+# Rows flow through a generator pipeline (read -> batch -> validate -> insert),
+# so memory stays constant no matter how large the file is. Rejected rows are
+# collected into a report instead of being printed. The batching, report and
+# validation stages are public so the other backends (sqlitestore, sharding)
+# load rows the same way.
+
+import csv
+import json
+import os
+from itertools import islice
+
+import mainoperations
+
+BOOK_FIELDS = ("isbn", "title", "author", "genre", "total_copies")
+MEMBER_FIELDS = ("member_id", "name", "email")
+
+
+# Pipeline stages
+
+def _detect_format(path, file_format):
+    """Work out "csv" or "jsonl" from an explicit format or the file extension."""
+    if file_format is not None:
+        return file_format.lower()
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    return "csv"
+
+
+def _read_rows(path, file_format):
+    """Yield (line number, row dictionary) for every data row of a CSV or JSONL file."""
+    with open(path, newline="", encoding="utf-8") as source:
+        if file_format == "jsonl":
+            for line_number, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as error:
+                    row = {"_error": f"Invalid JSON: {error.msg}"}
+                if not isinstance(row, dict):
+                    row = {"_error": "Each JSONL line must be an object."}
+                yield line_number, row
+        elif file_format == "csv":
+            reader = csv.DictReader(source)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            raise ValueError(f"Unsupported import format '{file_format}'. Use 'csv' or 'jsonl'.")
+
+
+def batched(rows, batch_size):
+    """Group an iterator of rows into lists of at most batch_size rows."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def new_report():
+    """Return an empty import report."""
+    return {"accepted": 0, "rejected": 0, "rejects": []}
+
+
+def reject(report, max_rejects, line_number, key, reason):
+    """Count a rejected row, keeping at most max_rejects details in the report."""
+    report["rejected"] += 1
+    if len(report["rejects"]) < max_rejects:
+        report["rejects"].append({"line": line_number, "key": key, "reason": reason})
+
+
+def _missing_fields(row, fields):
+    return [field for field in fields if row.get(field) in (None, "")]
+
+
+# Books
+
+def validate_book_batch(batch, report, max_rejects, existing_isbns=None):
+    """Return the valid book rows of a batch as insert-ready tuples.
+
+    existing_isbns holds the ISBNs already stored (default: the in-memory catalog).
+    """
+    existing_isbns = mainoperations.books if existing_isbns is None else existing_isbns
+    accepted = []
+    seen_isbns = set()
+    for line_number, row in batch:
+        isbn = row.get("isbn")
+        if "_error" in row:
+            reject(report, max_rejects, line_number, isbn, row["_error"])
+            continue
+        missing = _missing_fields(row, BOOK_FIELDS)
+        if missing:
+            reject(report, max_rejects, line_number, isbn, f"Missing fields: {', '.join(missing)}.")
+            continue
+
+        isbn = str(isbn).strip()
+        if isbn in existing_isbns or isbn in seen_isbns:
+            reject(report, max_rejects, line_number, isbn, "Duplicate ISBN.")
+            continue
+        genre = str(row["genre"]).strip()
+        if not mainoperations.is_valid_genre(genre):
+            reject(report, max_rejects, line_number, isbn, f"Invalid genre '{genre}'.")
+            continue
+        try:
+            total_copies = int(row["total_copies"])
+        except (TypeError, ValueError):
+            total_copies = -1
+        if total_copies < 0 or isinstance(row["total_copies"], (bool, float)):
+            reject(report, max_rejects, line_number, isbn, "Total copies must be a non-negative integer.")
+            continue
+
+        seen_isbns.add(isbn)
+        accepted.append((isbn, str(row["title"]), str(row["author"]), genre, total_copies))
+    return accepted
+
+
+def import_books(path, file_format=None, batch_size=5_000, max_rejects=1_000):
+    """Stream books from a CSV or JSONL file into the catalog.
+
+    Expected columns/keys: isbn, title, author, genre, total_copies. Rows are
+    validated a batch at a time (genre, copy count, ISBN unique against the
+    catalog and the rest of the batch) and valid rows are inserted without
+    printing. Returns a report: {"accepted": n, "rejected": n, "rejects": [...]},
+    where rejects holds up to max_rejects {"line", "key", "reason"} entries.
+    """
+    return _load_books(_read_rows(path, _detect_format(path, file_format)), batch_size, max_rejects)
+
+
+def import_book_rows(rows, batch_size=5_000, max_rejects=1_000):
+    """Load books from an iterable of row dictionaries (e.g. a generator), like import_books.
+
+    A reject's "line" is the row's 1-based position in the iterable.
+    """
+    return _load_books(enumerate(rows, start=1), batch_size, max_rejects)
+
+
+def _load_books(rows, batch_size, max_rejects):
+    """Validate and insert (line number, row) pairs a batch at a time; return the report."""
+    report = new_report()
+    for batch in batched(rows, batch_size):
+        # Hold the catalog lock per batch so validation and inserts see the same catalog
+        with mainoperations._catalog_lock:
+            for book in validate_book_batch(batch, report, max_rejects):
+                mainoperations._insert_book(*book)
+                report["accepted"] += 1
+    return report
+
+
+# Members
+
+def validate_member_batch(batch, report, max_rejects, existing_ids=None, existing_emails=None,
+                          accepted_lines=None):
+    """Return the valid member rows of a batch as insert-ready tuples.
+
+    existing_ids and existing_emails (lowercased) hold what is already stored
+    (default: the in-memory registry). accepted_lines, if a list, receives
+    the line number of every accepted row.
+    """
+    existing_ids = mainoperations.members if existing_ids is None else existing_ids
+    existing_emails = mainoperations._member_emails if existing_emails is None else existing_emails
+    accepted = []
+    seen_ids = set()
+    seen_emails = set()
+    for line_number, row in batch:
+        member_id = row.get("member_id")
+        if "_error" in row:
+            reject(report, max_rejects, line_number, member_id, row["_error"])
+            continue
+        missing = _missing_fields(row, MEMBER_FIELDS)
+        if missing:
+            reject(report, max_rejects, line_number, member_id, f"Missing fields: {', '.join(missing)}.")
+            continue
+
+        member_id = str(member_id).strip()
+        if member_id in existing_ids or member_id in seen_ids:
+            reject(report, max_rejects, line_number, member_id, "Duplicate member ID.")
+            continue
+        email = str(row["email"]).strip()
+        email_key = mainoperations.email_key(email)
+        if email_key in existing_emails or email_key in seen_emails:
+            reject(report, max_rejects, line_number, member_id, f"Email {email} is already registered.")
+            continue
+
+        seen_ids.add(member_id)
+        seen_emails.add(email_key)
+        accepted.append((member_id, str(row["name"]), email))
+        if accepted_lines is not None:
+            accepted_lines.append(line_number)
+    return accepted
+
+
+def import_members(path, file_format=None, batch_size=5_000, max_rejects=1_000):
+    """Stream members from a CSV or JSONL file into the registry.
+
+    Expected columns/keys: member_id, name, email. Member IDs and emails must
+    be unique against the registry and the rest of the file. Returns the same
+    report structure as import_books.
+    """
+    return _load_members(_read_rows(path, _detect_format(path, file_format)), batch_size, max_rejects)
+
+
+def import_member_rows(rows, batch_size=5_000, max_rejects=1_000, accepted_lines=None):
+    """Load members from an iterable of row dictionaries (e.g. a generator), like import_members.
+
+    accepted_lines, if a list, receives the 1-based position of every row accepted.
+    """
+    return _load_members(enumerate(rows, start=1), batch_size, max_rejects, accepted_lines)
+
+
+def _load_members(rows, batch_size, max_rejects, accepted_lines=None):
+    """Validate and insert (line number, row) pairs a batch at a time; return the report."""
+    report = new_report()
+    for batch in batched(rows, batch_size):
+        with mainoperations._catalog_lock:
+            for member in validate_member_batch(batch, report, max_rejects, accepted_lines=accepted_lines):
+                mainoperations._insert_member(*member)
+                report["accepted"] += 1
+    return report
@@ -0,0 +1,261 @@
+# changefeed.py - change-data-capture stream of library mutations
+#
+# ChangeFeed turns every successful mainoperations mutation into typed
+# ChangeEvents with consecutive offsets and keeps the most recent ones in a
+# bounded in-memory log. Consumers subscribe with an offset to start from,
+# poll batches of events and remember the offset they reached, so a consumer
+# that restarts resumes where it left off instead of rescanning the catalog.
+#
+# Book and member events carry the record as it is after the change, and loan
+# events the copies left, so a mirror can apply them without reading back.
+#
+# Backpressure: a subscription lets at most max_lag events pile up unread. A
+# blocking subscription makes mutations wait (up to block_timeout) while it is
+# that far behind; a non-blocking one only risks falling off the retained log,
+# after which poll raises OffsetOutOfRange and the consumer must resynchronize
+# from a full scan. Mutations run listeners while holding their locks, so a
+# thread consuming a blocking subscription must not itself change the library.
+
+import threading
+import time
+from collections import deque
+
+import mainoperations
+
+# Event types
+BOOK_ADDED = "book.added"
+BOOK_UPDATED = "book.updated"
+BOOK_DELETED = "book.deleted"
+MEMBER_ADDED = "member.added"
+MEMBER_UPDATED = "member.updated"
+MEMBER_DELETED = "member.deleted"
+LOAN_STARTED = "loan.started"
+LOAN_ENDED = "loan.ended"
+HOLD_PLACED = "hold.placed"
+HOLD_CANCELLED = "hold.cancelled"
+LIBRARY_RESET = "library.reset"    # Everything was replaced: consumers must rescan
+
+
+class OffsetOutOfRange(Exception):
+    """Raised by poll() when the subscription's offset is no longer (or not yet) in the retained log."""
+
+    def __init__(self, offset, first, end):
+        super().__init__(f"Offset {offset} is outside the retained change log [{first}, {end}).")
+        self.offset = offset
+        self.first = first
+        self.end = end
+
+
+class ChangeEvent:
+    """One change: its offset in the feed, type, key (ISBN or member ID), data and time (epoch seconds)."""
+
+    __slots__ = ("offset", "type", "key", "data", "timestamp")
+
+    def __init__(self, offset, type, key, data, timestamp):
+        self.offset = offset
+        self.type = type
+        self.key = key
+        self.data = data
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"ChangeEvent({self.offset}, {self.type!r}, {self.key!r}, {self.data!r})"
+
+
+# Building events from mainoperations notifications (called while the mutation holds its locks)
+
+def _book_image(isbn):
+    return {"isbn": isbn, **mainoperations.books[isbn]}
+
+
+def _member_image(member_id):
+    member = mainoperations.members[member_id]
+    return {"member_id": member_id, "name": member.name, "email": member.email,
+            "borrowed_books": member.borrowed_books}
+
+
+def _loan_started(isbn, member_id):
+    loan = mainoperations._loans.get((isbn, member_id))
+    return (LOAN_STARTED, isbn, {
+        "isbn": isbn, "member_id": member_id,
+        "borrowed_at": loan.borrowed_at if loan else None, "due_at": loan.due_at if loan else None,
+        "barcode": mainoperations.copy_barcode(isbn, loan.copy) if loan and loan.copy else None,
+        "available_copies": mainoperations.books[isbn].total_copies,
+    })
+
+
+def _loan_ended(isbn, member_id, barcode):
+    # The loan is already closed, so the copy comes from the notification
+    return (LOAN_ENDED, isbn, {"isbn": isbn, "member_id": member_id, "barcode": barcode,
+                               "available_copies": mainoperations.books[isbn].total_copies})
+
+
+def _events_for(op, details):
+    """Return the (type, key, data) events for one mainoperations notification."""
+    if op == "add_book":
+        return [(BOOK_ADDED, details["isbn"], _book_image(details["isbn"]))]
+    if op == "update_book":
+        return [(BOOK_UPDATED, details["isbn"], _book_image(details["isbn"]))]
+    if op == "delete_book":
+        return [(BOOK_DELETED, details["isbn"], {"isbn": details["isbn"]})]
+    if op == "add_member":
+        return [(MEMBER_ADDED, details["member_id"], _member_image(details["member_id"]))]
+    if op == "update_member":
+        return [(MEMBER_UPDATED, details["member_id"], _member_image(details["member_id"]))]
+    if op == "delete_member":
+        return [(MEMBER_DELETED, details["member_id"], {"member_id": details["member_id"]})]
+    if op == "borrow_book":
+        return [_loan_started(details["isbn"], details["member_id"])]
+    if op == "return_book":
+        return [_loan_ended(details["isbn"], details["member_id"], details.get("barcode"))]
+    if op == "borrow_books":
+        return [_loan_started(isbn, details["member_id"]) for isbn in details["isbns"]]
+    if op == "return_books":
+        barcodes = details.get("barcodes") or [None] * len(details["isbns"])
+        return [_loan_ended(isbn, details["member_id"], barcode) for isbn, barcode in zip(details["isbns"], barcodes)]
+    if op == "place_hold":
+        return [(HOLD_PLACED, details["isbn"], {"isbn": details["isbn"], "member_id": details["member_id"]})]
+    if op == "cancel_hold":
+        return [(HOLD_CANCELLED, details["isbn"], {"isbn": details["isbn"], "member_id": details["member_id"]})]
+    if op == "reset":
+        return [(LIBRARY_RESET, None, {})]
+    return []
+
+
+class ChangeFeed:
+    """Bounded log of ChangeEvents fed by mainoperations; create it with attach()."""
+
+    def __init__(self, retention=100_000, block_timeout=1.0):
+        self.retention = retention
+        self.block_timeout = block_timeout
+        self._condition = threading.Condition()
+        self._log = deque()        # retained events, consecutive offsets
+        self._end = 0              # offset the next event will get
+        self._subscriptions = []
+        self.stalled_waits = 0     # publishes that gave up waiting for a blocking subscription
+
+    # Synchronization
+
+    def attach(self):
+        """Start recording mutations."""
+        mainoperations.add_listener(self._on_change)
+        return self
+
+    def detach(self):
+        mainoperations.remove_listener(self._on_change)
+
+    def _on_change(self, op, details):
+        events = _events_for(op, details)
+        if events:
+            self.publish(events)
+
+    def publish(self, events):
+        """Append (type, key, data) events to the log and wake the subscribers."""
+        with self._condition:
+            blocking = [subscription for subscription in self._subscriptions
+                        if subscription.block and not subscription.closed]
+            if blocking:
+                deadline = time.monotonic() + self.block_timeout
+                while any(self._end - subscription.position >= subscription.max_lag for subscription in blocking):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stalled_waits += 1
+                        break
+                    self._condition.wait(remaining)
+            now = time.time()
+            for event_type, key, data in events:
+                self._log.append(ChangeEvent(self._end, event_type, key, data, now))
+                self._end += 1
+            while len(self._log) > self.retention:
+                self._log.popleft()
+            self._condition.notify_all()
+
+    # Offsets
+
+    def first_offset(self):
+        """Oldest offset still retained."""
+        with self._condition:
+            return self._log[0].offset if self._log else self._end
+
+    def end_offset(self):
+        """Offset the next event will get (subscribe from here to see only new changes)."""
+        with self._condition:
+            return self._end
+
+    def subscribe(self, from_offset=None, max_lag=10_000, block=False):
+        """Return a Subscription reading from from_offset (default: only new events)."""
+        with self._condition:
+            subscription = Subscription(self, self._end if from_offset is None else from_offset, max_lag, block)
+            self._subscriptions.append(subscription)
+            return subscription
+
+    def _read(self, subscription, max_events, timeout):
+        with self._condition:
+            if subscription.position >= self._end and timeout != 0:
+                self._condition.wait_for(lambda: subscription.position < self._end or subscription.closed, timeout)
+            first = self._log[0].offset if self._log else self._end
+            if not first <= subscription.position <= self._end:
+                raise OffsetOutOfRange(subscription.position, first, self._end)
+            start = subscription.position - first
+            batch = [self._log[index] for index in range(start, min(start + max_events, len(self._log)))]
+            subscription.position += len(batch)
+            if batch and subscription.block:
+                self._condition.notify_all()   # Publishers may be waiting for this subscription to catch up
+            return batch
+
+    def _close(self, subscription):
+        with self._condition:
+            subscription.closed = True
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            self._condition.notify_all()
+
+    def stats(self):
+        """Return the log bounds and, per subscription, its position and lag."""
+        with self._condition:
+            return {
+                "first_offset": self._log[0].offset if self._log else self._end,
+                "end_offset": self._end,
+                "retained": len(self._log),
+                "stalled_waits": self.stalled_waits,
+                "subscriptions": [{"position": subscription.position, "lag": self._end - subscription.position,
+                                   "block": subscription.block} for subscription in self._subscriptions],
+            }
+
+
+class Subscription:
+    """A consumer's cursor on a ChangeFeed. position is the offset of the next event poll() returns."""
+
+    def __init__(self, feed, position, max_lag, block):
+        self.feed = feed
+        self.position = position
+        self.max_lag = max_lag
+        self.block = block
+        self.closed = False
+
+    def poll(self, max_events=500, timeout=None):
+        """Return the next batch of up to max_events events, waiting up to timeout seconds for one.
+
+        Returns [] if nothing arrived in time (timeout=0 never waits). Raises
+        OffsetOutOfRange if the events at position are no longer retained.
+        """
+        return self.feed._read(self, max_events, timeout)
+
+    def seek(self, offset):
+        """Continue from offset, e.g. one the consumer stored before restarting."""
+        with self.feed._condition:
+            self.position = offset
+            self.feed._condition.notify_all()
+
+    def close(self):
+        self.feed._close(self)
+
+    def __iter__(self):
+        """Yield events as they arrive until the subscription is closed."""
+        while not self.closed:
+            yield from self.poll()
+
+
+def attach_change_feed(retention=100_000, block_timeout=1.0):
+    """Create a ChangeFeed that records later mutations."""
+    return ChangeFeed(retention, block_timeout).attach()
@@ -0,0 +1,265 @@
+# circulation.py - live circulation statistics and top-N popular titles
+#
+# CirculationStats follows mainoperations mutations and keeps, per ISBN:
+#   - loans and returns since it was attached (all-time counters);
+#   - loans in a sliding window (default: the last 7 days), kept in a ring
+#     buffer of per-period buckets (default: one per day). When a period ends,
+#     its bucket is subtracted from the window totals and reused, so the cost is
+#     O(1) per loan, amortized;
+#   - demand: copies on loan plus members waiting in the hold queue.
+# Each measure is ranked overall and per genre with count buckets (the ISBNs
+# having each count, and the distinct counts in sorted order). Counts change
+# by small steps, so an update moves an ISBN to a neighbouring bucket and a
+# top-N query reads the highest buckets only: cheap enough for every home page
+# render, whatever the catalog size.
+
+import bisect
+import threading
+import time
+
+import mainoperations
+
+# Sliding window defaults: one bucket per day over the last week
+BUCKET_SECONDS = 86400
+WINDOW_BUCKETS = 7
+
+
+class _Ranking:
+    """Keys ranked by a non-negative integer count, in count buckets.
+
+    Keys with the same count keep the order in which they reached it.
+    """
+
+    __slots__ = ("counts", "buckets", "levels")
+
+    def __init__(self):
+        self.counts = {}     # key -> count (keys with count 0 are not stored)
+        self.buckets = {}    # count -> {key: None}, insertion ordered
+        self.levels = []     # distinct counts, ascending
+
+    def get(self, key):
+        return self.counts.get(key, 0)
+
+    def set(self, key, count):
+        """Give key a new count (0 or less removes it)."""
+        old = self.counts.get(key, 0)
+        if count == old:
+            return
+        if old:
+            bucket = self.buckets[old]
+            del bucket[key]
+            if not bucket:
+                del self.buckets[old]
+                del self.levels[bisect.bisect_left(self.levels, old)]
+        if count > 0:
+            self.counts[key] = count
+            bucket = self.buckets.get(count)
+            if bucket is None:
+                self.buckets[count] = bucket = {}
+                bisect.insort(self.levels, count)
+            bucket[key] = None
+        else:
+            self.counts.pop(key, None)
+
+    def add(self, key, delta):
+        self.set(key, self.counts.get(key, 0) + delta)
+
+    def top(self, limit):
+        """Return up to limit (key, count) pairs, highest count first."""
+        result = []
+        for level in reversed(self.levels):
+            for key in self.buckets[level]:
+                if len(result) == limit:
+                    return result
+                result.append((key, level))
+        return result
+
+
+class CirculationStats:
+    """Loan counters, windowed loan counts and demand per ISBN, with top-N rankings.
+
+    Create it with attach(), which counts the loans currently in the ledger
+    (at their borrow times) and subscribes to later changes.
+    """
+
+    def __init__(self, bucket_seconds=BUCKET_SECONDS, window_buckets=WINDOW_BUCKETS):
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = window_buckets
+        self._lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self._genres = {}            # ISBN -> genre, for the per-genre rankings
+        self._loans = {}             # ISBN -> loans counted
+        self._returns = {}           # ISBN -> returns counted
+        self._ring = [{} for _ in range(self.window_buckets)]   # period % window_buckets -> {ISBN: loans}
+        self._period = None          # newest period (time // bucket_seconds) the ring holds
+        self._waiting_for = {}       # member ID -> ISBNs they hold a place for (to update demand on deletion)
+        self._rankings = {
+            measure: {None: _Ranking(), **{genre: _Ranking() for genre in mainoperations.GENRES}}
+            for measure in ("loans", "window", "demand")
+        }
+
+    # Synchronization
+
+    def attach(self):
+        """Count the current loans and holds, and start following mutations."""
+        with mainoperations.exclusive():
+            self._load()
+            mainoperations.add_listener(self._on_change)
+        return self
+
+    def detach(self):
+        mainoperations.remove_listener(self._on_change)
+
+    def _load(self):
+        with self._lock:
+            self._clear()
+            for isbn, book in mainoperations.books.items():
+                self._genres[isbn] = book.genre
+            for loan in list(mainoperations._loans.values()):
+                self._count_loan(loan.isbn, loan.borrowed_at)
+            for member_id, isbns in mainoperations._member_holds.items():
+                self._waiting_for[member_id] = set(isbns)
+            for isbn in self._genres:
+                self._refresh_demand(isbn)
+
+    def _on_change(self, op, details):
+        if op == "reset":
+            self._load()
+            return
+        with self._lock:
+            if op in ("borrow_book", "borrow_books"):
+                member_id = details["member_id"]
+                for isbn in details.get("isbns") or (details["isbn"],):
+                    self._count_loan(isbn, details["now"])
+                    self._stop_waiting(member_id, isbn)
+                    self._refresh_demand(isbn)
+            elif op in ("return_book", "return_books"):
+                for isbn in details.get("isbns") or (details["isbn"],):
+                    self._returns[isbn] = self._returns.get(isbn, 0) + 1
+                    self._refresh_demand(isbn)
+            elif op == "place_hold":
+                self._waiting_for.setdefault(details["member_id"], set()).add(details["isbn"])
+                self._refresh_demand(details["isbn"])
+            elif op == "cancel_hold":
+                self._stop_waiting(details["member_id"], details["isbn"])
+                self._refresh_demand(details["isbn"])
+            elif op == "delete_member":
+                for isbn in self._waiting_for.pop(details["member_id"], ()):
+                    self._refresh_demand(isbn)
+            elif op in ("add_book", "update_book"):
+                self._regenre(details["isbn"])
+                self._refresh_demand(details["isbn"])
+            elif op == "delete_book":
+                self._forget(details["isbn"])
+
+    # Counting (callers hold self._lock)
+
+    def _stop_waiting(self, member_id, isbn):
+        waiting = self._waiting_for.get(member_id)
+        if waiting is not None:
+            waiting.discard(isbn)
+            if not waiting:
+                del self._waiting_for[member_id]
+
+    def _bump(self, measure, isbn, delta):
+        rankings = self._rankings[measure]
+        rankings[None].add(isbn, delta)
+        genre = self._genres.get(isbn)
+        if genre is not None and delta:
+            rankings[genre].add(isbn, delta)
+
+    def _advance(self, now):
+        """Move the window forward to now's period, expiring the buckets that fall out of it."""
+        period = int(now // self.bucket_seconds)
+        if self._period is None:
+            self._period = period
+            return
+        if period <= self._period:
+            return
+        for expired in range(max(self._period + 1, period - self.window_buckets + 1), period + 1):
+            bucket = self._ring[expired % self.window_buckets]
+            for isbn, count in bucket.items():
+                self._bump("window", isbn, -count)
+            bucket.clear()
+        self._period = period
+
+    def _count_loan(self, isbn, now):
+        self._loans[isbn] = self._loans.get(isbn, 0) + 1
+        self._bump("loans", isbn, 1)
+        self._advance(now)
+        period = int(now // self.bucket_seconds)
+        if period > self._period - self.window_buckets:
+            # Loans dated before the window (e.g. replayed ones) only count all-time
+            bucket = self._ring[period % self.window_buckets]
+            bucket[isbn] = bucket.get(isbn, 0) + 1
+            self._bump("window", isbn, 1)
+
+    def _refresh_demand(self, isbn):
+        book = mainoperations.books.get(isbn)
+        if book is None:
+            return
+        demand = book.original_copies - book.total_copies + len(mainoperations._holds.get(isbn, ()))
+        self._bump("demand", isbn, demand - self._rankings["demand"][None].get(isbn))
+
+    def _regenre(self, isbn):
+        """Move a book's counts to the ranking of its current genre."""
+        book = mainoperations.books.get(isbn)
+        old, new = self._genres.get(isbn), book.genre if book is not None else None
+        if old == new:
+            return
+        for rankings in self._rankings.values():
+            count = rankings[None].get(isbn)
+            if old is not None:
+                rankings[old].set(isbn, 0)
+            if new is not None:
+                rankings[new].set(isbn, count)
+        self._genres[isbn] = new
+
+    def _forget(self, isbn):
+        for rankings in self._rankings.values():
+            for ranking in rankings.values():
+                ranking.set(isbn, 0)
+        for bucket in self._ring:
+            bucket.pop(isbn, None)
+        self._genres.pop(isbn, None)
+        self._loans.pop(isbn, None)
+        self._returns.pop(isbn, None)
+
+    # Queries
+
+    def _top(self, measure, limit, genre):
+        with self._lock:
+            if measure == "window":
+                self._advance(time.time())
+            ranking = self._rankings[measure].get(genre)
+            return ranking.top(limit) if ranking is not None else []
+
+    def most_borrowed(self, limit=10, genre=None, all_time=False):
+        """Return [(isbn, loans)] of the most borrowed books, overall or in one genre.
+
+        Loans are counted over the window (the last window_buckets periods,
+        including the current one), or since attach() with all_time=True.
+        """
+        return self._top("loans" if all_time else "window", limit, genre)
+
+    def highest_demand(self, limit=10, genre=None):
+        """Return [(isbn, demand)] of the books in highest demand: copies on loan plus waiting holds."""
+        return self._top("demand", limit, genre)
+
+    def book_stats(self, isbn):
+        """Return the counters of one book."""
+        with self._lock:
+            self._advance(time.time())
+            return {
+                "loans": self._loans.get(isbn, 0),
+                "returns": self._returns.get(isbn, 0),
+                "window_loans": self._rankings["window"][None].get(isbn),
+                "demand": self._rankings["demand"][None].get(isbn),
+            }
+
+
+def attach_circulation_stats(bucket_seconds=BUCKET_SECONDS, window_buckets=WINDOW_BUCKETS):
+    """Create a CirculationStats that counts later circulation."""
+    return CirculationStats(bucket_seconds, window_buckets).attach()
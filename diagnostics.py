@@ -0,0 +1,103 @@
+# diagnostics.py - where mainoperations sends its error messages
+#
+# A sink is any object with an emit(message) method. PrintSink reproduces the
+# original behaviour (one print per rejected operation). BufferedSink queues
+# messages for a background flusher that writes and rate-limits them, so a
+# flood of rejections cannot throttle the caller on terminal I/O. Installing no
+# sink at all (None) is the quiet mode.
+
+import itertools
+import sys
+import threading
+import time
+from collections import deque
+
+
+# Default of a diagnostics_sink argument: a new PrintSink for each owner (None stays quiet)
+DEFAULT = object()
+
+
+def resolve(sink):
+    """Return the sink a diagnostics_sink argument stands for: a new PrintSink for DEFAULT, else sink itself."""
+    return PrintSink() if sink is DEFAULT else sink
+
+
+class PrintSink:
+    """Print every message to stdout immediately (the default)."""
+
+    def emit(self, message):
+        print(message)
+
+
+class BufferedSink:
+    """Queue messages in memory and write them out in batches, at a bounded rate.
+
+    emit() only appends to a queue of at most `capacity` messages (further
+    ones are only counted), so the caller takes no lock and does no I/O.
+    flush() writes the queued messages, at most max_per_second per second
+    (token bucket with room for a burst of the same size), and reports the
+    rest as one "suppressed" line. It runs in the background every
+    `flush_interval` seconds if one is given, and on close().
+    """
+
+    def __init__(self, stream=None, capacity=256, max_per_second=50.0, flush_interval=None):
+        self.stream = stream
+        self.capacity = capacity
+        self.max_per_second = max_per_second
+        self._lock = threading.Lock()
+        self._queue = deque(maxlen=capacity)
+        self._overflow = itertools.count()   # next() is atomic, so emit needs no lock
+        self._tokens = max_per_second
+        self._refilled_at = time.monotonic()
+        self._stopped = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(target=self._flush_loop, args=(flush_interval,),
+                                             name="diagnostics-flusher", daemon=True)
+            self._flusher.start()
+
+    def emit(self, message):
+        queue = self._queue
+        if len(queue) < self.capacity:
+            queue.append(message)
+        else:
+            next(self._overflow)
+
+    def _drain_locked(self):
+        overflow, self._overflow = self._overflow, itertools.count()
+        suppressed = next(overflow)
+        queue = self._queue
+        lines = [queue.popleft() for _ in range(len(queue))]
+
+        now = time.monotonic()
+        self._tokens = min(self.max_per_second, self._tokens + (now - self._refilled_at) * self.max_per_second)
+        self._refilled_at = now
+        allowed = max(0, min(len(lines), int(self._tokens)))
+        self._tokens -= allowed
+        suppressed += len(lines) - allowed
+        del lines[allowed:]
+        if suppressed:
+            lines.append(f"({suppressed} more message(s) suppressed)")
+        return lines
+
+    def _write(self, lines):
+        if lines:
+            stream = self.stream if self.stream is not None else sys.stderr
+            stream.write("\n".join(lines) + "\n")
+
+    def flush(self):
+        """Write out everything buffered so far."""
+        with self._lock:
+            lines = self._drain_locked()
+        self._write(lines)
+
+    def _flush_loop(self, interval):
+        while not self._stopped.wait(interval):
+            self.flush()
+
+    def close(self):
+        """Stop the background flusher and write out any remaining messages."""
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
@@ -0,0 +1,182 @@
+# inventory.py - columnar, NumPy-backed inventory view for reports
+#
+# Keeps one row per book in parallel NumPy arrays (genre code, author code,
+# available and original copy counts), updated incrementally from the
+# mainoperations mutation listener. Report functions are then single vectorized
+# passes instead of Python loops over books.values().
+
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for this optional report view
+    np = None
+
+import mainoperations
+
+_GENRE_CODES = {genre: code for code, genre in enumerate(mainoperations.GENRES)}
+
+
+class ColumnarInventory:
+    """Struct-of-arrays copy of the copy counts in mainoperations.books.
+
+    Rows of deleted books are recycled. Create it with attach(), which loads
+    the current catalog and subscribes to later changes.
+    """
+
+    def __init__(self, initial_capacity=1024):
+        if np is None:
+            raise ImportError("ColumnarInventory needs numpy: pip install numpy")
+        self._lock = threading.Lock()
+        self._row_of = {}            # ISBN -> row
+        self._isbn_at = []           # row -> ISBN (None for a free row)
+        self._free_rows = []
+        self._author_codes = {}      # author -> code
+        self._author_names = []      # code -> author
+
+        self.valid = np.zeros(initial_capacity, dtype=bool)
+        self.genre = np.zeros(initial_capacity, dtype=np.int8)
+        self.author = np.zeros(initial_capacity, dtype=np.int32)
+        self.available = np.zeros(initial_capacity, dtype=np.int32)
+        self.original = np.zeros(initial_capacity, dtype=np.int32)
+
+    # Synchronization
+
+    def attach(self):
+        """Load every current book and start following mutations."""
+        with mainoperations.exclusive():
+            for isbn in mainoperations.books:
+                self._refresh(isbn)
+            mainoperations.add_listener(self._on_change)
+        return self
+
+    def detach(self):
+        mainoperations.remove_listener(self._on_change)
+
+    def _on_change(self, op, details):
+        if op == "reset":
+            self._rebuild()
+            return
+        isbn = details.get("isbn")
+        if isbn is not None:
+            self._refresh(isbn)
+        for isbn in details.get("isbns", ()):
+            self._refresh(isbn)
+
+    def _rebuild(self):
+        """Drop every row and reload the (replaced) catalog."""
+        with self._lock:
+            self._row_of.clear()
+            self._isbn_at.clear()
+            self._free_rows.clear()
+            self.valid[:] = False
+        for isbn in mainoperations.books:
+            self._refresh(isbn)
+
+    def _grow(self):
+        capacity = len(self.valid) * 2
+        for name in ("valid", "genre", "author", "available", "original"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _author_code(self, author):
+        code = self._author_codes.get(author)
+        if code is None:
+            code = len(self._author_names)
+            self._author_codes[author] = code
+            self._author_names.append(author)
+        return code
+
+    def _refresh(self, isbn):
+        """Copy one book's current values into its row, or free the row if it was deleted."""
+        book = mainoperations.books.get(isbn)
+        with self._lock:
+            row = self._row_of.get(isbn)
+            if book is None:
+                if row is not None:
+                    del self._row_of[isbn]
+                    self._isbn_at[row] = None
+                    self.valid[row] = False
+                    self._free_rows.append(row)
+                return
+
+            if row is None:
+                if self._free_rows:
+                    row = self._free_rows.pop()
+                    self._isbn_at[row] = isbn
+                else:
+                    row = len(self._isbn_at)
+                    if row == len(self.valid):
+                        self._grow()
+                    self._isbn_at.append(isbn)
+                self._row_of[isbn] = row
+                self.valid[row] = True
+
+            self.genre[row] = _GENRE_CODES[book.genre]
+            self.author[row] = self._author_code(book.author)
+            self.available[row] = book.total_copies
+            self.original[row] = book.original_copies
+
+    # Reports
+
+    def _columns(self):
+        """Consistent copies of the live rows: (genre, author, available, original, author count)."""
+        with self._lock:
+            rows = self.valid[:len(self._isbn_at)]
+            return (self.genre[:len(rows)][rows], self.author[:len(rows)][rows],
+                    self.available[:len(rows)][rows], self.original[:len(rows)][rows],
+                    len(self._author_names))
+
+    def availability_by_genre(self):
+        """Return {genre: available copies} for every genre in GENRES."""
+        genre, _, available, _, _ = self._columns()
+        totals = np.bincount(genre, weights=available, minlength=len(mainoperations.GENRES))
+        return {name: int(totals[code]) for name, code in _GENRE_CODES.items()}
+
+    def fully_checked_out_count(self, by_genre=False):
+        """Count titles that own copies but have none available (optionally per genre)."""
+        genre, _, available, original, _ = self._columns()
+        out = (available == 0) & (original > 0)
+        if not by_genre:
+            return int(np.count_nonzero(out))
+        counts = np.bincount(genre[out], minlength=len(mainoperations.GENRES))
+        return {name: int(counts[code]) for name, code in _GENRE_CODES.items()}
+
+    def on_loan_by_author(self, top=None):
+        """Return {author: copies on loan} (original_copies - total_copies), largest first.
+
+        Authors with nothing on loan are left out; top limits the number of authors.
+        """
+        _, author, available, original, author_count = self._columns()
+        on_loan = np.bincount(author, weights=original - available, minlength=author_count).astype(np.int64)
+        ranked = np.flatnonzero(on_loan > 0)
+        ranked = ranked[np.argsort(-on_loan[ranked], kind="stable")]
+        if top is not None:
+            ranked = ranked[:top]
+        return {self._author_names[code]: int(on_loan[code]) for code in ranked}
+
+    def genre_report(self):
+        """Return per-genre titles, copies owned, available, on loan and fully checked-out titles."""
+        genre, _, available, original, _ = self._columns()
+        size = len(mainoperations.GENRES)
+        titles = np.bincount(genre, minlength=size)
+        owned = np.bincount(genre, weights=original, minlength=size)
+        free = np.bincount(genre, weights=available, minlength=size)
+        out = np.bincount(genre[(available == 0) & (original > 0)], minlength=size)
+        return {
+            name: {
+                "titles": int(titles[code]),
+                "copies": int(owned[code]),
+                "available": int(free[code]),
+                "on_loan": int(owned[code] - free[code]),
+                "fully_checked_out": int(out[code]),
+            }
+            for name, code in _GENRE_CODES.items()
+        }
+
+
+def attach_inventory():
+    """Create a ColumnarInventory over the current catalog that stays in sync with later changes."""
+    return ColumnarInventory().attach()
@@ -0,0 +1,146 @@
+# loadgen.py - local load generator for service.py
+#
+# Opens keep-alive connections to the library service, pipelines a mix of
+# search, lookup and borrow/return requests on each, and reports latency
+# percentiles and throughput. With --spawn it starts its own seeded server.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+
+def _build_request(method, path, body=None):
+    data = json.dumps(body).encode() if body is not None else b""
+    head = (f"{method} {path} HTTP/1.1\r\n"
+            f"Host: localhost\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n\r\n")
+    return head.encode() + data
+
+
+def _next_request(rng, book_count, member_count):
+    """Pick one request from the mixed workload."""
+    isbn = f"978-{rng.randrange(book_count):09d}"
+    member_id = f"M{rng.randrange(member_count):07d}"
+    roll = rng.random()
+    if roll < 0.35:
+        return _build_request("GET", f"/books?q=title+{rng.randrange(book_count)}")
+    if roll < 0.60:
+        return _build_request("GET", f"/books/{isbn}")
+    if roll < 0.80:
+        return _build_request("POST", "/borrow", {"isbn": isbn, "member_id": member_id})
+    return _build_request("POST", "/return", {"isbn": isbn, "member_id": member_id})
+
+
+async def _read_response(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return int(head.split(b" ", 2)[1])
+
+
+async def _client(host, port, deadline, depth, rng, book_count, member_count, latencies, statuses):
+    """One keep-alive connection keeping `depth` pipelined requests in flight until the deadline."""
+    reader, writer = await asyncio.open_connection(host, port)
+    sent_at = []
+
+    def send_one():
+        writer.write(_next_request(rng, book_count, member_count))
+        sent_at.append(time.perf_counter())
+
+    for _ in range(depth):
+        send_one()
+    index = 0
+    while index < len(sent_at):
+        status = await _read_response(reader)
+        latencies.append(time.perf_counter() - sent_at[index])
+        statuses[status] = statuses.get(status, 0) + 1
+        index += 1
+        if time.perf_counter() < deadline:
+            send_one()
+            await writer.drain()
+    writer.close()
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def run_load(host, port, connections=64, depth=4, duration=10.0, book_count=10_000, member_count=10_000, seed=1):
+    """Drive the service and return a summary dict with p50/p99 latency (ms) and requests/sec."""
+    latencies = []
+    statuses = {}
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        _client(host, port, deadline, depth, random.Random(seed + i), book_count, member_count, latencies, statuses)
+        for i in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 3),
+        "max_ms": round((latencies[-1] if latencies else 0.0) * 1000, 3),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+async def _wait_for_port(host, port, timeout=30.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the library HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--connections", type=int, default=64)
+    parser.add_argument("--depth", type=int, default=4, help="Pipelined requests in flight per connection.")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to generate load.")
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--members", type=int, default=10_000)
+    parser.add_argument("--spawn", action="store_true", help="Start a seeded service.py subprocess first.")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "service.py"),
+             "--host", args.host, "--port", str(args.port),
+             "--demo-books", str(args.books), "--demo-members", str(args.members)],
+            stdout=subprocess.DEVNULL)
+    try:
+        asyncio.run(_wait_for_port(args.host, args.port))
+        summary = asyncio.run(run_load(args.host, args.port, args.connections, args.depth,
+                                       args.duration, args.books, args.members))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
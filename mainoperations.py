@@ -1,27 +1,451 @@
+import bisect
+import functools
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import diagnostics
+import metrics
+from records import Book, BookView, Loan, Member, MemberRegistry, shared
+from results import (
+    ALREADY_BORROWED, ALREADY_EXISTS, ALREADY_HELD, BATCH_REJECTED, COPIES_AVAILABLE, COPIES_ON_LOAN,
+    DUPLICATE_EMAIL, DUPLICATE_ITEM, HAS_LOANS, INVALID_COPIES, INVALID_GENRE, INVALID_TEXT, LIMIT_REACHED,
+    NO_COPIES, NOT_BORROWED, NOT_FOUND, NOT_HELD, SUCCESS, Result,
+)
+
 # 1. Global Data Structures
 
-# Books Dictionary:
+# Books Dictionary: ISBN -> Book record (a compact mapping, see records.py)
 books = {}
 
-# Members List: List of Member Dictionaries
-members = []
+# Members Registry: member_id -> Member record (keeps insertion order).
+# Iterating it yields the Member records; members.ids() gives the IDs
+members = MemberRegistry()
+
+# Email Index: lowercased email -> member_id, keeps emails unique
+_member_emails = {}
+
+# Borrowing Limit: maximum number of books a member can hold at once
+MAX_BORROWED_BOOKS = 3
 
 # Genres Tuple: Fixed categories for validation
 GENRES = ("Fiction", "Non-Fiction", "Sci-Fi", "Mystery", "Biography", "Fantasy")
 
+# Search Index: field -> {n-gram: set of ISBNs}, n-grams of 1 to NGRAM_SIZE characters
+NGRAM_SIZE = 3
+SEARCH_FIELDS = ("title", "author")
+_search_index = {field: {} for field in SEARCH_FIELDS}
+
+# Index Backlog: catalog slots from this one on are not in the search index yet
+# (None: every book is). Set when state is loaded without its index; _index_backlog
+# catches up in batches, and searches scan the records until it is done.
+_unindexed_from = None
+
+# Catalog Order: ISBN -> insertion number, so indexed searches keep catalog order.
+# _catalog_slots is the reverse (insertion number -> ISBN, None once deleted), so
+# paginated searches can resume right after a given position.
+_book_order = {}
+_next_book_order = 0
+_catalog_slots = []
+
+# Facet Bitmaps: bit N of each bytearray stands for the book in catalog slot N.
+# One bitmap per genre, plus one of the books with at least one copy available,
+# so genre and availability filters are bitwise ANDs instead of record scans
+_genre_bitmaps = {genre: bytearray() for genre in GENRES}
+_available_bitmap = bytearray()
+_NONZERO_BYTE = re.compile(rb"[^\x00]")
+
+# Copy Shelf: ISBN -> bitset of the physical copies on the shelf (bit N - 1 set: copy N
+# is available). Copies are numbered from 1 and labelled "<isbn>#<number>"; every loan
+# records its copy. The number of set bits always equals the book's total_copies, so
+# the first free copy is the lowest set bit and the available count a popcount.
+_shelf = {}
+
+# Catalog Version: bumped by every change to the set of books or their fields
+# (not by availability changes from circulation), so caches can tell stale results
+_catalog_version = 0
+
+# Loan Ledger: (isbn, member_id) -> Loan with borrow time and due date (epoch seconds)
+LOAN_PERIOD_DAYS = 14
+_loans = {}
+
+# Due Heap: (due_at, sequence, Loan) min-heap over the ledger. Returned loans are
+# dropped lazily: their entries stay until popped past or compacted away.
+_due_heap = []
+_stale_heap_entries = 0
+_heap_sequence = itertools.count()
+
+# Holder Index: ISBN -> set of member IDs currently borrowing it (derived from the ledger)
+_holders = {}
+
+# Hold Queues: ISBN -> _HoldQueue of waiting member IDs (FIFO), and the reverse
+# member_id -> set of ISBNs they are waiting for. Queues exist only while non-empty.
+_holds = {}
+_member_holds = {}
+
+# Mutation Listeners: called as listener(op, details) after every successful change
+_listeners = []
+
+# Diagnostics Sink: receives the error message of every rejected operation (None = quiet)
+_diagnostics = diagnostics.PrintSink()
+
+# Locking: structural changes (adding/removing records, index updates) hold the
+# catalog lock; circulation holds only the lock stripes its ISBNs and member IDs
+# hash to, so independent checkouts run in parallel. Lock order is always the
+# catalog lock first, then stripes in ascending index order.
+LOCK_STRIPES = 64
+_catalog_lock = threading.RLock()
+_stripes = tuple(threading.RLock() for _ in range(LOCK_STRIPES))
+
+# The loan ledger and due heap are shared by every stripe; this leaf lock guards them
+_ledger_lock = threading.Lock()
+
+# Leaf lock guarding every hold queue and the member -> holds index
+_holds_lock = threading.Lock()
+
+# Leaf lock guarding the facet bitmaps (neighbouring books share a byte across stripes)
+_facets_lock = threading.Lock()
+
+# Operation Metrics: calls, failures by reason and latency of every public operation
+_metrics = metrics.OperationMetrics()
+
+# Sampling Profiler: opt-in (see set_profiler); None costs the operations a single check
+_profiler = None
+
+
+class _CallState(threading.local):
+    failure = None   # Code of the failure reported by the operation running on this thread
+
+
+_call_state = _CallState()
+
+
+# Instrumentation
+
+def _instrumented(function):
+    """Internal decorator counting and timing every call of a public operation.
+
+    A call fails if it reports a failure through _fail (the reason is the result
+    code) or raises (the reason is the exception type).
+    """
+    operation = function.__name__
+    record = _metrics.recorder(operation)
+    clock = time.perf_counter_ns
+    state = _call_state
+
+    @functools.wraps(function)
+    def call(*args, **kwargs):
+        outer = state.failure
+        state.failure = None
+        profiler = _profiler
+        token = profiler.enter(operation) if profiler is not None else None
+        began = clock()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as error:
+            record(clock() - began, type(error).__name__)
+            raise
+        else:
+            record(clock() - began, state.failure)
+            return result
+        finally:
+            state.failure = outer
+            if token is not None:
+                profiler.leave(token)
+
+    return call
+
 
 # Functions
 
 def _get_member(member_id):
     """Internal helper to find a member dictionary by ID."""
-    for member in members:
-        if member["member_id"] == member_id:
-            return member
-    return None
+    return members.get(member_id)
+
+
+def email_key(email):
+    """Normalize an email into its key in the unique email index (shared with the other backends)."""
+    return email.strip().lower()
+
+
+def _empty_state():
+    """Internal helper returning fresh, empty versions of every stored structure."""
+    return {
+        "books": {},
+        "members": MemberRegistry(),
+        "_member_emails": {},
+        "_search_index": {field: {} for field in SEARCH_FIELDS},
+        "_book_order": {},
+        "_next_book_order": 0,
+        "_loans": {},
+        "_shelf": {},
+        "_holds": {},
+        "_member_holds": {},
+    }
+
+
+def _export_state():
+    """Internal helper returning every stored structure by name (for snapshots)."""
+    return {name: globals()[name] for name in _empty_state()}
+
+
+def _import_state(state):
+    """Internal helper replacing every stored structure with the given ones.
+
+    State without "_search_index" starts an index backlog (see _index_backlog).
+    """
+    global _unindexed_from
+    fresh = _empty_state()
+    fresh.update((name, value) for name, value in state.items() if name in fresh)
+    if not isinstance(fresh["members"], MemberRegistry):
+        # Snapshots saved before the registry existed hold a plain dict
+        fresh["members"] = MemberRegistry(fresh["members"])
+    with _catalog_lock:
+        globals().update(fresh)
+        _unindexed_from = None if "_search_index" in state else 0
+        _bump_catalog_version()
+        _rebuild_catalog_slots()
+        _rebuild_facets()
+        _rebuild_loan_indexes()
+        _rebuild_shelves()
+    _notify("reset")
+
+
+@_instrumented
+def reset_data():
+    """Clear all books, members and their indexes (used by tests and loaders)."""
+    _import_state(_empty_state())
+
+
+def add_listener(listener):
+    """Register listener(op, details), called after every successful mutation."""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def remove_listener(listener):
+    """Unregister a listener added with add_listener."""
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+class _LockSet:
+    """Internal context manager acquiring a fixed list of locks in order."""
+
+    __slots__ = ("locks",)
+
+    def __init__(self, locks):
+        self.locks = locks
+
+    def __enter__(self):
+        for lock in self.locks:
+            lock.acquire()
+
+    def __exit__(self, *exc_info):
+        for lock in reversed(self.locks):
+            lock.release()
+
+
+def _locked(isbns=(), member_ids=(), catalog=False):
+    """Internal helper holding the stripes for some ISBNs and member IDs (and optionally the catalog lock)."""
+    indexes = {hash(isbn) % LOCK_STRIPES for isbn in isbns}
+    indexes.update(hash(member_id) % LOCK_STRIPES for member_id in member_ids)
+    held = [_stripes[index] for index in sorted(indexes)]
+    if catalog:
+        held.insert(0, _catalog_lock)
+    return _LockSet(held)
+
+
+def _circulation_stripes(isbn, member_id):
+    """Internal fast path of _locked for one ISBN and one member (every checkout and return).
+
+    Returns the two stripes in lock order; they may be the same (reentrant) lock.
+    """
+    first = hash(isbn) % LOCK_STRIPES
+    second = hash(member_id) % LOCK_STRIPES
+    if first > second:
+        return _stripes[second], _stripes[first]
+    return _stripes[first], _stripes[second]
+
+
+@contextmanager
+def exclusive():
+    """Pause every other operation, for consistent whole-library reads and snapshots."""
+    with _catalog_lock:
+        for stripe in _stripes:
+            stripe.acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(_stripes):
+                stripe.release()
+
+
+def set_diagnostics_sink(sink):
+    """Route error messages to sink.emit(message); None disables them. Returns the previous sink."""
+    global _diagnostics
+    previous = _diagnostics
+    _diagnostics = sink
+    return previous
+
+
+def _fail(problem, detailed):
+    """Internal helper reporting a failed Result; returns it if detailed, else False."""
+    _call_state.failure = problem.code
+    if _diagnostics is not None:
+        _diagnostics.emit(problem.message)
+    return problem if detailed else False
+
+
+def stats():
+    """Return per-operation metrics: calls, failures (total and by reason) and latency in µs."""
+    return _metrics.stats()
+
+
+def reset_stats():
+    """Forget the metrics recorded so far."""
+    _metrics.reset()
+
+
+def prometheus_metrics():
+    """Return the operation metrics in the Prometheus text exposition format."""
+    return _metrics.prometheus_text()
+
+
+def write_prometheus(path):
+    """Write the operation metrics to path in the Prometheus text format (atomically)."""
+    _metrics.write_prometheus(path)
+
 
+def set_profiler(profiler):
+    """Install a metrics.SamplingProfiler (started here) or None to stop profiling; returns the previous one."""
+    global _profiler
+    previous = _profiler
+    _profiler = profiler
+    if previous is not None and previous is not profiler:
+        previous.stop()
+    if profiler is not None:
+        # Every _instrumented wrapper shares one code object; take it from an existing operation
+        profiler.boundary = get_loan.__code__
+        profiler.start()
+    return previous
 
-def _is_valid_genre(genre):
-    """Internal helper to check if a genre is in the global GENRES tuple."""
+
+def _bump_catalog_version():
+    """Internal helper marking the catalog as changed (callers hold the catalog lock)."""
+    global _catalog_version
+    _catalog_version += 1
+
+
+def catalog_version():
+    """Return the catalog version counter; it changes whenever books are added, updated or deleted."""
+    return _catalog_version
+
+
+def _notify(op, **details):
+    """Internal helper passing a completed mutation and its arguments to listeners."""
+    for listener in _listeners:
+        listener(op, details)
+
+
+def _ngrams(text):
+    """Internal helper returning every 1 to NGRAM_SIZE character slice of lowercased text."""
+    text = text.lower()
+    grams = set()
+    for size in range(1, NGRAM_SIZE + 1):
+        for start in range(len(text) - size + 1):
+            grams.add(text[start:start + size])
+    return grams
+
+
+def _index_field(isbn, by, text):
+    """Internal helper to add a book's title or author to the search index."""
+    if _unindexed_from is not None and _book_order[isbn] >= _unindexed_from:
+        return  # The backlog indexes the book when it gets there
+    field_index = _search_index[by]
+    for gram in _ngrams(text):
+        postings = field_index.get(gram)
+        if postings is None:
+            field_index[gram] = {isbn}
+        else:
+            postings.add(isbn)
+
+
+def _unindex_field(isbn, by, text):
+    """Internal helper to remove a book's title or author from the search index."""
+    if _unindexed_from is not None and _book_order[isbn] >= _unindexed_from:
+        return
+    field_index = _search_index[by]
+    for gram in _ngrams(text):
+        postings = field_index.get(gram)
+        if postings is not None:
+            postings.discard(isbn)
+            if not postings:
+                del field_index[gram]
+
+
+def _match_set(normalized_query, by):
+    """Internal helper returning the ISBNs whose field contains the lowercased query.
+
+    Queries up to NGRAM_SIZE characters are a single index lookup. Longer queries
+    intersect the posting sets of their n-grams (smallest first) and then confirm
+    the substring on the few remaining candidates. The result may be a live index
+    structure: only read it, and only while holding the catalog lock.
+    """
+    field_index = _search_index[by]
+    if not normalized_query:
+        return books.keys()
+    if _unindexed_from is not None:
+        return {isbn for isbn, book in books.items() if normalized_query in getattr(book, by).lower()}
+    if len(normalized_query) <= NGRAM_SIZE:
+        return field_index.get(normalized_query, ())
+
+    postings = []
+    for start in range(len(normalized_query) - NGRAM_SIZE + 1):
+        gram_postings = field_index.get(normalized_query[start:start + NGRAM_SIZE])
+        if not gram_postings:
+            return set()
+        postings.append(gram_postings)
+    postings.sort(key=len)
+
+    candidates = set(postings[0])
+    for gram_postings in postings[1:]:
+        candidates &= gram_postings
+        if not candidates:
+            return candidates
+
+    return {isbn for isbn in candidates if normalized_query in getattr(books[isbn], by).lower()}
+
+
+def _index_backlog(batch=500):
+    """Internal helper indexing the next batch of books loaded without a search index.
+
+    Returns True while books remain, so loaders call it in a loop (a background
+    thread keeps restarts fast). Each batch holds the catalog lock briefly.
+    """
+    global _unindexed_from
+    with _catalog_lock:
+        start = _unindexed_from
+        if start is None:
+            return False
+        end = min(start + batch, _next_book_order)
+        _unindexed_from = end
+        for isbn in _catalog_slots[start:end]:
+            if isbn is not None:
+                book = books[isbn]
+                for field in SEARCH_FIELDS:
+                    _index_field(isbn, field, getattr(book, field))
+        if end >= _next_book_order:
+            _unindexed_from = None
+        return _unindexed_from is not None
+
+
+def is_valid_genre(genre):
+    """Check if a genre is in the global GENRES tuple."""
     return genre in GENRES
 
 
@@ -29,211 +453,1191 @@ def _is_valid_genre(genre):
 
 #  we Create
 
-def add_book(isbn, title, author, genre, total_copies):
+@_instrumented
+def add_book(isbn, title, author, genre, total_copies, detailed=False):
     """Add a new book if ISBN is unique and genre is valid."""
-    if isbn in books:
-        print(f"Error: Book with ISBN {isbn} already exists.")
-        return False
-    if not _is_valid_genre(genre):
-        print(f"Error: Invalid genre '{genre}'. Must be one of {list(GENRES)}.")
-        return False
-    if not isinstance(total_copies, int) or total_copies < 0:
-        print("Error: Total copies must be a non-negative integer.")
-        return False
-
-    books[isbn] = {
-        "title": title,
-        "author": author,
-        "genre": genre,
-        "total_copies": total_copies,
-        # Storing original_copies for delete constraint validation
-        "original_copies": total_copies
-    }
-    return True
+    with _locked(isbns=(isbn,), catalog=True):
+        if isbn in books:
+            return _fail(Result(ALREADY_EXISTS, f"Error: Book with ISBN {isbn} already exists."), detailed)
+        if not is_valid_genre(genre):
+            return _fail(Result(INVALID_GENRE, f"Error: Invalid genre '{genre}'. Must be one of {list(GENRES)}."), detailed)
+        if not isinstance(total_copies, int) or total_copies < 0:
+            return _fail(Result(INVALID_COPIES, "Error: Total copies must be a non-negative integer."), detailed)
+        # Indexing lowercases them, so anything else would fail halfway through the insert
+        if not isinstance(title, str) or not isinstance(author, str):
+            return _fail(Result(INVALID_TEXT, "Error: Title and author must be strings."), detailed)
+
+        _insert_book(isbn, title, author, genre, total_copies)
+        return SUCCESS if detailed else True
+
 
+def _insert_book(isbn, title, author, genre, total_copies):
+    """Internal helper storing and indexing an already validated book."""
+    global _next_book_order
+    _bump_catalog_version()
+    books[isbn] = Book(title, author, genre, total_copies)
+    _shelf[isbn] = (1 << total_copies) - 1
+    _book_order[isbn] = _next_book_order
+    _catalog_slots.append(isbn)
+    _next_book_order += 1
+    for field in SEARCH_FIELDS:
+        _index_field(isbn, field, getattr(books[isbn], field))
+    _set_facets(isbn, books[isbn])
+    _notify("add_book", isbn=isbn, title=title, author=author, genre=genre, total_copies=total_copies)
 
-def add_member(member_id, name, email):
+
+@_instrumented
+def add_member(member_id, name, email, detailed=False):
     """Add a new member if member_id is unique."""
-    if _get_member(member_id):
-        print(f"Error: Member with ID {member_id} already exists.")
-        return False
-
-    new_member = {
-        "member_id": member_id,
-        "name": name,
-        "email": email,
-        "borrowed_books": []  # Initialize as an empty list of ISBNs
-    }
-    members.append(new_member)
-    return True
+    with _locked(member_ids=(member_id,), catalog=True):
+        if _get_member(member_id):
+            return _fail(Result(ALREADY_EXISTS, f"Error: Member with ID {member_id} already exists."), detailed)
+        if email_key(email) in _member_emails:
+            return _fail(Result(DUPLICATE_EMAIL, f"Error: Email {email} is already registered to another member."), detailed)
+
+        _insert_member(member_id, name, email)
+        return SUCCESS if detailed else True
+
+
+def _insert_member(member_id, name, email):
+    """Internal helper storing and indexing an already validated member."""
+    members[member_id] = Member(member_id, name, email)
+    _member_emails[email_key(email)] = member_id
+    _notify("add_member", member_id=member_id, name=name, email=email)
 
 
 ## Read
 
+@_instrumented
+def find_member_by_email(email):
+    """Return the member record registered with an email, or None."""
+    member_id = _member_emails.get(email_key(email))
+    return members.get(member_id) if member_id is not None else None
+
+
+@_instrumented
 def search_books(query, by="title"):
-    """Search books by title or author (case-insensitive, partial matches)."""
+    """Search books by title or author (case-insensitive, partial matches).
 
-    # Ensure search type is valid, default to 'title'
-    if by not in ["title", "author"]:
-        by = "title"
+    Returns every match as a copied dict; search_page and iter_search page
+    through large result sets without copying.
+    """
+    with _catalog_lock:
+        # Ensure search type is valid, default to 'title'
+        if by not in ["title", "author"]:
+            by = "title"
 
-        # Normalize the query for case-insensitive matching
-    normalized_query = query.lower()
+            # Normalize the query for case-insensitive matching
+        normalized_query = query.lower()
 
-    matching_books = []
-    # Iterate through the values (book dictionaries) in the books global dictionary
-    for isbn, book_details in books.items():
-        # Check the specified field (title or author)
-        if normalized_query in book_details[by].lower():
+        matching_books = []
+        # Only the ISBNs found through the n-gram index are visited, in catalog order
+        for isbn in sorted(_match_set(normalized_query, by), key=_book_order.__getitem__):
             # Create a copy including the ISBN for the result list
             result_book = {"isbn": isbn}
-            result_book.update(book_details)
+            result_book.update(books[isbn])
             matching_books.append(result_book)
 
-    return matching_books
+        return matching_books
+
+
+# Paginated Search
+
+def _relevance(text, query):
+    """Internal helper scoring how well a field matches a query it contains.
+
+    4: the whole field, 3: a prefix of the field, 2: a whole word,
+    1: the start of a word, 0: only inside a word.
+    """
+    text = text.lower()
+    if text == query:
+        return 4
+    if text.startswith(query):
+        return 3
+    best = 0
+    position = text.find(query)
+    while position != -1:
+        if position == 0 or not text[position - 1].isalnum():
+            end = position + len(query)
+            if end == len(text) or not text[end].isalnum():
+                return 2
+            best = 1
+        position = text.find(query, position + 1)
+    return best
+
+
+@_instrumented
+def count_matches(query, by="title"):
+    """Return how many books a search would find, without building any results."""
+    with _catalog_lock:
+        return len(_match_set(query.lower(), by if by in SEARCH_FIELDS else "title"))
+
+
+@_instrumented
+def search_page(query, by="title", limit=20, after=None, offset=0, ranked=False):
+    """Return one page of search results as (views, cursor).
+
+    views are read-only BookView objects (no copies). Pass the returned cursor
+    as `after` to get the next page; it is None once there are no more
+    results. offset skips that many results first. Results are in catalog
+    order, or with ranked=True by relevance (whole field, then prefix, whole
+    word, word start, mid-word), ties in catalog order; ranking keeps only
+    the top offset + limit candidates in a heap.
+    """
+    if by not in SEARCH_FIELDS:
+        by = "title"
+    normalized_query = query.lower()
+    wanted = offset + limit
+    with _catalog_lock:
+        matches = _match_set(normalized_query, by)
+        if ranked:
+            keyed = ((-_relevance(getattr(books[isbn], by), normalized_query), _book_order[isbn], isbn)
+                     for isbn in matches)
+            if after is not None:
+                keyed = (entry for entry in keyed if entry[:2] > after)
+            top = heapq.nsmallest(wanted + 1, keyed)
+            page = [(entry[:2], entry[2]) for entry in top[offset:wanted]]
+            more = len(top) > wanted
+        else:
+            start = after[0] + 1 if after is not None else 0
+            remaining = len(_catalog_slots) - start
+            if (wanted + 1) * remaining <= len(matches) * len(matches):
+                # Dense matches: walk the catalog from the cursor, stopping once the page is full
+                found = []
+                slots = _catalog_slots
+                for position in range(start, len(slots)):
+                    isbn = slots[position]
+                    if isbn is not None and isbn in matches:
+                        found.append(((position,), isbn))
+                        if len(found) > wanted:
+                            break
+            else:
+                # Sparse matches: pick the next positions among the matches with a heap
+                positions = (_book_order[isbn] for isbn in matches)
+                found = [((position,), _catalog_slots[position])
+                         for position in heapq.nsmallest(wanted + 1, (p for p in positions if p >= start))]
+            page = found[offset:wanted]
+            more = len(found) > wanted
+        views = [BookView(isbn, books[isbn]) for _, isbn in page]
+        cursor = page[-1][0] if more and page else None
+        return views, cursor
+
+
+def iter_search(query, by="title", ranked=False, page_size=100):
+    """Yield read-only BookView results lazily, fetching page_size of them at a time."""
+    cursor = None
+    while True:
+        views, cursor = search_page(query, by, limit=page_size, after=cursor, ranked=ranked)
+        yield from views
+        if cursor is None:
+            return
+
+
+# Faceted Search
+
+def _bits_of(isbns):
+    """Internal helper turning a set of ISBNs into a slot bitmap (as an int).
+
+    The slots are first marked one byte each, in C (deque consumes the map),
+    then the bytes are packed eight to a byte with three shift-and-mask steps.
+    """
+    size = (_next_book_order + 7) & ~7
+    bytemap = bytearray(size)
+    deque(map(bytemap.__setitem__, map(_book_order.__getitem__, isbns), itertools.repeat(1)), 0)
+    bits = int.from_bytes(bytemap, "little")
+    for shift, pattern in ((7, b"\x03\x00"), (14, b"\x0f\x00\x00\x00"), (28, b"\xff" + bytes(7))):
+        bits = (bits | bits >> shift) & int.from_bytes(pattern * (size // len(pattern)), "little")
+    return int.from_bytes(bits.to_bytes(size, "little")[::8], "little")
+
+
+def _slots_of(bits, skip, count):
+    """Internal helper returning up to count set slots of a bitmap in ascending order, after skipping skip."""
+    data = bits.to_bytes((bits.bit_length() + 7) >> 3, "little")
+    slots = []
+    if count <= 0:
+        return slots
+    # The regex skips runs of empty bytes at C speed
+    for match in _NONZERO_BYTE.finditer(data):
+        byte = data[match.start()]
+        if skip >= byte.bit_count():
+            skip -= byte.bit_count()
+            continue
+        for bit in range(8):
+            if byte >> bit & 1:
+                if skip:
+                    skip -= 1
+                    continue
+                slots.append((match.start() << 3) + bit)
+                if len(slots) == count:
+                    return slots
+    return slots
+
+
+@_instrumented
+def facet_search(query="", by="title", genres=None, available=None, author=None, limit=20, offset=0):
+    """Filter books by text, genre, availability and author together, with facet counts.
+
+    query matches the `by` field as in search_books (an empty query matches
+    every book); author, if given, must also be contained in the author.
+    genres keeps only those genres; available=True keeps books with a copy on
+    the shelf, False those without. Returns a dict with the number of matches
+    ("total"), one page of them as read-only BookViews in catalog order
+    ("books", skipping offset) and the facet counts ("facets": {"genre":
+    {genre: count}, "available": {True: count, False: count}}). Each facet is
+    counted under every other filter, so a count is the total that choosing
+    that value would give.
+    """
+    if by not in SEARCH_FIELDS:
+        by = "title"
+    with _catalog_lock:
+        genre_bits = {genre: int.from_bytes(bitmap, "little") for genre, bitmap in _genre_bitmaps.items()}
+        available_bits = int.from_bytes(_available_bitmap, "little")
+        live = 0
+        for bits in genre_bits.values():
+            live |= bits
+        text = _bits_of(_match_set(query.lower(), by)) if query else live
+        if author:
+            text &= _bits_of(_match_set(author.lower(), "author"))
+
+        if genres is None:
+            genre_filter = live
+        else:
+            genre_filter = 0
+            for genre in genres:
+                genre_filter |= genre_bits.get(genre, 0)
+        if available is None:
+            availability_filter = live
+        elif available:
+            availability_filter = available_bits
+        else:
+            availability_filter = live & ~available_bits
+
+        by_genre = text & availability_filter
+        by_availability = text & genre_filter
+        matches = by_genre & genre_filter
+        slots = _catalog_slots
+        return {
+            "total": matches.bit_count(),
+            "books": [BookView(slots[slot], books[slots[slot]]) for slot in _slots_of(matches, offset, limit)],
+            "facets": {
+                "genre": {genre: (by_genre & bits).bit_count() for genre, bits in genre_bits.items()},
+                "available": {True: (by_availability & available_bits).bit_count(),
+                              False: (by_availability & ~available_bits).bit_count()},
+            },
+        }
 
 
 # Update
 
-def update_book(isbn, title=None, author=None, genre=None, total_copies=None):
-    """Update specified fields of a book if it exists and genre is valid."""
-    if isbn not in books:
-        print(f"Error: Book with ISBN {isbn} not found.")
-        return False
+@_instrumented
+def update_book(isbn, title=None, author=None, genre=None, total_copies=None, detailed=False, hand_off=True):
+    """Update specified fields of a book if it exists and genre is valid.
 
-    book = books[isbn]
+    total_copies sets how many copies are on the shelf: new copies get the
+    lowest free numbers, withdrawn ones are the highest-numbered on the shelf,
+    and copies on loan stay owned (original_copies = total_copies + on loan).
+    Copies added by raising total_copies go to waiting holders first (unless hand_off is False).
+    """
+    with _locked(isbns=(isbn,), catalog=True):
+        if isbn not in books:
+            return _fail(Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found."), detailed)
 
-    if title is not None:
-        book["title"] = title
-    if author is not None:
-        book["author"] = author
-    if genre is not None:
-        if not _is_valid_genre(genre):
-            print(f"Error: Invalid genre '{genre}'. Update failed.")
-            return False
-        book["genre"] = genre
+        book = books[isbn]
 
-    if total_copies is not None:
-        if not isinstance(total_copies, int) or total_copies < 0:
-            print("Error: Total copies must be a non-negative integer. Update failed.")
-            return False
+        # Validate everything first so a rejected update leaves the book untouched
+        if genre is not None and not is_valid_genre(genre):
+            return _fail(Result(INVALID_GENRE, f"Error: Invalid genre '{genre}'. Update failed."), detailed)
+        if any(text is not None and not isinstance(text, str) for text in (title, author)):
+            return _fail(Result(INVALID_TEXT, "Error: Title and author must be strings. Update failed."), detailed)
 
-        # Calculate difference to update the original_copies count as well.
-        # This keeps the 'delete_book' constraint relevant.
-        borrowed_count = book["original_copies"] - book["total_copies"]
+        if total_copies is not None:
+            if not isinstance(total_copies, int) or total_copies < 0:
+                return _fail(Result(INVALID_COPIES, "Error: Total copies must be a non-negative integer. Update failed."), detailed)
 
-        # Ensure the new total_copies is not less than the currently borrowed count
-        if total_copies < borrowed_count:
-            print(f"Error: Cannot set total copies to {total_copies}. {borrowed_count} copies are currently borrowed.")
-            return False
+            # Copies on loan stay owned, so original_copies keeps counting them
+            # (this keeps the 'delete_book' constraint relevant).
+            borrowed_count = book.original_copies - book.total_copies
 
-        book["total_copies"] = total_copies
-        book["original_copies"] = total_copies  # Reset original_copies to the new total
+            # Ensure the new total_copies is not less than the currently borrowed count
+            if total_copies < borrowed_count:
+                return _fail(Result(COPIES_ON_LOAN, f"Error: Cannot set total copies to {total_copies}. {borrowed_count} copies are currently borrowed."), detailed)
 
-    return True
+        _bump_catalog_version()
+        if title is not None:
+            _unindex_field(isbn, "title", book.title)
+            book.title = title
+            _index_field(isbn, "title", title)
+        if author is not None:
+            _unindex_field(isbn, "author", book.author)
+            book.author = shared(author)
+            _index_field(isbn, "author", author)
+        if genre is not None:
+            _clear_facets(isbn, book)
+            book.genre = shared(genre)
+        if total_copies is not None:
+            _restock(isbn, book.total_copies, total_copies)
+            book.total_copies = total_copies
+            book.original_copies = total_copies + borrowed_count
+        if genre is not None or total_copies is not None:
+            _set_facets(isbn, book)
 
+        # Hand-offs are logged as their own borrow_book records, so replay must not repeat them
+        _notify("update_book", isbn=isbn, title=title, author=author, genre=genre, total_copies=total_copies,
+                hand_off=False)
+    if hand_off and total_copies is not None:
+        _hand_off(isbn)
+    return SUCCESS if detailed else True
 
-def update_member(member_id, name=None, email=None):
+
+@_instrumented
+def update_member(member_id, name=None, email=None, detailed=False):
     """Update specified fields of a member if they exist."""
-    member = _get_member(member_id)
-    if not member:
-        print(f"Error: Member with ID {member_id} not found.")
-        return False
+    with _locked(member_ids=(member_id,), catalog=True):
+        member = _get_member(member_id)
+        if not member:
+            return _fail(Result(NOT_FOUND, f"Error: Member with ID {member_id} not found."), detailed)
 
-    if name is not None:
-        member["name"] = name
-    if email is not None:
-        member["email"] = email
+        if email is not None:
+            owner = _member_emails.get(email_key(email))
+            if owner is not None and owner != member_id:
+                return _fail(Result(DUPLICATE_EMAIL, f"Error: Email {email} is already registered to another member. Update failed."), detailed)
 
-    return True
+        if name is not None:
+            member.name = name
+        if email is not None:
+            del _member_emails[email_key(member.email)]
+            member.email = email
+            _member_emails[email_key(email)] = member_id
+
+        _notify("update_member", member_id=member_id, name=name, email=email)
+        return SUCCESS if detailed else True
 
 
 # Delete
 
-def delete_book(isbn):
-    """Remove a book if it exists and all copies are available."""
-    if isbn not in books:
-        print(f"Error: Book with ISBN {isbn} not found.")
-        return False
+@_instrumented
+def delete_book(isbn, detailed=False):
+    """Remove a book if it exists and all copies are available (its hold queue is dropped)."""
+    with _locked(isbns=(isbn,), catalog=True):
+        if isbn not in books:
+            return _fail(Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found."), detailed)
+
+        book = books[isbn]
+
+        # This means total_copies must equal the original number of copies.
+        if book.total_copies != book.original_copies:
+            return _fail(Result(COPIES_ON_LOAN, f"Error: Cannot delete book {isbn}. Some copies are currently borrowed "
+                                                f"by: {_holders_of(isbn)}."), detailed)
+
+        _bump_catalog_version()
+        for field in SEARCH_FIELDS:
+            _unindex_field(isbn, field, getattr(book, field))
+        _clear_facets(isbn, book)
+        del books[isbn]
+        del _shelf[isbn]
+        _catalog_slots[_book_order.pop(isbn)] = None
+        _drop_book_holds(isbn)
+        _notify("delete_book", isbn=isbn)
+        return SUCCESS if detailed else True
+
+
+@_instrumented
+def delete_member(member_id, detailed=False):
+    """Remove a member if they exist and have no borrowed books (their holds are cancelled)."""
+    with _locked(member_ids=(member_id,), catalog=True):
+        member = _get_member(member_id)
+        if not member:
+            return _fail(Result(NOT_FOUND, f"Error: Member with ID {member_id} not found."), detailed)
 
+        # Constraint: Must have no borrowed books.
+        if member.borrowed_books:
+            return _fail(Result(HAS_LOANS, f"Error: Cannot delete member {member_id}. They have borrowed books: {list(member.borrowed_books)}."), detailed)
+
+        del members[member_id]
+        del _member_emails[email_key(member.email)]
+        _drop_member_holds(member_id)
+        _notify("delete_member", member_id=member_id)
+        return SUCCESS if detailed else True
+
+
+# Loan Ledger
+
+def _start_loan(isbn, member_id, now, copy=None):
+    """Internal helper recording a new loan in the ledger, the holder index and the due heap."""
+    loan = Loan(isbn, member_id, now, now + LOAN_PERIOD_DAYS * 86400, copy)
+    with _ledger_lock:
+        _loans[(isbn, member_id)] = loan
+        holders = _holders.get(isbn)
+        if holders is None:
+            _holders[isbn] = {member_id}
+        else:
+            holders.add(member_id)
+        heapq.heappush(_due_heap, (loan.due_at, next(_heap_sequence), loan))
+
+
+def _end_loan(isbn, member_id):
+    """Internal helper closing a loan and returning it; its heap entry goes stale and is compacted away later."""
+    global _stale_heap_entries
+    with _ledger_lock:
+        loan = _loans.pop((isbn, member_id))
+        holders = _holders[isbn]
+        holders.discard(member_id)
+        if not holders:
+            del _holders[isbn]
+        _stale_heap_entries += 1
+        # Compact once stale entries outnumber live ones, so the heap stays O(live loans)
+        if _stale_heap_entries > 64 and _stale_heap_entries * 2 > len(_due_heap):
+            _due_heap[:] = [entry for entry in _due_heap if _loans.get((entry[2].isbn, entry[2].member_id)) is entry[2]]
+            heapq.heapify(_due_heap)
+            _stale_heap_entries = 0
+    return loan
+
+
+def _rebuild_catalog_slots():
+    """Internal helper rebuilding the insertion number -> ISBN list after state is loaded."""
+    global _catalog_slots
+    _catalog_slots = [None] * _next_book_order
+    for isbn, order in _book_order.items():
+        _catalog_slots[order] = isbn
+
+
+def _set_bit(bitmap, slot, on):
+    """Internal helper setting or clearing one bit, growing the bitmap as needed (hold _facets_lock)."""
+    index = slot >> 3
+    if index >= len(bitmap):
+        bitmap.extend(bytes(index + 1 - len(bitmap)))
+    if on:
+        bitmap[index] |= 1 << (slot & 7)
+    else:
+        bitmap[index] &= ~(1 << (slot & 7)) & 0xFF
+
+
+def _set_facets(isbn, book):
+    """Internal helper setting a book's genre and availability bits."""
+    slot = _book_order[isbn]
+    with _facets_lock:
+        _set_bit(_genre_bitmaps[book.genre], slot, True)
+        _set_bit(_available_bitmap, slot, book.total_copies > 0)
+
+
+def _clear_facets(isbn, book):
+    """Internal helper clearing a book's genre and availability bits."""
+    slot = _book_order[isbn]
+    with _facets_lock:
+        _set_bit(_genre_bitmaps[book.genre], slot, False)
+        _set_bit(_available_bitmap, slot, False)
+
+
+def _set_available(isbn, available):
+    """Internal helper updating a book's availability bit when its last copy leaves or the first comes back."""
+    slot = _book_order[isbn]
+    with _facets_lock:
+        _set_bit(_available_bitmap, slot, available)
+
+
+def _rebuild_facets():
+    """Internal helper rebuilding the facet bitmaps after state is loaded."""
+    global _genre_bitmaps, _available_bitmap
+    with _facets_lock:
+        _genre_bitmaps = {genre: bytearray() for genre in GENRES}
+        _available_bitmap = bytearray()
+        for isbn, book in books.items():
+            slot = _book_order[isbn]
+            _set_bit(_genre_bitmaps[book.genre], slot, True)
+            _set_bit(_available_bitmap, slot, book.total_copies > 0)
+
+
+def _rebuild_loan_indexes():
+    """Internal helper rebuilding the holder index and due heap from the ledger after state is loaded."""
+    global _holders, _due_heap, _stale_heap_entries
+    now = time.time()
+    for member_id, member in members.items():
+        for isbn in member.borrowed_books:
+            if (isbn, member_id) not in _loans:
+                # State saved before the ledger existed has no borrow times; start the loan period now
+                _loans[(isbn, member_id)] = Loan(isbn, member_id, now, now + LOAN_PERIOD_DAYS * 86400)
+    _holders = {}
+    for isbn, member_id in _loans:
+        _holders.setdefault(isbn, set()).add(member_id)
+    _due_heap = [(loan.due_at, next(_heap_sequence), loan) for loan in _loans.values()]
+    heapq.heapify(_due_heap)
+    _stale_heap_entries = 0
+
+
+# Physical Copies
+
+def copy_barcode(isbn, copy):
+    """Return the barcode of copy number copy of a book."""
+    return f"{isbn}#{copy}"
+
+
+def _parse_barcode(barcode):
+    """Internal helper splitting a barcode into (isbn, copy number); the number is None if malformed."""
+    isbn, _, number = str(barcode).rpartition("#")
+    return isbn, int(number) if number.isdigit() and int(number) > 0 else None
+
+
+def _loaned_copies(isbn):
+    """Internal helper returning {copy number: member_id} for the copies of a book on loan."""
+    return {_loans[(isbn, member_id)].copy: member_id for member_id in _holders.get(isbn, ())}
+
+
+def _take_copy(isbn, copy=None):
+    """Internal helper taking a copy (the lowest-numbered one unless given) off the shelf; returns its number."""
+    shelf = _shelf[isbn]
+    if copy is None:
+        copy = (shelf & -shelf).bit_length()
+    _shelf[isbn] = shelf & ~(1 << (copy - 1))
+    return copy
+
+
+def lend_copy(isbn, member_id, now, copy=None):
+    """Take a copy of a book (the lowest-numbered one unless given) off the shelf and open its loan.
+
+    Returns the copy number. This is the book's half of a loan: the member's
+    borrowed_books is left alone, for callers that keep it elsewhere (a shard
+    worker whose member lives on another shard). The caller holds the book's
+    lock and has checked that the loan is allowed.
+    """
     book = books[isbn]
+    copy = _take_copy(isbn, copy)
+    book.total_copies -= 1
+    if not book.total_copies:
+        _set_available(isbn, False)
+    _start_loan(isbn, member_id, now, copy)
+    return copy
 
-    # This means total_copies must equal the original number of copies.
-    if book["total_copies"] != book["original_copies"]:
-        print(f"Error: Cannot delete book {isbn}. Some copies are currently borrowed.")
-        return False
 
-    del books[isbn]
-    return True
+def receive_copy(isbn, member_id):
+    """Close a member's loan of a book and put the copy back on the shelf; returns the copy number.
 
+    The book's half of a return, like lend_copy.
+    """
+    book = books[isbn]
+    copy = _end_loan(isbn, member_id).copy
+    _shelf[isbn] |= 1 << (copy - 1)
+    book.total_copies += 1
+    if book.total_copies == 1:
+        _set_available(isbn, True)
+    return copy
 
-def delete_member(member_id):
-    """Remove a member if they exist and have no borrowed books."""
-    member = _get_member(member_id)
-    if not member:
-        print(f"Error: Member with ID {member_id} not found.")
-        return False
 
-    # Constraint: Must have no borrowed books.
-    if member["borrowed_books"]:
-        print(f"Error: Cannot delete member {member_id}. They have borrowed books: {member['borrowed_books']}.")
-        return False
+def _lend(isbn, member, member_id, now, copy=None):
+    """Internal helper lending one copy of a book to a member; returns the copy number."""
+    copy = lend_copy(isbn, member_id, now, copy)
+    member.add_loan(isbn)
+    return copy
 
-    members.remove(member)
-    return True
 
+def _receive(isbn, member, member_id):
+    """Internal helper putting a member's copy of a book back on the shelf; returns the copy number."""
+    copy = receive_copy(isbn, member_id)
+    member.remove_loan(isbn)
+    return copy
 
-# Borrow/Return
 
-def borrow_book(isbn, member_id):
-    """Borrows a book if available and member has room."""
-    book = books.get(isbn)
-    member = _get_member(member_id)
+def _restock(isbn, available, wanted):
+    """Internal helper adding or withdrawing shelf copies so that wanted of them are available."""
+    shelf = _shelf[isbn]
+    if wanted < available:
+        for _ in range(available - wanted):
+            shelf &= ~(1 << (shelf.bit_length() - 1))
+    elif wanted > available:
+        taken = shelf
+        for copy in _loaned_copies(isbn):
+            taken |= 1 << (copy - 1)
+        position = 0
+        for _ in range(wanted - available):
+            while taken >> position & 1:
+                position += 1
+            taken |= 1 << position
+            shelf |= 1 << position
+    _shelf[isbn] = shelf
 
-    if not book:
-        print(f"Error: Book with ISBN {isbn} not found.")
-        return False
-    if not member:
-        print(f"Error: Member with ID {member_id} not found.")
-        return False
 
-    if book["total_copies"] <= 0:
-        print(f"Error: No copies of book {isbn} are currently available.")
-        return False
+def _copy_problem(isbn, copy, barcode):
+    """Internal helper returning None if a copy of a book is on the shelf, else the failed Result."""
+    if copy is None or not _shelf[isbn] >> (copy - 1) & 1:
+        holder = _loaned_copies(isbn).get(copy) if copy is not None else None
+        if holder is None:
+            return Result(NOT_FOUND, f"Error: Copy {barcode} of book {isbn} not found.")
+        return Result(NO_COPIES, f"Error: Copy {barcode} is on loan to member {holder}.")
+    return None
+
+
+def _rebuild_shelves():
+    """Internal helper giving loaded books the shelves and loans the copies they are missing.
+
+    State saved before copies were tracked only has counters: its loans get
+    the lowest copy numbers and the shelf the next total_copies ones.
+    """
+    for isbn, book in books.items():
+        loans = [_loans[(isbn, member_id)] for member_id in sorted(_holders.get(isbn, ()))]
+        numbered = {loan.copy for loan in loans if loan.copy is not None}
+        taken = _shelf.get(isbn, 0)
+        for copy in numbered:
+            taken |= 1 << (copy - 1)
+        position = 0
+        for loan in loans:
+            if loan.copy is None:
+                while taken >> position & 1:
+                    position += 1
+                taken |= 1 << position
+                loan.copy = position + 1
+        if isbn not in _shelf:
+            shelf = 0
+            for _ in range(book.total_copies):
+                while taken >> position & 1:
+                    position += 1
+                taken |= 1 << position
+                shelf |= 1 << position
+            _shelf[isbn] = shelf
+
+
+@_instrumented
+def copies_of(isbn):
+    """Return [(barcode, member_id or None)] for every copy of a book in copy order, or None if unknown."""
+    with _stripes[hash(isbn) % LOCK_STRIPES]:
+        if isbn not in books:
+            return None
+        shelf = _shelf[isbn]
+        copies = {copy: None for copy in range(1, shelf.bit_length() + 1) if shelf >> (copy - 1) & 1}
+        copies.update(_loaned_copies(isbn))
+        return [(copy_barcode(isbn, copy), copies[copy]) for copy in sorted(copies)]
+
+
+@_instrumented
+def first_available_copy(isbn):
+    """Return the barcode of the lowest-numbered copy of a book on the shelf, or None."""
+    shelf = _shelf.get(isbn, 0)
+    return copy_barcode(isbn, (shelf & -shelf).bit_length()) if shelf else None
+
+
+@_instrumented
+def find_copy(barcode):
+    """Return (isbn, member_id or None) for the copy with a barcode, or None if there is no such copy."""
+    isbn, copy = _parse_barcode(barcode)
+    with _stripes[hash(isbn) % LOCK_STRIPES]:
+        if isbn not in books or copy is None:
+            return None
+        if _shelf[isbn] >> (copy - 1) & 1:
+            return isbn, None
+        holder = _loaned_copies(isbn).get(copy)
+        return (isbn, holder) if holder is not None else None
+
+
+def _loans_by_due_date(limit=None, due_before=None):
+    """Internal helper returning live loans in due-date order without modifying the heap.
+
+    Walks the heap array as a tree with a small frontier heap, so the first k
+    loans cost O(k log k) plus the stale entries passed on the way.
+    """
+    found = []
+    with _ledger_lock:
+        heap = _due_heap
+        frontier = [(heap[0][0], heap[0][1], 0)] if heap else []
+        while frontier and (limit is None or len(found) < limit):
+            due_at, _, index = heapq.heappop(frontier)
+            if due_before is not None and due_at >= due_before:
+                break  # Every remaining entry is due at or after this one
+            loan = heap[index][2]
+            if _loans.get((loan.isbn, loan.member_id)) is loan:
+                found.append(loan)
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child][0], heap[child][1], child))
+    return found
+
+
+def _has_loan(isbn, member_id):
+    """Internal helper telling whether a member currently borrows a book (O(1), via the ledger)."""
+    return (isbn, member_id) in _loans
+
+
+@_instrumented
+def get_loan(isbn, member_id):
+    """Return the Loan record for a member's copy of a book, or None."""
+    return _loans.get((isbn, member_id))
+
+
+@_instrumented
+def holders_of(isbn):
+    """Return the IDs of the members currently borrowing a book, sorted."""
+    return _holders_of(isbn)
+
+
+def _holders_of(isbn):
+    """Internal helper behind holders_of, for callers that should not count as a public call."""
+    with _ledger_lock:
+        return sorted(_holders.get(isbn, ()))
+
+
+@_instrumented
+def overdue_loans(as_of=None, limit=None):
+    """Return loans past their due date at as_of (default: now), most overdue first.
+
+    limit caps how many are returned; the cost grows with the number returned,
+    not with the number of loans.
+    """
+    return _loans_by_due_date(limit, time.time() if as_of is None else as_of)
+
+
+@_instrumented
+def next_due(count):
+    """Return the count loans with the earliest due dates (overdue ones first)."""
+    return _loans_by_due_date(count)
+
+
+# Hold Queues
+
+class _HoldQueue:
+    """Internal FIFO of members waiting for one ISBN, with O(1) enqueue, dequeue and position.
+
+    Every hold takes the next ticket number. Cancelled holds stay in the deque
+    as stale entries until they reach the front; their tickets are kept sorted
+    in `cancelled`, so a member's position is their ticket minus the head's,
+    less the cancelled tickets in between.
+    """
+
+    __slots__ = ("entries", "tickets", "next_ticket", "cancelled")
+
+    def __init__(self):
+        self.entries = deque()   # (ticket, member_id), oldest first, including cancelled ones
+        self.tickets = {}        # member_id -> ticket, waiting members only
+        self.next_ticket = 0
+        self.cancelled = []      # sorted tickets of cancelled entries still in the deque
+
+    def __len__(self):
+        return len(self.tickets)
+
+    def __iter__(self):
+        """Waiting member IDs in queue order."""
+        return (member_id for ticket, member_id in self.entries if self.tickets.get(member_id) == ticket)
+
+    def add(self, member_id):
+        self.tickets[member_id] = self.next_ticket
+        self.entries.append((self.next_ticket, member_id))
+        self.next_ticket += 1
+
+    def remove(self, member_id):
+        ticket = self.tickets.pop(member_id)
+        if self.entries[0][0] == ticket:
+            self.entries.popleft()
+        else:
+            bisect.insort(self.cancelled, ticket)
+        # Drop cancelled entries that have reached the front
+        while self.cancelled and self.entries[0][0] == self.cancelled[0]:
+            self.entries.popleft()
+            del self.cancelled[0]
+
+    def position(self, member_id):
+        """1-based place in the queue, or None if the member is not waiting."""
+        ticket = self.tickets.get(member_id)
+        if ticket is None:
+            return None
+        return ticket - self.entries[0][0] - bisect.bisect_left(self.cancelled, ticket) + 1
+
+
+def _can_receive(isbn, member_id):
+    """Internal helper telling whether a waiting member can take a copy right now."""
+    member = members.get(member_id)
+    return (member is not None and len(member.borrowed_books) < MAX_BORROWED_BOOKS
+            and not _has_loan(isbn, member_id))
+
+
+def _next_eligible_holder(isbn):
+    """Internal helper returning the first waiting member with room for another book, or None.
+
+    Holders at the borrowing limit keep their place and are passed over.
+    """
+    queue = _holds.get(isbn)
+    if queue is None:
+        return None
+    for member_id in queue:
+        if _can_receive(isbn, member_id):
+            return member_id
+    return None
+
+
+def _clear_hold(isbn, member_id):
+    """Internal helper removing a member's hold on a book; returns False if there was none."""
+    with _holds_lock:
+        queue = _holds.get(isbn)
+        if queue is None or member_id not in queue.tickets:
+            return False
+        queue.remove(member_id)
+        if not queue:
+            del _holds[isbn]
+        waiting_for = _member_holds[member_id]
+        waiting_for.discard(isbn)
+        if not waiting_for:
+            del _member_holds[member_id]
+        return True
+
+
+def _drop_book_holds(isbn):
+    """Internal helper cancelling every hold on a deleted book."""
+    with _holds_lock:
+        for member_id in _holds.pop(isbn, ()):
+            waiting_for = _member_holds[member_id]
+            waiting_for.discard(isbn)
+            if not waiting_for:
+                del _member_holds[member_id]
+
+
+def _drop_member_holds(member_id):
+    """Internal helper cancelling every hold of a deleted member."""
+    with _holds_lock:
+        for isbn in _member_holds.pop(member_id, ()):
+            queue = _holds[isbn]
+            queue.remove(member_id)
+            if not queue:
+                del _holds[isbn]
+
+
+def _hand_off(isbn):
+    """Internal helper lending free copies of a book to waiting members, in queue order.
+
+    Runs after the freeing operation has released its locks, then locks the
+    book together with each chosen member and re-checks before lending.
+    """
+    while True:
+        with _holds_lock:
+            candidate = _next_eligible_holder(isbn)
+        if candidate is None:
+            return
+        with _locked(isbns=(isbn,), member_ids=(candidate,)):
+            book = books.get(isbn)
+            if book is None or book.total_copies <= 0:
+                return
+            with _holds_lock:
+                if _next_eligible_holder(isbn) != candidate:
+                    continue  # The queue changed meanwhile; pick again
+            now = time.time()
+            copy = _lend(isbn, members[candidate], candidate, now)
+            _clear_hold(isbn, candidate)
+            _notify("borrow_book", isbn=isbn, member_id=candidate, now=now, barcode=copy_barcode(isbn, copy))
+
+
+def _hand_off_after_return(isbn, member_id):
+    """Internal helper handing off after a member returns a book.
+
+    The freed copy goes to the book's queue, and the member, who now has room,
+    may receive free copies of books they are waiting for.
+    """
+    if isbn in _holds:
+        _hand_off(isbn)
+    if member_id in _member_holds:
+        for waiting_for in _waiting_for(member_id):
+            _hand_off(waiting_for)
+
+
+@_instrumented
+def place_hold(isbn, member_id, detailed=False):
+    """Join the hold queue for a book that has no copy available.
+
+    The member is lent the next copy returned once they reach the front of
+    the queue and have room under the borrowing limit.
+    """
+    with _locked(isbns=(isbn,), member_ids=(member_id,)):
+        book = books.get(isbn)
+        member = _get_member(member_id)
+        if not book:
+            return _fail(Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found."), detailed)
+        if not member:
+            return _fail(Result(NOT_FOUND, f"Error: Member with ID {member_id} not found."), detailed)
+        if book.total_copies > 0:
+            return _fail(Result(COPIES_AVAILABLE, f"Error: Book {isbn} has copies available. Borrow it instead."), detailed)
+        if _has_loan(isbn, member_id):
+            return _fail(Result(ALREADY_BORROWED, f"Error: Member {member_id} has already borrowed a copy of book {isbn}."), detailed)
+
+        with _holds_lock:
+            queue = _holds.get(isbn)
+            if queue is not None and member_id in queue.tickets:
+                return _fail(Result(ALREADY_HELD, f"Error: Member {member_id} is already waiting for book {isbn}."), detailed)
+            if queue is None:
+                queue = _holds[isbn] = _HoldQueue()
+            queue.add(member_id)
+            _member_holds.setdefault(member_id, set()).add(isbn)
+        _notify("place_hold", isbn=isbn, member_id=member_id)
+        return SUCCESS if detailed else True
+
+
+@_instrumented
+def cancel_hold(isbn, member_id, detailed=False):
+    """Leave the hold queue for a book."""
+    with _locked(isbns=(isbn,), member_ids=(member_id,)):
+        if not _clear_hold(isbn, member_id):
+            return _fail(Result(NOT_HELD, f"Error: Member {member_id} is not waiting for book {isbn}."), detailed)
+        _notify("cancel_hold", isbn=isbn, member_id=member_id)
+        return SUCCESS if detailed else True
+
+
+@_instrumented
+def hold_position(isbn, member_id):
+    """Return a member's 1-based place in a book's hold queue, or None if not waiting."""
+    with _holds_lock:
+        queue = _holds.get(isbn)
+        return queue.position(member_id) if queue is not None else None
+
+
+@_instrumented
+def hold_queue(isbn):
+    """Return the member IDs waiting for a book, in queue order."""
+    with _holds_lock:
+        return list(_holds.get(isbn, ()))
+
+
+@_instrumented
+def member_holds(member_id):
+    """Return the ISBNs a member is waiting for."""
+    return _waiting_for(member_id)
+
+
+def _waiting_for(member_id):
+    """Internal helper behind member_holds, for callers that should not count as a public call."""
+    with _holds_lock:
+        return sorted(_member_holds.get(member_id, ()))
+
+
+# Borrow/Return
+
+def _borrow_problem(book, member, isbn, member_id, pending_loans=0):
+    """Internal helper returning why a member cannot borrow a book (a failed Result), or None if they can.
+
+    pending_loans counts books already being borrowed earlier in the same batch.
+    """
+    if book.total_copies <= 0:
+        return Result(NO_COPIES, f"Error: No copies of book {isbn} are currently available.")
 
     # Max borrowed books constraint
-    if len(member["borrowed_books"]) >= 3:
-        print(f"Error: Member {member_id} has reached the borrowing limit (3 books).")
-        return False
+    if len(member.borrowed_books) + pending_loans >= MAX_BORROWED_BOOKS:
+        return Result(LIMIT_REACHED, f"Error: Member {member_id} has reached the borrowing limit ({MAX_BORROWED_BOOKS} books).")
 
     # Prevent borrowing the same book twice
-    if isbn in member["borrowed_books"]:
-        print(f"Error: Member {member_id} has already borrowed a copy of book {isbn}.")
-        return False
+    if _has_loan(isbn, member_id):
+        return Result(ALREADY_BORROWED, f"Error: Member {member_id} has already borrowed a copy of book {isbn}.")
+    return None
 
-    # Execute borrow transaction
-    book["total_copies"] -= 1
-    member["borrowed_books"].append(isbn)
-    return True
 
+def _return_problem(book, member, isbn, member_id):
+    """Internal helper returning why a member cannot return a book (a failed Result), or None if they can."""
+    if not _has_loan(isbn, member_id):
+        return Result(NOT_BORROWED, f"Error: Book {isbn} was not borrowed by member {member_id}.")
+    return None
 
-def return_book(isbn, member_id):
-    """Returns a book if it was actually borrowed by the member."""
-    book = books.get(isbn)
-    member = _get_member(member_id)
 
-    if not book:
-        print(f"Error: Book with ISBN {isbn} not found.")
-        return False
+@_instrumented
+def borrow_book(isbn, member_id, detailed=False, now=None, barcode=None):
+    """Borrows a book if available and member has room, fulfilling their hold on it if any.
+
+    now is the borrow time in epoch seconds (default: the current time); the
+    loan is due LOAN_PERIOD_DAYS later. barcode picks the copy to lend (it
+    must be on the shelf); by default it is the lowest-numbered copy there.
+    """
+    lower, upper = _circulation_stripes(isbn, member_id)
+    with lower, upper:
+        book = books.get(isbn)
+        member = _get_member(member_id)
+
+        if not book:
+            return _fail(Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found."), detailed)
+        if not member:
+            return _fail(Result(NOT_FOUND, f"Error: Member with ID {member_id} not found."), detailed)
+
+        problem = _borrow_problem(book, member, isbn, member_id)
+        copy = None
+        if problem is None and barcode is not None:
+            owner, copy = _parse_barcode(barcode)
+            problem = _copy_problem(isbn, copy if owner == isbn else None, barcode)
+        if problem is not None:
+            return _fail(problem, detailed)
+
+        # Execute borrow transaction
+        if now is None:
+            now = time.time()
+        copy = _lend(isbn, member, member_id, now, copy)
+        if isbn in _holds:
+            _clear_hold(isbn, member_id)
+        _notify("borrow_book", isbn=isbn, member_id=member_id, now=now, barcode=copy_barcode(isbn, copy))
+        return SUCCESS if detailed else True
+
+
+def _barcode_problem(isbn, member_id, barcode):
+    """Internal helper returning a failed Result unless barcode is the copy the member borrowed, else None."""
+    if copy_barcode(isbn, _loans[(isbn, member_id)].copy) != barcode:
+        return Result(NOT_BORROWED, f"Error: Copy {barcode} was not borrowed by member {member_id}.")
+    return None
+
+
+@_instrumented
+def return_book(isbn, member_id, detailed=False, hand_off=True, barcode=None):
+    """Returns a book if it was actually borrowed by the member.
+
+    barcode, if given, must be the copy the member borrowed. The freed copy
+    goes straight to the first eligible member in the book's hold queue
+    (unless hand_off is False).
+    """
+    lower, upper = _circulation_stripes(isbn, member_id)
+    with lower, upper:
+        book = books.get(isbn)
+        member = _get_member(member_id)
+
+        if not book:
+            return _fail(Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found."), detailed)
+        if not member:
+            return _fail(Result(NOT_FOUND, f"Error: Member with ID {member_id} not found."), detailed)
+
+        problem = _return_problem(book, member, isbn, member_id)
+        if problem is None and barcode is not None:
+            problem = _barcode_problem(isbn, member_id, barcode)
+        if problem is not None:
+            return _fail(problem, detailed)
+
+        # Execute return transaction
+        copy = _receive(isbn, member, member_id)
+        # Hand-offs are logged as their own borrow_book records, so replay must not repeat them
+        _notify("return_book", isbn=isbn, member_id=member_id, hand_off=False, barcode=copy_barcode(isbn, copy))
+    if hand_off:
+        _hand_off_after_return(isbn, member_id)
+    return SUCCESS if detailed else True
+
+
+# Batch Borrow/Return
+
+def _batch_problems(member_id, isbns, check):
+    """Internal helper validating every ISBN of a batch for one member.
+
+    Returns (member, problems) where problems is a list of (isbn, failed Result or None).
+    """
+    member = _get_member(member_id)
     if not member:
-        print(f"Error: Member with ID {member_id} not found.")
-        return False
+        problem = Result(NOT_FOUND, f"Error: Member with ID {member_id} not found.")
+        return None, [(isbn, problem) for isbn in isbns]
+
+    problems = []
+    seen = set()
+    for position, isbn in enumerate(isbns):
+        book = books.get(isbn)
+        if not book:
+            problem = Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found.")
+        elif isbn in seen:
+            problem = Result(DUPLICATE_ITEM, f"Error: Book {isbn} appears more than once in the batch.")
+        else:
+            problem = check(book, member, isbn, member_id, position)
+        seen.add(isbn)
+        problems.append((isbn, problem))
+    return member, problems
+
+
+def item_results(problems, detailed):
+    """Shape the per-item outcomes of a batch: Results if detailed, else error messages or None."""
+    if detailed:
+        return [(*item, SUCCESS if problem is None else problem) for *item, problem in problems]
+    return [(*item, None if problem is None else problem.message) for *item, problem in problems]
+
+
+def _finish_batch(action, member_id, problems, detailed):
+    """Internal helper reporting a batch; returns (overall outcome, per-item results)."""
+    failed = [isbn for isbn, problem in problems if problem is not None]
+    if not failed:
+        return (SUCCESS if detailed else True), item_results(problems, detailed)
+    summary = Result(BATCH_REJECTED, f"Error: {action} for member {member_id} cancelled. "
+                                     f"{len(failed)} of {len(problems)} item(s) failed: {failed}.")
+    return _fail(summary, detailed), item_results(problems, detailed)
+
+
+@_instrumented
+def borrow_books(member_id, isbns, detailed=False, now=None):
+    """Borrow several books for one member, all or nothing.
+
+    Every item is validated before anything changes, including the borrowing
+    limit for the batch as a whole. Returns (success, results) where results is
+    a list of (isbn, error message or None) in request order. With
+    detailed=True both the overall outcome and each item are Results. All
+    loans start at now (default: the current time).
+    """
+    isbns = list(isbns)
+    with _locked(isbns=isbns, member_ids=(member_id,)):
+        member, problems = _batch_problems(
+            member_id, isbns,
+            lambda book, member, isbn, member_id, position: _borrow_problem(book, member, isbn, member_id, position))
+        if member is not None and all(problem is None for _, problem in problems):
+            if now is None:
+                now = time.time()
+            for isbn in isbns:
+                _lend(isbn, member, member_id, now)
+                if isbn in _holds:
+                    _clear_hold(isbn, member_id)
+            _notify("borrow_books", member_id=member_id, isbns=isbns, now=now)
+        return _finish_batch("Checkout", member_id, problems, detailed)
+
+
+@_instrumented
+def return_books(member_id, isbns, detailed=False, hand_off=True, barcodes=None):
+    """Return several books for one member, all or nothing.
+
+    Returns (success, results) where results is a list of (isbn, error message
+    or None) in request order. With detailed=True both the overall outcome and
+    each item are Results. barcodes, if given, lists the copy returned for
+    each ISBN, as for return_book. Freed copies go to waiting holders as in
+    return_book.
+    """
+    isbns = list(isbns)
+
+    def check(book, member, isbn, member_id, position):
+        problem = _return_problem(book, member, isbn, member_id)
+        if problem is None and barcodes is not None:
+            problem = _barcode_problem(isbn, member_id, barcodes[position])
+        return problem
+
+    with _locked(isbns=isbns, member_ids=(member_id,)):
+        member, problems = _batch_problems(member_id, isbns, check)
+        if member is not None and all(problem is None for _, problem in problems):
+            returned = [copy_barcode(isbn, _receive(isbn, member, member_id)) for isbn in isbns]
+            _notify("return_books", member_id=member_id, isbns=isbns, hand_off=False, barcodes=returned)
+        outcome = _finish_batch("Return", member_id, problems, detailed)
+    if hand_off and outcome[0]:
+        for isbn in isbns:
+            _hand_off_after_return(isbn, member_id)
+    return outcome
+
+
+@_instrumented
+def bulk_return(returns, detailed=False):
+    """Process drop-box returns across many members in a single pass.
+
+    `returns` is an iterable of (isbn, member_id) pairs. Each item succeeds or
+    fails on its own, and failures are summarized in one diagnostic line instead
+    of one line per item. Returns (success, results) where results is a list of
+    (isbn, member_id, error message or None) and success means no item failed.
+    With detailed=True the outcomes are Results. Freed copies go to waiting
+    holders as in return_book.
+    """
+    problems = []
+    failed = 0
+    for isbn, member_id in returns:
+        lower, upper = _circulation_stripes(isbn, member_id)
+        with lower, upper:
+            book = books.get(isbn)
+            member = members.get(member_id)
+            if not book:
+                problem = Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found.")
+            elif not member:
+                problem = Result(NOT_FOUND, f"Error: Member with ID {member_id} not found.")
+            else:
+                problem = _return_problem(book, member, isbn, member_id)
 
-    if isbn not in member["borrowed_books"]:
-        print(f"Error: Book {isbn} was not borrowed by member {member_id}.")
-        return False
+            if problem is None:
+                copy = _receive(isbn, member, member_id)
+                _notify("return_book", isbn=isbn, member_id=member_id, hand_off=False, barcode=copy_barcode(isbn, copy))
+        if problem is not None:
+            failed += 1
+        else:
+            _hand_off_after_return(isbn, member_id)
+        problems.append((isbn, member_id, problem))
 
-    # Execute return transaction
-    book["total_copies"] += 1
-    member["borrowed_books"].remove(isbn)
-    return True
\ No newline at end of file
+    if not failed:
+        return (SUCCESS if detailed else True), item_results(problems, detailed)
+    summary = Result(BATCH_REJECTED, f"Error: {failed} of {len(problems)} drop-box return(s) failed.")
+    return _fail(summary, detailed), item_results(problems, detailed)
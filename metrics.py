@@ -0,0 +1,295 @@
+# metrics.py - operation metrics and an optional sampling profiler for mainoperations
+#
+# OperationMetrics keeps, per operation, the number of calls, the failures by
+# reason (result code or exception type) and a latency histogram with fixed
+# buckets. It can be read as a dict (stats) or in the Prometheus text
+# exposition format, for example written to a file picked up by the node
+# exporter's textfile collector.
+#
+# SamplingProfiler is opt-in: while installed, a background thread looks at
+# the threads currently inside an instrumented operation every `interval`
+# seconds and counts their call stacks. Nothing is sampled, and the
+# instrumented calls pay only a None check, when no profiler is installed.
+
+import bisect
+import os
+import sys
+import threading
+from collections import Counter
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (
+    0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+_BUCKET_BOUNDS_NS = tuple(round(bound * 1e9) for bound in LATENCY_BUCKETS)
+
+
+class _OperationStats:
+    __slots__ = ("calls", "failures", "buckets", "total_ns", "max_ns")
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = {}                                 # reason -> count
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)    # last bucket is +Inf
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, other):
+        self.calls += other.calls
+        for reason, count in dict(other.failures).items():
+            self.failures[reason] = self.failures.get(reason, 0) + count
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, list(other.buckets))]
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+
+def _estimate_percentile(stats, fraction):
+    """Upper bound (µs) of the histogram bucket holding the given fraction of calls."""
+    rank = fraction * stats.calls
+    seen = 0
+    for index, count in enumerate(stats.buckets):
+        seen += count
+        if count and seen >= rank:
+            bound = _BUCKET_BOUNDS_NS[index] if index < len(_BUCKET_BOUNDS_NS) else stats.max_ns
+            return round(min(bound, stats.max_ns) / 1000, 3)
+    return 0.0
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class OperationMetrics:
+    """Call counts, failure reasons and latency histograms per operation.
+
+    Each thread records into its own shard, so recording takes no lock and
+    concurrent operations do not contend on their metrics; readers add the
+    shards up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shards = {}      # operation name -> [_OperationStats, one per recording thread]
+        self._recorders = {}   # operation name -> its record function
+
+    def recorder(self, operation):
+        """Return record(elapsed_ns, failure=None) for one operation.
+
+        failure is the reason the call failed, or None if it succeeded.
+        """
+        with self._lock:
+            record = self._recorders.get(operation)
+            if record is not None:
+                return record
+            shards = self._shards.setdefault(operation, [])
+        lock = self._lock
+        local = threading.local()
+        bounds = _BUCKET_BOUNDS_NS
+        locate = bisect.bisect_left
+
+        def record(elapsed_ns, failure=None):
+            try:
+                stats = local.stats
+            except AttributeError:
+                stats = local.stats = _OperationStats()
+                with lock:
+                    shards.append(stats)
+            stats.calls += 1
+            stats.total_ns += elapsed_ns
+            stats.buckets[locate(bounds, elapsed_ns)] += 1
+            if elapsed_ns > stats.max_ns:
+                stats.max_ns = elapsed_ns
+            if failure is not None:
+                stats.failures[failure] = stats.failures.get(failure, 0) + 1
+
+        with self._lock:
+            return self._recorders.setdefault(operation, record)
+
+    def record(self, operation, elapsed_ns, failure=None):
+        """Count one call that took elapsed_ns; failure is its reason, or None if it succeeded."""
+        record = self._recorders.get(operation) or self.recorder(operation)
+        record(elapsed_ns, failure)
+
+    def reset(self):
+        """Forget everything recorded so far (recorders stay valid)."""
+        with self._lock:
+            for shards in self._shards.values():
+                for stats in shards:
+                    stats.__init__()
+
+    def _totals(self):
+        """Return [(operation, _OperationStats summed over threads)] for operations that were called."""
+        with self._lock:
+            snapshot = [(operation, list(shards)) for operation, shards in self._shards.items()]
+        totals = []
+        for operation, shards in sorted(snapshot):
+            total = _OperationStats()
+            for stats in shards:
+                total.add(stats)
+            if total.calls:
+                totals.append((operation, total))
+        return totals
+
+    def stats(self):
+        """Return {operation: {calls, failures, failures_by_reason, latency summary, buckets}}.
+
+        Percentiles are estimated from the histogram (bucket upper bounds).
+        """
+        report = {}
+        for operation, stats in self._totals():
+            report[operation] = {
+                "calls": stats.calls,
+                "failures": sum(stats.failures.values()),
+                "failures_by_reason": dict(stats.failures),
+                "total_seconds": round(stats.total_ns / 1e9, 6),
+                "mean_us": round(stats.total_ns / stats.calls / 1000, 3),
+                "p50_us": _estimate_percentile(stats, 0.50),
+                "p90_us": _estimate_percentile(stats, 0.90),
+                "p99_us": _estimate_percentile(stats, 0.99),
+                "max_us": round(stats.max_ns / 1000, 3),
+                "buckets": dict(zip([*LATENCY_BUCKETS, "+Inf"], stats.buckets)),
+            }
+        return report
+
+    def prometheus_text(self, prefix="library"):
+        """Return all metrics in the Prometheus text exposition format."""
+        operations = [(name, stats.calls, stats.failures, stats.buckets, stats.total_ns)
+                      for name, stats in self._totals()]
+        lines = [
+            f"# HELP {prefix}_operation_calls_total Calls of each library operation.",
+            f"# TYPE {prefix}_operation_calls_total counter",
+        ]
+        for name, calls, _, _, _ in operations:
+            lines.append(f'{prefix}_operation_calls_total{{operation="{_label(name)}"}} {calls}')
+        lines += [
+            f"# HELP {prefix}_operation_failures_total Failed calls by reason (result code or exception type).",
+            f"# TYPE {prefix}_operation_failures_total counter",
+        ]
+        for name, _, failures, _, _ in operations:
+            for reason, count in sorted(failures.items()):
+                lines.append(f'{prefix}_operation_failures_total{{operation="{_label(name)}",'
+                             f'reason="{_label(reason)}"}} {count}')
+        lines += [
+            f"# HELP {prefix}_operation_duration_seconds Latency of each library operation.",
+            f"# TYPE {prefix}_operation_duration_seconds histogram",
+        ]
+        for name, calls, _, buckets, total_ns in operations:
+            label = _label(name)
+            cumulative = 0
+            for bound, count in zip([*map(repr, LATENCY_BUCKETS), "+Inf"], buckets):
+                cumulative += count
+                lines.append(f'{prefix}_operation_duration_seconds_bucket{{operation="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_operation_duration_seconds_sum{{operation="{label}"}} {total_ns / 1e9}')
+            lines.append(f'{prefix}_operation_duration_seconds_count{{operation="{label}"}} {calls}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, prefix="library"):
+        """Write prometheus_text() to path atomically (readers never see a partial file)."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as target:
+            target.write(self.prometheus_text(prefix))
+        os.replace(temp_path, path)
+
+
+class SamplingProfiler:
+    """Statistical profiler for the threads running instrumented operations.
+
+    Every `interval` seconds it records the call stack of each such thread,
+    from the operation down to the function executing at that moment, as a
+    folded stack ("borrow_book;mainoperations:_start_loan;..."). Samples are
+    read with top(), hot_functions() or write_folded() (flame graph input).
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.boundary = None        # Code object of the instrumentation wrapper; frames above it are dropped
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._active = {}           # thread ident -> operation it is running
+        self._stacks = Counter()    # folded stack -> samples
+        self._stopped = threading.Event()
+        self._thread = None
+
+    # Hooks called by the instrumented operations
+
+    def enter(self, operation):
+        """Mark the current thread as running operation; returns a token for leave()."""
+        ident = threading.get_ident()
+        previous = self._active.get(ident)
+        self._active[ident] = operation
+        return ident, previous
+
+    def leave(self, token):
+        ident, previous = token
+        if previous is None:
+            self._active.pop(ident, None)
+        else:
+            self._active[ident] = previous
+
+    # Sampling
+
+    def start(self):
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Record the current stack of every thread inside an operation."""
+        active = self._active.copy()
+        if not active:
+            return
+        frames = sys._current_frames()
+        stacks = []
+        for ident, operation in active.items():
+            frame = frames.get(ident)
+            names = []
+            while frame is not None and frame.f_code is not self.boundary and len(names) < self.max_depth:
+                code = frame.f_code
+                names.append(f"{os.path.splitext(os.path.basename(code.co_filename))[0]}:{code.co_name}")
+                frame = frame.f_back
+            names.append(operation)
+            stacks.append(";".join(reversed(names)))
+        with self._lock:
+            self.samples += 1
+            self._stacks.update(stacks)
+
+    # Reports
+
+    def top(self, limit=20):
+        """Return the most sampled folded stacks as [(stack, samples)]."""
+        with self._lock:
+            return self._stacks.most_common(limit)
+
+    def hot_functions(self, limit=20):
+        """Return the functions most often found executing as [(function, samples)]."""
+        leaves = Counter()
+        with self._lock:
+            for stack, count in self._stacks.items():
+                leaves[stack.rsplit(";", 1)[-1]] += count
+        return leaves.most_common(limit)
+
+    def write_folded(self, path):
+        """Write the samples in folded-stack format ("stack count" per line) for flame graph tools."""
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in sorted(self._stacks.items())]
+        with open(path, "w", encoding="utf-8") as target:
+            target.write("\n".join(lines) + ("\n" if lines else ""))
+
+    def clear(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
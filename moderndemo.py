@@ -1,4 +1,8 @@
 import mainoperations
+import snapshots
+
+# Search results shown per page
+PAGE_SIZE = 10
 
 
 # --- 1. Menu Function ---
@@ -46,6 +50,8 @@ def handle_add_book():
 
 # --- 3. Main Loop ---
 def main():
+    # Point-in-time views for the status listing, so it never sees half-applied changes
+    snapshot_store = snapshots.attach_snapshot_store()
     while True:
         display_menu()
         choice = input("Enter your choice: ").strip()
@@ -63,13 +69,14 @@ def main():
             print("\nBorrow/Return selected. (You'll implement the functionality here)")
 
         elif choice == '4':
-            # Example of 'Read' functionality: printing the global data
+            # Example of 'Read' functionality: printing a consistent snapshot of the data
+            snapshot = snapshot_store.snapshot()
             print("\n--- Current Books ---")
-            for isbn, book in mainoperations.books.items():
+            for isbn, book in snapshot.books.items():
                 print(f"ISBN: {isbn} | Title: {book['title']} | Copies Available: {book['total_copies']}")
 
             print("\n--- Current Members ---")
-            for member in mainoperations.members:
+            for member in snapshot.members:
                 print(f"ID: {member['member_id']} | Name: {member['name']} | Borrowed: {len(member['borrowed_books'])}")
 
         elif choice == '0':
@@ -121,24 +128,28 @@ def handle_search_books():
         print(" Search query cannot be empty.")
         return
 
-    # 3. Call the core operation function
-    matching_books = mainoperations.search_books(query, by=by_field)
+    # 3. Count the matches; results are fetched one page at a time, best matches first
+    match_count = mainoperations.count_matches(query, by=by_field)
 
     # 4. Display results
     print("\n--- Search Results ---")
-    if matching_books:
-        print(f"Found {len(matching_books)} book(s) matching '{query}' by {by_field}:")
+    if match_count:
+        print(f"Found {match_count} book(s) matching '{query}' by {by_field}:")
         print("-" * 50)
 
-        for book in matching_books:
-            # Note: We include the 'isbn' since the search_books function adds it to the dictionary
-            # The 'book' dictionary here is a merged dict of {"isbn": "...", "title": "..."}
-            print(f"  ISBN: {book['isbn']}")
-            print(f"  Title: {book['title']}")
-            print(f"  Author: {book['author']}")
-            print(f"  Genre: {book['genre']}")
-            print(f"  Available Copies: {book['total_copies']}")
-            print("-" * 50)
+        cursor = None
+        while True:
+            page, cursor = mainoperations.search_page(query, by=by_field, limit=PAGE_SIZE, after=cursor, ranked=True)
+            for book in page:
+                # Each result is a read-only view of {"isbn": "...", "title": "...", ...}
+                print(f"  ISBN: {book['isbn']}")
+                print(f"  Title: {book['title']}")
+                print(f"  Author: {book['author']}")
+                print(f"  Genre: {book['genre']}")
+                print(f"  Available Copies: {book['total_copies']}")
+                print("-" * 50)
+            if cursor is None or input("Show more results? (y/n): ").strip().lower() != 'y':
+                break
     else:
         print(f" No books found matching '{query}' by {by_field}.")
 
@@ -0,0 +1,262 @@
+# persistence.py - durable storage for mainoperations
+#
+# Every successful mutation is appended to an operation log (one JSON record per
+# line). The log is periodically compacted into a binary snapshot of all stored
+# records, so a restart loads the snapshot and replays only the log tail. The
+# search index is left out of snapshots: it is most of their size, and a
+# background thread rebuilds it after a restart while searches scan the records.
+
+import gc
+import json
+import mmap
+import os
+import pickle
+import threading
+import time
+
+import mainoperations
+
+SNAPSHOT_FILE = "snapshot.bin"
+LOG_FILE = "oplog.jsonl"
+SNAPSHOT_FORMAT = 3
+
+# Snapshot formats open() can load (format 2 also stored the search index)
+READABLE_FORMATS = (2, 3)
+
+# Derived structures left out of snapshots and rebuilt on load
+UNSAVED_STRUCTURES = ("_search_index",)
+
+# Operations recorded in the log; replay calls the mainoperations function of the same name
+LOGGED_OPERATIONS = (
+    "add_book", "update_book", "delete_book",
+    "add_member", "update_member", "delete_member",
+    "borrow_book", "return_book", "borrow_books", "return_books",
+    "place_hold", "cancel_hold",
+)
+
+
+def _without_gc(func, *args, **kwargs):
+    """Run func with the cyclic garbage collector paused.
+
+    (Un)pickling millions of index entries otherwise triggers many useless
+    collection passes over objects that cannot form cycles.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+class LibraryStore:
+    """Append-only operation log plus snapshots for the mainoperations data.
+
+    Log writes are group committed: a background thread flushes and fsyncs
+    them once `sync_batch` are pending, or every `sync_interval` seconds, so a
+    crash can lose at most that window and operations never wait for the disk
+    while holding library locks. Call sync() for an explicit barrier.
+    A snapshot is taken automatically every `snapshot_every` records by a
+    background thread, so the operation that crosses the threshold does not
+    pay for it.
+    """
+
+    def __init__(self, directory, sync_batch=128, sync_interval=0.05, snapshot_every=100_000):
+        self.directory = directory
+        self.sync_batch = sync_batch
+        self.sync_interval = sync_interval
+        self.snapshot_every = snapshot_every
+
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()   # one fsync at a time, so sync() returns only once its records are durable
+        self._log = None
+        self._seq = 0
+        self._records_since_snapshot = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._worker = None
+        self._indexer = None
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._snapshot_due = False
+
+    # Paths
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    # Startup
+
+    def open(self):
+        """Load the latest snapshot, replay the log tail and start recording."""
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot_seq = self._load_snapshot()
+        self._seq = snapshot_seq
+        valid_bytes = self._replay_log(snapshot_seq)
+
+        self._log = open(self._path(LOG_FILE), "ab")
+        # Drop a torn record left by a crash in the middle of a write
+        self._log.truncate(valid_bytes)
+        self._closed.clear()
+        mainoperations.add_listener(self._record)
+
+        self._worker = threading.Thread(target=self._background_loop, name="library-store", daemon=True)
+        self._worker.start()
+        if mainoperations._unindexed_from is not None:
+            self._indexer = threading.Thread(target=self._index_loop, name="library-indexer", daemon=True)
+            self._indexer.start()
+        return self
+
+    def _load_snapshot(self):
+        """Restore state from the snapshot file; return the log sequence it covers."""
+        path = self._path(SNAPSHOT_FILE)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            mainoperations.reset_data()
+            return 0
+
+        with open(path, "rb") as snapshot_file:
+            # Unpickle straight from the mapped file instead of reading it into a copy
+            with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                snapshot = _without_gc(pickle.loads, mapped)
+
+        if snapshot.get("format") not in READABLE_FORMATS:
+            raise ValueError(f"Unsupported snapshot format {snapshot.get('format')!r} in {path}.")
+        mainoperations._import_state(snapshot["state"])
+        return snapshot["seq"]
+
+    def _replay_log(self, snapshot_seq):
+        """Re-apply logged operations newer than the snapshot; return the valid log length."""
+        path = self._path(LOG_FILE)
+        if not os.path.exists(path):
+            return 0
+
+        valid_bytes = 0
+        with open(path, "rb") as log_file:
+            for line in log_file:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                valid_bytes += len(line)
+
+                if record["seq"] <= snapshot_seq:
+                    continue
+                getattr(mainoperations, record["op"])(**record["args"])
+                self._seq = record["seq"]
+                self._records_since_snapshot += 1
+        return valid_bytes
+
+    # Recording
+
+    def _record(self, op, details):
+        """Listener appending one successful mutation to the log."""
+        if op not in LOGGED_OPERATIONS:
+            return
+        with self._lock:
+            self._seq += 1
+            record = {"seq": self._seq, "op": op, "args": details}
+            self._log.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+            self._pending += 1
+            self._records_since_snapshot += 1
+
+            # The caller still holds library locks; the worker thread syncs and takes snapshots
+            wake = self._pending >= self.sync_batch or time.monotonic() - self._last_sync >= self.sync_interval
+            if self.snapshot_every and self._records_since_snapshot >= self.snapshot_every:
+                self._snapshot_due = True
+                wake = True
+        if wake:
+            self._wake.set()
+
+    def _sync_locked(self):
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        """Flush and fsync every record written so far.
+
+        Only the flush holds the store lock, so operations keep logging while
+        the disk catches up.
+        """
+        with self._sync_lock:
+            with self._lock:
+                if self._log is None or not self._pending:
+                    return
+                self._log.flush()
+                descriptor = self._log.fileno()
+                self._pending = 0
+                self._last_sync = time.monotonic()
+            os.fsync(descriptor)
+
+    def _background_loop(self):
+        """Worker thread syncing records written during quiet periods and taking due snapshots."""
+        while not self._closed.is_set():
+            self._wake.wait(self.sync_interval or None)
+            self._wake.clear()
+            if self._closed.is_set():
+                return
+            if self._snapshot_due:
+                self.snapshot()
+            else:
+                self.sync()
+
+    def _index_loop(self):
+        """Indexer thread rebuilding the search index of a restored library."""
+        while mainoperations._index_backlog():
+            pass
+
+    # Compaction
+
+    def snapshot(self):
+        """Write a snapshot of the current state and start an empty log.
+
+        Library operations are paused while the state is written, so the
+        snapshot matches the log position exactly.
+        """
+        with mainoperations.exclusive(), self._lock:
+            state = mainoperations._export_state()
+            for name in UNSAVED_STRUCTURES:
+                del state[name]
+            snapshot = {"format": SNAPSHOT_FORMAT, "seq": self._seq, "state": state}
+            temp_path = self._path(SNAPSHOT_FILE + ".tmp")
+            with open(temp_path, "wb") as snapshot_file:
+                _without_gc(pickle.dump, snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+                snapshot_file.flush()
+                os.fsync(snapshot_file.fileno())
+            os.replace(temp_path, self._path(SNAPSHOT_FILE))
+
+            # Every logged record is now covered by the snapshot
+            if self._log is not None:
+                self._log.truncate(0)
+                self._log.flush()
+                os.fsync(self._log.fileno())
+                self._pending = 0
+            self._records_since_snapshot = 0
+            self._snapshot_due = False
+
+    # Shutdown
+
+    def close(self, snapshot=False):
+        """Stop recording, sync the log and optionally compact it into a snapshot."""
+        mainoperations.remove_listener(self._record)
+        self._closed.set()
+        self._wake.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+        if snapshot:
+            self.snapshot()
+        with self._lock:
+            if self._log is not None:
+                self._sync_locked()
+                self._log.close()
+                self._log = None
+
+
+def open_store(directory, **options):
+    """Open a LibraryStore on a directory, restoring any saved state first."""
+    return LibraryStore(directory, **options).open()
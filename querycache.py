@@ -0,0 +1,201 @@
+# querycache.py - versioned LRU cache for repeated catalog queries
+#
+# Caches search and report results in a bounded LRU. Every entry remembers the
+# mainoperations catalog version it was computed at, so adding, updating or
+# deleting a book makes all older entries stale at once. Borrowing and
+# returning only change availability, so they drop just the entries that show
+# the affected ISBNs (and reports, which summarize every book).
+
+import threading
+from collections import OrderedDict
+from types import MappingProxyType
+
+import mainoperations
+
+# Operations that change copy availability, and where their ISBNs are
+_CIRCULATION_OPS = ("borrow_book", "return_book", "borrow_books", "return_books")
+
+
+class QueryCache:
+    """Bounded LRU of query results, invalidated by catalog version and by ISBN.
+
+    Create it with attach(), which subscribes to mainoperations mutations.
+    Cached results are shared between callers, so they are read-only: tuples
+    of read-only mappings.
+    """
+
+    def __init__(self, capacity=1024):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (catalog version, value, ISBNs shown)
+        self._keys_by_isbn = {}         # ISBN -> keys of entries showing it
+        self._report_keys = set()       # keys of entries depending on every book
+        self._circulation_seq = 0       # availability changes seen so far
+        self._touched_at = {}           # ISBN -> _circulation_seq of its last availability change
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # Synchronization
+
+    def attach(self):
+        """Start following mutations."""
+        mainoperations.add_listener(self._on_change)
+        return self
+
+    def detach(self):
+        mainoperations.remove_listener(self._on_change)
+
+    def _on_change(self, op, details):
+        if op == "reset":
+            self.clear()
+            return
+        if op not in _CIRCULATION_OPS:
+            return  # Catalog changes bump the catalog version; holds and members do not show up in results
+        isbns = details.get("isbns") or (details["isbn"],)
+        with self._lock:
+            self._circulation_seq += 1
+            for isbn in isbns:
+                self._touched_at[isbn] = self._circulation_seq
+                for key in self._keys_by_isbn.pop(isbn, ()):
+                    self._drop_locked(key)
+            for key in list(self._report_keys):
+                self._drop_locked(key)
+
+    # Entries
+
+    def _drop_locked(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.invalidations += 1
+        self._forget_locked(key, entry)
+
+    def _forget_locked(self, key, entry):
+        isbns = entry[2]
+        if isbns is None:
+            self._report_keys.discard(key)
+            return
+        for isbn in isbns:
+            keys = self._keys_by_isbn.get(isbn)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_isbn[isbn]
+
+    def _lookup(self, key):
+        """Return (True, value) for a fresh entry, else (False, None); counts the hit or miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == mainoperations.catalog_version():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                # Computed against an older catalog
+                del self._entries[key]
+                self._forget_locked(key, entry)
+            self.misses += 1
+            return False, None
+
+    def _store(self, key, version, started_at, value, isbns):
+        """Cache a computed value unless a circulation change raced with computing it.
+
+        isbns lists the books the value shows, or None if it depends on every book.
+        """
+        with self._lock:
+            if isbns is None:
+                if self._circulation_seq != started_at:
+                    return
+            elif any(self._touched_at.get(isbn, 0) > started_at for isbn in isbns):
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._forget_locked(key, old)
+            self._entries[key] = (version, value, isbns)
+            if isbns is None:
+                self._report_keys.add(key)
+            else:
+                for isbn in isbns:
+                    keys = self._keys_by_isbn.get(isbn)
+                    if keys is None:
+                        self._keys_by_isbn[isbn] = {key}
+                    else:
+                        keys.add(key)
+            while len(self._entries) > self.capacity:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._forget_locked(evicted_key, evicted)
+                self.evictions += 1
+
+    def _compute(self, key, compute, isbns_of):
+        """Return the cached value for key, computing and caching it on a miss."""
+        found, value = self._lookup(key)
+        if found:
+            return value
+        with self._lock:
+            started_at = self._circulation_seq
+        # Read the version under the catalog lock so it matches the catalog the value is computed from
+        with mainoperations._catalog_lock:
+            version = mainoperations.catalog_version()
+            value = compute()
+        self._store(key, version, started_at, value, isbns_of(value))
+        return value
+
+    # Queries
+
+    def search(self, query, by="title"):
+        """Cached search_books: a tuple of read-only result mappings."""
+        if by not in mainoperations.SEARCH_FIELDS:
+            by = "title"
+        return self._compute(
+            ("search", query.lower(), by),
+            lambda: tuple(MappingProxyType(book) for book in mainoperations.search_books(query, by)),
+            lambda results: [book["isbn"] for book in results])
+
+    def search_page(self, query, by="title", limit=20, after=None, ranked=False):
+        """Cached search_page: (tuple of read-only result mappings, cursor)."""
+        if by not in mainoperations.SEARCH_FIELDS:
+            by = "title"
+
+        def compute():
+            views, cursor = mainoperations.search_page(query, by, limit=limit, after=after, ranked=ranked)
+            return tuple(MappingProxyType(dict(view)) for view in views), cursor
+
+        return self._compute(("page", query.lower(), by, limit, after, ranked), compute,
+                             lambda value: [book["isbn"] for book in value[0]])
+
+    def report(self, name, compute):
+        """Cached result of compute() under name, for reports summarizing every book.
+
+        Any availability change invalidates it. The value is shared, so callers must not modify it.
+        """
+        return self._compute(("report", name), compute, lambda value: None)
+
+    # Maintenance and statistics
+
+    def clear(self):
+        """Drop every entry (statistics are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_isbn.clear()
+            self._report_keys.clear()
+
+    def stats(self):
+        """Return hit, miss, eviction and invalidation counts plus size, for sizing the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def attach_query_cache(capacity=1024):
+    """Create a QueryCache that stays in sync with later changes."""
+    return QueryCache(capacity).attach()
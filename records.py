@@ -0,0 +1,191 @@
+# records.py - compact record types for books, members and loans
+#
+# Book and Member keep their fields in __slots__ instead of a per-record dict,
+# but still read like the original dictionaries (book["title"],
+# member["borrowed_books"], dict(book), {**book}), so existing callers work.
+# MemberRegistry is keyed by member ID but iterates over Member records, like
+# the original members list.
+
+import sys
+from collections.abc import Mapping, MutableMapping
+
+
+def shared(text):
+    """Intern strings that repeat across many records (authors, genres)."""
+    return sys.intern(text) if type(text) is str else text
+
+
+class _SlotRecord(Mapping):
+    """Read-mostly mapping view over the __slots__ fields of a record."""
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __iter__(self):
+        return iter(self.__slots__)
+
+    def __len__(self):
+        return len(self.__slots__)
+
+    def __bool__(self):
+        # A record is always truthy, like the non-empty dict it replaces
+        return True
+
+    def __reduce__(self):
+        # Pickle as a constructor call: smaller and faster than the default slot state
+        return type(self), tuple(getattr(self, field) for field in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Book(_SlotRecord):
+    """One catalog title. author and genre are interned, so repeats share one string."""
+
+    __slots__ = ("title", "author", "genre", "total_copies", "original_copies")
+
+    def __init__(self, title, author, genre, total_copies, original_copies=None):
+        self.title = title
+        self.author = shared(author)
+        self.genre = shared(genre)
+        self.total_copies = total_copies
+        # Storing original_copies for delete constraint validation
+        self.original_copies = total_copies if original_copies is None else original_copies
+
+
+class BookView(Mapping):
+    """Read-only view of one catalog book plus its ISBN, as returned by paginated searches.
+
+    It reads through to the live Book, so it always shows current values and
+    costs no copy; use dict(view) for a snapshot.
+    """
+
+    __slots__ = ("isbn", "_book")
+    _keys = ("isbn",) + Book.__slots__
+
+    def __init__(self, isbn, book):
+        self.isbn = isbn
+        self._book = book
+
+    def __getitem__(self, key):
+        if key == "isbn":
+            return self.isbn
+        return self._book[key]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return f"BookView({self.isbn!r}, {self._book!r})"
+
+
+class Member(_SlotRecord):
+    """One library member. borrowed_books is a small tuple of ISBNs (at most the borrowing limit)."""
+
+    __slots__ = ("member_id", "name", "email", "borrowed_books")
+
+    def __init__(self, member_id, name, email, borrowed_books=()):
+        self.member_id = member_id
+        self.name = name
+        self.email = email
+        self.borrowed_books = tuple(borrowed_books)
+
+    def add_loan(self, isbn):
+        """Record a borrowed ISBN."""
+        self.borrowed_books += (isbn,)
+
+    def remove_loan(self, isbn):
+        """Drop a borrowed ISBN (it must be present)."""
+        loans = self.borrowed_books
+        position = loans.index(isbn)
+        self.borrowed_books = loans[:position] + loans[position + 1:]
+
+
+class MemberRegistry(MutableMapping):
+    """Member ID -> Member mapping that iterates over the records, in insertion order.
+
+    Lookups, `in`, len(), assignment and deletion take a member ID, as with a
+    dict, while `for member in registry` yields Member records like the
+    original members list. ids() gives the member IDs; keys(), values() and
+    items() are the usual dict views.
+    """
+
+    __slots__ = ("_records",)
+
+    def __init__(self, records=()):
+        self._records = dict(records)
+
+    def __getitem__(self, member_id):
+        return self._records[member_id]
+
+    def __setitem__(self, member_id, member):
+        self._records[member_id] = member
+
+    def __delitem__(self, member_id):
+        del self._records[member_id]
+
+    def __contains__(self, member_id):
+        return member_id in self._records
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, member_id, default=None):
+        return self._records.get(member_id, default)
+
+    def ids(self):
+        """Return the member IDs, in insertion order."""
+        return self._records.keys()
+
+    def keys(self):
+        return self._records.keys()
+
+    def values(self):
+        return self._records.values()
+
+    def items(self):
+        return self._records.items()
+
+    def popitem(self):
+        return self._records.popitem()
+
+    def clear(self):
+        self._records.clear()
+
+    def __reduce__(self):
+        return type(self), (self._records,)
+
+    def __repr__(self):
+        return f"MemberRegistry({self._records!r})"
+
+
+class Loan(_SlotRecord):
+    """One borrowed copy: who has which ISBN, since when and until when (epoch seconds).
+
+    copy is the number of the physical copy lent (None where copies are not tracked).
+    """
+
+    __slots__ = ("isbn", "member_id", "borrowed_at", "due_at", "copy")
+
+    def __init__(self, isbn, member_id, borrowed_at, due_at, copy=None):
+        self.isbn = isbn
+        self.member_id = member_id
+        self.borrowed_at = borrowed_at
+        self.due_at = due_at
+        self.copy = copy
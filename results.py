@@ -0,0 +1,56 @@
+# results.py - result codes for mainoperations
+#
+# Mutating operations return True/False by default. Called with detailed=True
+# they return a Result instead, which is truthy only on success and carries a
+# machine-readable code plus the human-readable message.
+
+OK = "OK"
+NOT_FOUND = "NOT_FOUND"                # Book or member does not exist
+ALREADY_EXISTS = "ALREADY_EXISTS"      # ISBN or member ID is taken
+DUPLICATE_EMAIL = "DUPLICATE_EMAIL"    # Email belongs to another member
+INVALID_GENRE = "INVALID_GENRE"        # Genre is not in GENRES
+INVALID_COPIES = "INVALID_COPIES"      # Copy count is not a non-negative integer
+INVALID_TEXT = "INVALID_TEXT"          # Title or author is not a string
+COPIES_ON_LOAN = "COPIES_ON_LOAN"      # Book change blocked by borrowed copies
+HAS_LOANS = "HAS_LOANS"                # Member still has borrowed books
+NO_COPIES = "NO_COPIES"                # No copy available to borrow
+LIMIT_REACHED = "LIMIT_REACHED"        # Member is at the borrowing limit
+ALREADY_BORROWED = "ALREADY_BORROWED"  # Member already has a copy of this book
+NOT_BORROWED = "NOT_BORROWED"          # Member does not have this book
+DUPLICATE_ITEM = "DUPLICATE_ITEM"      # Same ISBN twice in one batch
+ALREADY_HELD = "ALREADY_HELD"          # Member is already in the hold queue
+NOT_HELD = "NOT_HELD"                  # Member is not in the hold queue
+COPIES_AVAILABLE = "COPIES_AVAILABLE"  # A copy is free, so borrow instead of holding
+BATCH_REJECTED = "BATCH_REJECTED"      # An all-or-nothing batch had failing items
+
+
+class Result:
+    """Outcome of one operation: a code from this module and a message."""
+
+    __slots__ = ("code", "message")
+
+    def __init__(self, code=OK, message=""):
+        self.code = code
+        self.message = message
+
+    @property
+    def ok(self):
+        return self.code == OK
+
+    def __bool__(self):
+        return self.code == OK
+
+    def __eq__(self, other):
+        if not isinstance(other, Result):
+            return NotImplemented
+        return self.code == other.code and self.message == other.message
+
+    def __hash__(self):
+        return hash((self.code, self.message))
+
+    def __repr__(self):
+        return f"Result({self.code!r}, {self.message!r})"
+
+
+# Shared success result, so successful detailed calls allocate nothing
+SUCCESS = Result()
@@ -0,0 +1,447 @@
+# service.py - asyncio HTTP/JSON front-end for mainoperations
+#
+# A small HTTP/1.1 server built on asyncio streams. Connections are kept alive
+# and requests may be pipelined: each connection reads and answers requests in
+# order. Handlers run on a small thread pool rather than on the event loop, as
+# operations take library locks and may wait on the persistence log or a full
+# change feed; a semaphore bounds how many requests (bodies being read plus
+# handlers queued or running) are in flight at once across all connections.
+#
+# Routes (JSON bodies and responses):
+#   GET    /health
+#   GET    /metrics                             per-operation metrics (mainoperations.stats)
+#   GET    /popular?genre=<genre>&limit=<n>     most borrowed this week and highest demand (all_time=1)
+#   GET    /books?q=<query>&by=title|author     search_page (also limit, after, ranked=1)
+#   GET    /books/<isbn>
+#   GET    /books/<isbn>/holders                holders_of
+#   GET    /books/<isbn>/copies                 copies_of (barcode and borrower of every copy)
+#   POST   /books                               add_book
+#   PATCH  /books/<isbn>                        update_book
+#   DELETE /books/<isbn>                        delete_book
+#   GET    /members/<member_id>
+#   POST   /members                             add_member
+#   PATCH  /members/<member_id>                 update_member
+#   DELETE /members/<member_id>                 delete_member
+#   POST   /borrow   {"isbn", "member_id", optional "barcode"} or {"member_id", "isbns": [...]}
+#   POST   /return   {"isbn", "member_id", optional "barcode"} or {"member_id", "isbns": [...]}
+#   GET    /holds/<isbn>                        hold_queue
+#   GET    /holds/<isbn>/<member_id>            hold_position
+#   POST   /holds    {"isbn", "member_id"}      place_hold
+#   DELETE /holds/<isbn>/<member_id>            cancel_hold
+
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import circulation
+import diagnostics
+import mainoperations
+import querycache
+
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Search result cache (a querycache.QueryCache), installed by set_query_cache; None disables it
+_query_cache = None
+
+# Circulation statistics behind /popular (a circulation.CirculationStats), installed by set_circulation_stats
+_circulation_stats = None
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    """Raised by handlers to answer with an error status and message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+# Request helpers
+
+def _require(body, *fields):
+    """Return the listed fields from a JSON body, or raise 400 if any is missing."""
+    if not isinstance(body, dict):
+        raise HttpError(400, "Request body must be a JSON object.")
+    missing = [field for field in fields if field not in body]
+    if missing:
+        raise HttpError(400, f"Missing fields: {', '.join(missing)}.")
+    return [body[field] for field in fields]
+
+
+def _result(outcome, status=200, **extra):
+    """Turn a detailed mainoperations Result into a response (409 with its code and message on failure)."""
+    if not outcome:
+        return 409, {"ok": False, "code": outcome.code, "error": outcome.message, **extra}
+    return status, {"ok": True, **extra}
+
+
+def _circulation(body, single, batch):
+    """Dispatch /borrow and /return to the single-item or batch operation."""
+    if isinstance(body, dict) and "isbns" in body:
+        member_id, isbns = _require(body, "member_id", "isbns")
+        if not isinstance(isbns, list):
+            raise HttpError(400, "isbns must be a list.")
+        outcome, results = batch(member_id, isbns, detailed=True)
+        items = [{"isbn": isbn, "code": problem.code, "error": problem.message or None} for isbn, problem in results]
+        return _result(outcome, items=items)
+    isbn, member_id = _require(body, "isbn", "member_id")
+    return _result(single(isbn, member_id, detailed=True, barcode=body.get("barcode")))
+
+
+def _search(query):
+    """Answer GET /books with one page of results and the cursor for the next page."""
+    text = query.get("q", [""])[0]
+    by = query.get("by", ["title"])[0]
+    ranked = query.get("ranked", ["0"])[0] in ("1", "true")
+    try:
+        limit = int(query.get("limit", [DEFAULT_PAGE_SIZE])[0])
+        after = query.get("after", [None])[0]
+        # Cursors travel as comma-separated integers
+        after = tuple(int(part) for part in after.split(",")) if after else None
+    except ValueError:
+        raise HttpError(400, "limit and after must be integers.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HttpError(400, f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    if _query_cache is not None:
+        views, cursor = _query_cache.search_page(text, by=by, limit=limit, after=after, ranked=ranked)
+    else:
+        views, cursor = mainoperations.search_page(text, by=by, limit=limit, after=after, ranked=ranked)
+    return 200, {"ok": True, "count": len(views), "books": [dict(view) for view in views],
+                 "next": ",".join(map(str, cursor)) if cursor is not None else None}
+
+
+# Handlers
+
+def handle_books(method, parts, query, body):
+    if len(parts) == 1:
+        if method == "GET":
+            return _search(query)
+        if method == "POST":
+            isbn, title, author, genre, copies = _require(body, "isbn", "title", "author", "genre", "total_copies")
+            return _result(mainoperations.add_book(isbn, title, author, genre, copies, detailed=True), status=201)
+        raise HttpError(405, f"{method} not allowed on /books.")
+
+    isbn = parts[1]
+    if len(parts) == 3 and parts[2] == "holders" and method == "GET":
+        if isbn not in mainoperations.books:
+            raise HttpError(404, f"Book with ISBN {isbn} not found.")
+        return 200, {"ok": True, "isbn": isbn, "members": mainoperations.holders_of(isbn)}
+    if len(parts) == 3 and parts[2] == "copies" and method == "GET":
+        copies = mainoperations.copies_of(isbn)
+        if copies is None:
+            raise HttpError(404, f"Book with ISBN {isbn} not found.")
+        return 200, {"ok": True, "isbn": isbn,
+                     "copies": [{"barcode": barcode, "member_id": member_id} for barcode, member_id in copies]}
+    if len(parts) > 2:
+        raise HttpError(404, f"No route for /books/{'/'.join(parts[1:])}.")
+    if method == "GET":
+        book = mainoperations.books.get(isbn)
+        if book is None:
+            raise HttpError(404, f"Book with ISBN {isbn} not found.")
+        return 200, {"ok": True, "book": {"isbn": isbn, **book}}
+    if method == "PATCH":
+        if not isinstance(body, dict):
+            raise HttpError(400, "Request body must be a JSON object.")
+        return _result(mainoperations.update_book(
+            isbn, title=body.get("title"), author=body.get("author"),
+            genre=body.get("genre"), total_copies=body.get("total_copies"), detailed=True))
+    if method == "DELETE":
+        return _result(mainoperations.delete_book(isbn, detailed=True))
+    raise HttpError(405, f"{method} not allowed on /books/<isbn>.")
+
+
+def handle_members(method, parts, query, body):
+    if len(parts) == 1:
+        if method == "POST":
+            member_id, name, email = _require(body, "member_id", "name", "email")
+            return _result(mainoperations.add_member(member_id, name, email, detailed=True), status=201)
+        raise HttpError(405, f"{method} not allowed on /members.")
+
+    member_id = parts[1]
+    if method == "GET":
+        member = mainoperations._get_member(member_id)
+        if member is None:
+            raise HttpError(404, f"Member with ID {member_id} not found.")
+        return 200, {"ok": True, "member": dict(member)}
+    if method == "PATCH":
+        if not isinstance(body, dict):
+            raise HttpError(400, "Request body must be a JSON object.")
+        return _result(mainoperations.update_member(member_id, name=body.get("name"), email=body.get("email"), detailed=True))
+    if method == "DELETE":
+        return _result(mainoperations.delete_member(member_id, detailed=True))
+    raise HttpError(405, f"{method} not allowed on /members/<member_id>.")
+
+
+def handle_borrow(method, parts, query, body):
+    if method != "POST" or len(parts) != 1:
+        raise HttpError(405, "Use POST /borrow.")
+    return _circulation(body, mainoperations.borrow_book, mainoperations.borrow_books)
+
+
+def handle_return(method, parts, query, body):
+    if method != "POST" or len(parts) != 1:
+        raise HttpError(405, "Use POST /return.")
+    return _circulation(body, mainoperations.return_book, mainoperations.return_books)
+
+
+def handle_holds(method, parts, query, body):
+    if len(parts) == 1:
+        if method == "POST":
+            isbn, member_id = _require(body, "isbn", "member_id")
+            return _result(mainoperations.place_hold(isbn, member_id, detailed=True), status=201)
+        raise HttpError(405, f"{method} not allowed on /holds.")
+
+    isbn = parts[1]
+    if len(parts) == 2 and method == "GET":
+        return 200, {"ok": True, "isbn": isbn, "queue": mainoperations.hold_queue(isbn)}
+    if len(parts) == 3:
+        member_id = parts[2]
+        if method == "GET":
+            position = mainoperations.hold_position(isbn, member_id)
+            if position is None:
+                raise HttpError(404, f"Member {member_id} is not waiting for book {isbn}.")
+            return 200, {"ok": True, "position": position}
+        if method == "DELETE":
+            return _result(mainoperations.cancel_hold(isbn, member_id, detailed=True))
+    raise HttpError(405, f"{method} not allowed on /holds/{'/'.join(parts[1:])}.")
+
+
+def handle_metrics(method, parts, query, body):
+    return 200, mainoperations.stats()
+
+
+def handle_popular(method, parts, query, body):
+    """Answer GET /popular with the most borrowed and the most wanted books, overall or for one genre."""
+    if _circulation_stats is None:
+        raise HttpError(404, "Circulation statistics are not enabled.")
+    genre = query.get("genre", [None])[0]
+    if genre is not None and genre not in mainoperations.GENRES:
+        raise HttpError(400, f"Unknown genre '{genre}'.")
+    try:
+        limit = int(query.get("limit", [10])[0])
+    except ValueError:
+        raise HttpError(400, "limit must be an integer.")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HttpError(400, f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    all_time = query.get("all_time", ["0"])[0] in ("1", "true")
+    return 200, {
+        "ok": True,
+        "most_borrowed": [{"isbn": isbn, "loans": loans}
+                          for isbn, loans in _circulation_stats.most_borrowed(limit, genre, all_time)],
+        "highest_demand": [{"isbn": isbn, "demand": demand}
+                           for isbn, demand in _circulation_stats.highest_demand(limit, genre)],
+    }
+
+
+def handle_health(method, parts, query, body):
+    payload = {"ok": True, "books": len(mainoperations.books), "members": len(mainoperations.members)}
+    if _query_cache is not None:
+        payload["search_cache"] = _query_cache.stats()
+    return 200, payload
+
+
+ROUTES = {
+    "books": handle_books,
+    "members": handle_members,
+    "borrow": handle_borrow,
+    "return": handle_return,
+    "holds": handle_holds,
+    "health": handle_health,
+    "metrics": handle_metrics,
+    "popular": handle_popular,
+}
+
+
+def dispatch(method, target, body):
+    """Route one request to its handler; return (status, JSON-serializable payload)."""
+    url = urlsplit(target)
+    parts = [unquote(part) for part in url.path.strip("/").split("/") if part]
+    handler = ROUTES.get(parts[0]) if parts else None
+    if handler is None:
+        raise HttpError(404, f"No route for {url.path}.")
+    return handler(method, parts, parse_qs(url.query), body)
+
+
+# HTTP/1.1 connection handling
+
+class LibraryServer:
+    """Serve the library over HTTP/1.1 with keep-alive, pipelining and bounded concurrency."""
+
+    def __init__(self, host="127.0.0.1", port=8080, max_concurrency=256, workers=8):
+        self.host = host
+        self.port = port
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="library-handler")
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._serve_connection, self.host, self.port, limit=MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._executor.shutdown()
+
+    async def _read_head(self, reader):
+        """Read one request head; return (method, target, version, headers) or None at end of stream."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "Request headers too large.")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line.")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise HttpError(400, "Invalid Content-Length.")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Request body too large.")
+        headers["content-length"] = length
+        return method.upper(), target, version, headers
+
+    async def _serve_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                keep_alive = True
+                head = None
+                try:
+                    head = await self._read_head(reader)
+                    if head is None:
+                        break
+                    method, target, version, headers = head
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection == "keep-alive" or (version == "HTTP/1.1" and connection != "close")
+
+                    async with self._semaphore:
+                        length = headers["content-length"]
+                        raw_body = await reader.readexactly(length) if length else b""
+                        try:
+                            body = json.loads(raw_body) if raw_body else None
+                        except ValueError:
+                            raise HttpError(400, "Request body is not valid JSON.")
+                        status, payload = await loop.run_in_executor(self._executor, dispatch, method, target, body)
+                except HttpError as error:
+                    status, payload = error.status, {"ok": False, "error": error.message}
+                    # A request we could not frame leaves the stream unusable
+                    keep_alive = keep_alive and head is not None
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as error:  # Keep the connection loop alive on handler bugs
+                    status, payload = 500, {"ok": False, "error": f"{type(error).__name__}: {error}"}
+
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+# Demo data and entry point
+
+def set_query_cache(cache):
+    """Serve searches through cache (a QueryCache), or directly if None. Returns the previous cache."""
+    global _query_cache
+    previous = _query_cache
+    _query_cache = cache
+    return previous
+
+
+def set_circulation_stats(stats):
+    """Serve /popular from stats (a CirculationStats), or disable it with None. Returns the previous stats."""
+    global _circulation_stats
+    previous = _circulation_stats
+    _circulation_stats = stats
+    return previous
+
+
+def seed_demo_data(book_count, member_count):
+    """Fill the library with simple generated books and members for local testing."""
+    for i in range(book_count):
+        mainoperations.add_book(f"978-{i:09d}", f"Demo Title {i}", f"Demo Author {i % 500}",
+                                mainoperations.GENRES[i % len(mainoperations.GENRES)], 5)
+    for i in range(member_count):
+        mainoperations.add_member(f"M{i:07d}", f"Demo Member {i}", f"member{i}@library.test")
+
+
+async def _write_metrics(path, interval):
+    """Rewrite the Prometheus metrics file every interval seconds (for a textfile collector)."""
+    while True:
+        mainoperations.write_prometheus(path)
+        await asyncio.sleep(interval)
+
+
+async def _main(args):
+    # Rejections are already in each response; log them in rate-limited batches instead of one print each
+    sink = diagnostics.BufferedSink(flush_interval=1.0)
+    mainoperations.set_diagnostics_sink(sink)
+    seed_demo_data(args.demo_books, args.demo_members)
+    if args.cache_size:
+        set_query_cache(querycache.attach_query_cache(args.cache_size))
+    set_circulation_stats(circulation.attach_circulation_stats())
+    server = await LibraryServer(args.host, args.port, args.max_concurrency, args.workers).start()
+    print(f"Library service listening on http://{server.host}:{server.port}", flush=True)
+    metrics_task = None
+    if args.metrics_file:
+        metrics_task = asyncio.create_task(_write_metrics(args.metrics_file, args.metrics_interval))
+    try:
+        await server.serve_forever()
+    finally:
+        if metrics_task is not None:
+            metrics_task.cancel()
+            mainoperations.write_prometheus(args.metrics_file)
+        sink.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the mini library over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrency", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=8, help="Threads running library operations.")
+    parser.add_argument("--cache-size", type=int, default=4096, help="Cached search pages (0 disables the cache).")
+    parser.add_argument("--metrics-file", help="Write Prometheus metrics to this file periodically.")
+    parser.add_argument("--metrics-interval", type=float, default=15.0, help="Seconds between metrics writes.")
+    parser.add_argument("--demo-books", type=int, default=0, help="Generate this many demo books at startup.")
+    parser.add_argument("--demo-members", type=int, default=0, help="Generate this many demo members at startup.")
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
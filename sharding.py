@@ -0,0 +1,551 @@
+# sharding.py - multi-process sharded library for circulation on several cores
+#
+# ShardedLibrary runs one worker process per shard. Each worker holds an
+# ordinary mainoperations state: books are placed by a hash of their ISBN and
+# members by a hash of their member ID, so a shard only ever sees its own part
+# of the catalog and the registry. The coordinator (the calling process)
+# routes every call to the shard or shards involved over a pipe; calls from
+# several threads are pipelined, and the shards run them in parallel.
+#
+# A borrow or return touching one shard is a plain mainoperations call there.
+# When the book and the member live on different shards it runs as a two-phase
+# commit: both shards first check and reserve their half (a copy of the book,
+# a slot under the member's borrowing limit), and the change is committed on
+# both only if both agreed; otherwise, or if a shard fails midway, the
+# reservations still held are rolled back. A member's borrowed_books therefore
+# lists loans from every shard, while each loan's ledger entry lives with its
+# book.
+#
+# Searches are sent to every shard and the results merged into the order the
+# books were added. Hold queues, persistence and the other operations stay
+# single-process features.
+
+import heapq
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from operator import itemgetter
+
+import bulk_import
+import diagnostics
+import mainoperations
+from results import ALREADY_BORROWED, DUPLICATE_EMAIL, LIMIT_REACHED, NO_COPIES, NOT_BORROWED, NOT_FOUND, SUCCESS, Result
+
+
+class ShardError(Exception):
+    """Raised when a shard fails to run a call (the worker raised or has stopped)."""
+
+
+def shard_index(key, shard_count):
+    """Shard holding the book or member with this ISBN or member ID (stable across processes)."""
+    return zlib.crc32(key.encode("utf-8")) % shard_count
+
+
+# Worker side: runs inside each shard process
+
+_global_order = {}   # ISBN -> coordinator-wide insertion number, for merging search results
+_prepared = {}       # transaction ID -> (kind, isbn, member_id) of a reserved half
+_in_flight = set()   # (isbn, member_id) pairs with a prepared, undecided transaction
+
+
+def _shard_add_book(order, isbn, title, author, genre, total_copies):
+    outcome = mainoperations.add_book(isbn, title, author, genre, total_copies, detailed=True)
+    if outcome:
+        _global_order[isbn] = order
+    return outcome
+
+
+def _shard_import_books(orders, rows):
+    report = bulk_import.import_book_rows(rows)
+    for order, row in zip(orders, rows):
+        isbn = row.get("isbn")
+        if isbn in mainoperations.books and isbn not in _global_order:
+            _global_order[isbn] = order
+    return report
+
+
+def _shard_import_members(rows):
+    """Import member rows; returns the report and the 1-based positions of the rows accepted."""
+    accepted = []
+    report = bulk_import.import_member_rows(rows, accepted_lines=accepted)
+    return report, accepted
+
+
+def _shard_search(query, by):
+    results = [(_global_order.get(book["isbn"], 0), book) for book in mainoperations.search_books(query, by)]
+    results.sort(key=itemgetter(0))
+    return results
+
+
+def _shard_prepare_lend(txid, isbn, member_id, now):
+    """Book half of a cross-shard borrow: lend a copy, undone if aborted. Returns None, or the failed Result."""
+    book = mainoperations.books.get(isbn)
+    if book is None:
+        return Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found.")
+    if book.total_copies <= 0:
+        return Result(NO_COPIES, f"Error: No copies of book {isbn} are currently available.")
+    if mainoperations._has_loan(isbn, member_id) or (isbn, member_id) in _in_flight:
+        return Result(ALREADY_BORROWED, f"Error: Member {member_id} has already borrowed a copy of book {isbn}.")
+    mainoperations.lend_copy(isbn, member_id, now)
+    _prepared[txid] = ("lend", isbn, member_id)
+    _in_flight.add((isbn, member_id))
+    return None
+
+
+def _shard_prepare_borrow(txid, member_id, isbn, now):
+    """Member half of a cross-shard borrow: reserve a slot under the borrowing limit."""
+    member = mainoperations.members.get(member_id)
+    if member is None:
+        return Result(NOT_FOUND, f"Error: Member with ID {member_id} not found.")
+    if len(member.borrowed_books) >= mainoperations.MAX_BORROWED_BOOKS:
+        return Result(LIMIT_REACHED, f"Error: Member {member_id} has reached the borrowing limit "
+                                     f"({mainoperations.MAX_BORROWED_BOOKS} books).")
+    if isbn in member.borrowed_books:
+        return Result(ALREADY_BORROWED, f"Error: Member {member_id} has already borrowed a copy of book {isbn}.")
+    # Listing the ISBN right away counts the reservation against the limit for later borrows
+    member.add_loan(isbn)
+    _prepared[txid] = ("borrow", isbn, member_id)
+    _in_flight.add((isbn, member_id))
+    return None
+
+
+def _shard_prepare_receive(txid, isbn, member_id, now):
+    """Book half of a cross-shard return: check the loan and keep it from being returned twice."""
+    if isbn not in mainoperations.books:
+        return Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found.")
+    if not mainoperations._has_loan(isbn, member_id) or (isbn, member_id) in _in_flight:
+        return Result(NOT_BORROWED, f"Error: Book {isbn} was not borrowed by member {member_id}.")
+    _prepared[txid] = ("receive", isbn, member_id)
+    _in_flight.add((isbn, member_id))
+    return None
+
+
+def _shard_prepare_give_back(txid, member_id, isbn, now):
+    """Member half of a cross-shard return."""
+    member = mainoperations.members.get(member_id)
+    if member is None:
+        return Result(NOT_FOUND, f"Error: Member with ID {member_id} not found.")
+    if isbn not in member.borrowed_books or (isbn, member_id) in _in_flight:
+        return Result(NOT_BORROWED, f"Error: Book {isbn} was not borrowed by member {member_id}.")
+    _prepared[txid] = ("give_back", isbn, member_id)
+    _in_flight.add((isbn, member_id))
+    return None
+
+
+def _shard_commit(txid):
+    kind, isbn, member_id = _prepared.pop(txid)
+    _in_flight.discard((isbn, member_id))
+    if kind == "receive":
+        mainoperations.receive_copy(isbn, member_id)
+    elif kind == "give_back":
+        mainoperations.members[member_id].remove_loan(isbn)
+    # "lend" and "borrow": the loan and the member's list already hold the change since the prepare
+
+
+def _shard_abort(txid):
+    kind, isbn, member_id = _prepared.pop(txid, (None, None, None))
+    if kind is None:
+        return
+    _in_flight.discard((isbn, member_id))
+    if kind == "lend":
+        mainoperations.receive_copy(isbn, member_id)
+    elif kind == "borrow":
+        mainoperations.members[member_id].remove_loan(isbn)
+
+
+def _shard_audit():
+    """Return what consistency_problems() needs from this shard."""
+    return {
+        "copies": {isbn: (book.total_copies, book.original_copies) for isbn, book in mainoperations.books.items()},
+        "borrowed": {member_id: member.borrowed_books for member_id, member in mainoperations.members.items()},
+        "loans": list(mainoperations._loans),
+        "prepared": len(_prepared),
+    }
+
+
+def _shard_sizes():
+    return {"books": len(mainoperations.books), "members": len(mainoperations.members),
+            "loans": len(mainoperations._loans)}
+
+
+_SHARD_OPERATIONS = {
+    "add_book": _shard_add_book,
+    "add_member": lambda *args: mainoperations.add_member(*args, detailed=True),
+    "import_books": _shard_import_books,
+    "import_members": _shard_import_members,
+    "get_book": lambda isbn: dict(mainoperations.books[isbn]) if isbn in mainoperations.books else None,
+    "get_member": lambda member_id: (dict(mainoperations.members[member_id])
+                                     if member_id in mainoperations.members else None),
+    "borrow_book": lambda isbn, member_id, now: mainoperations.borrow_book(isbn, member_id, detailed=True, now=now),
+    "return_book": lambda isbn, member_id: mainoperations.return_book(isbn, member_id, detailed=True),
+    "search": _shard_search,
+    "prepare_lend": _shard_prepare_lend,
+    "prepare_borrow": _shard_prepare_borrow,
+    "prepare_receive": _shard_prepare_receive,
+    "prepare_give_back": _shard_prepare_give_back,
+    "commit": _shard_commit,
+    "abort": _shard_abort,
+    "audit": _shard_audit,
+    "sizes": _shard_sizes,
+    "stats": mainoperations.stats,
+}
+
+
+def _serve_shard(connection):
+    """Worker main loop: run (request_id, operation, args) messages in order until told to stop."""
+    # Rejections go back to the coordinator in each Result; printing them here would duplicate them
+    mainoperations.set_diagnostics_sink(None)
+    while True:
+        try:
+            message = connection.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        request_id, operation, args = message
+        try:
+            reply = (request_id, True, _SHARD_OPERATIONS[operation](*args))
+        except Exception as error:
+            reply = (request_id, False, f"{operation} failed: {type(error).__name__}: {error}")
+        connection.send(reply)
+    connection.close()
+
+
+# Coordinator side
+
+# Which half's failure a cross-shard borrow or return reports when both fail, as mainoperations checks them
+_PROBLEM_ORDER = {
+    ("book", NOT_FOUND): 0, ("member", NOT_FOUND): 1, ("book", NO_COPIES): 2,
+    ("member", LIMIT_REACHED): 3, ("member", ALREADY_BORROWED): 4, ("member", NOT_BORROWED): 5,
+}
+
+class _ShardClient:
+    """Pipe to one shard process; submit() may be called from many threads and pipelines requests."""
+
+    def __init__(self, context, index):
+        self.index = index
+        self._connection, child = context.Pipe()
+        self.process = context.Process(target=_serve_shard, args=(child,), name=f"library-shard-{index}", daemon=True)
+        self.process.start()
+        child.close()
+        self._send_lock = threading.Lock()
+        self._pending = {}   # request ID -> Future of its reply
+        self._request_ids = itertools.count()
+        self._receiver = threading.Thread(target=self._receive_loop, name=f"library-shard-{index}-replies",
+                                          daemon=True)
+        self._receiver.start()
+
+    def submit(self, operation, *args):
+        """Send a call to the shard; returns a Future of its result."""
+        future = Future()
+        with self._send_lock:
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+            try:
+                self._connection.send((request_id, operation, args))
+            except (OSError, ValueError) as error:
+                del self._pending[request_id]
+                raise ShardError(f"Shard {self.index} is not running.") from error
+        return future
+
+    def call(self, operation, *args):
+        return self.submit(operation, *args).result()
+
+    def _receive_loop(self):
+        while True:
+            try:
+                request_id, succeeded, value = self._connection.recv()
+            except (EOFError, OSError):
+                break
+            future = self._pending.pop(request_id)
+            if succeeded:
+                future.set_result(value)
+            else:
+                future.set_exception(ShardError(f"Shard {self.index}: {value}"))
+        with self._send_lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(ShardError(f"Shard {self.index} stopped."))
+
+    def close(self):
+        with self._send_lock:
+            try:
+                self._connection.send(None)
+            except (OSError, ValueError):
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self._receiver.join(timeout=5)
+        self._connection.close()
+
+
+class ShardedLibrary:
+    """Coordinator of a catalog and registry partitioned across shard_count worker processes.
+
+    Mirrors the mainoperations calls it supports: they return True/False, or
+    a Result with detailed=True, and report rejections to the diagnostics
+    sink. Use it as a context manager, or call close(), to stop the workers.
+    """
+
+    def __init__(self, shard_count=None, diagnostics_sink=diagnostics.DEFAULT):
+        self.shard_count = shard_count or os.cpu_count() or 1
+        self.diagnostics = diagnostics.resolve(diagnostics_sink)
+        # Workers start from a fresh interpreter, never a fork of this process's locks and threads
+        context = multiprocessing.get_context("spawn")
+        self._shards = [_ShardClient(context, index) for index in range(self.shard_count)]
+        self._orders_lock = threading.Lock()
+        self._next_order = 0   # coordinator-wide insertion number of the next book
+        self._transaction_ids = itertools.count(1)
+        # Emails must be unique across all shards, so the coordinator keeps the one index of them
+        self._emails_lock = threading.Lock()
+        self._emails = {}   # lowercased email -> member_id
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop every worker process."""
+        for shard in self._shards:
+            shard.close()
+
+    def _reserve_orders(self, count):
+        """Return the first of count consecutive insertion numbers for new books."""
+        with self._orders_lock:
+            first = self._next_order
+            self._next_order += count
+            return first
+
+    def _fail(self, problem, detailed):
+        if self.diagnostics is not None:
+            self.diagnostics.emit(problem.message)
+        return problem if detailed else False
+
+    def _outcome(self, outcome, detailed):
+        """Report a Result coming back from a shard the way mainoperations would."""
+        if not outcome:
+            return self._fail(outcome, detailed)
+        return SUCCESS if detailed else True
+
+    def book_shard(self, isbn):
+        return self._shards[shard_index(isbn, self.shard_count)]
+
+    def member_shard(self, member_id):
+        return self._shards[shard_index(member_id, self.shard_count)]
+
+    # Catalog and registry
+
+    def add_book(self, isbn, title, author, genre, total_copies, detailed=False):
+        outcome = self.book_shard(isbn).call("add_book", self._reserve_orders(1), isbn, title, author, genre,
+                                             total_copies)
+        return self._outcome(outcome, detailed)
+
+    def add_member(self, member_id, name, email, detailed=False):
+        email_key = mainoperations.email_key(email)
+        with self._emails_lock:
+            if email_key in self._emails:
+                return self._fail(Result(DUPLICATE_EMAIL, f"Error: Email {email} is already registered to "
+                                                          f"another member."), detailed)
+            self._emails[email_key] = member_id
+        outcome = self.member_shard(member_id).call("add_member", member_id, name, email)
+        if not outcome:
+            with self._emails_lock:
+                if self._emails.get(email_key) == member_id:
+                    del self._emails[email_key]
+        return self._outcome(outcome, detailed)
+
+    def import_books(self, rows, batch_size=5_000, max_rejects=1_000):
+        """Bulk-load book rows (dicts, as for bulk_import.import_book_rows); returns the merged report."""
+        report = bulk_import.new_report()
+        pending = []
+        for batch in bulk_import.batched(enumerate(rows, start=1), batch_size):
+            # Insertion numbers follow the load order, so merged search results keep that order
+            offset = self._reserve_orders(len(batch)) - batch[0][0]
+            for lines, shard_rows, shard in self._split(batch, "isbn", self.book_shard):
+                orders = [offset + line_number for line_number in lines]
+                pending.append((lines, shard.submit("import_books", orders, shard_rows)))
+        for lines, future in pending:
+            _merge_report(report, future.result(), lines, max_rejects)
+        return report
+
+    def import_members(self, rows, batch_size=5_000, max_rejects=1_000):
+        """Bulk-load member rows (dicts); emails must be unique across every shard."""
+        report = bulk_import.new_report()
+        pending = []
+        for batch in bulk_import.batched(enumerate(rows, start=1), batch_size):
+            claimed = []
+            with self._emails_lock:
+                for line_number, row in batch:
+                    email_key = mainoperations.email_key(str(row.get("email") or ""))
+                    if email_key in self._emails:
+                        bulk_import.reject(report, max_rejects, line_number, row.get("member_id"),
+                                            "email already registered")
+                        continue
+                    # A row without an email claims nothing; its shard rejects it
+                    if email_key:
+                        self._emails[email_key] = row.get("member_id")
+                    claimed.append((line_number, row))
+            for lines, shard_rows, shard in self._split(claimed, "member_id", self.member_shard):
+                pending.append((lines, shard_rows, shard.submit("import_members", shard_rows)))
+        for lines, shard_rows, future in pending:
+            shard_report, accepted = future.result()
+            _merge_report(report, shard_report, lines, max_rejects)
+            accepted = set(accepted)
+            with self._emails_lock:
+                # Release the emails claimed for rows the shard rejected (found by position, since
+                # several rows may share a member ID)
+                for position, row in enumerate(shard_rows, start=1):
+                    if position not in accepted:
+                        email_key = mainoperations.email_key(str(row.get("email") or ""))
+                        if email_key and self._emails.get(email_key) == row.get("member_id"):
+                            del self._emails[email_key]
+        return report
+
+    def _split(self, numbered_rows, key_field, shard_of):
+        """Group (line number, row) pairs by shard; yields (line numbers, rows, shard) per shard."""
+        groups = {}
+        for line_number, row in numbered_rows:
+            lines, shard_rows = groups.setdefault(shard_of(str(row.get(key_field))).index, ([], []))
+            lines.append(line_number)
+            shard_rows.append(row)
+        for index, (lines, shard_rows) in groups.items():
+            yield lines, shard_rows, self._shards[index]
+
+    def get_book(self, isbn):
+        """Return a copy of the book's fields, or None."""
+        return self.book_shard(isbn).call("get_book", isbn)
+
+    def get_member(self, member_id):
+        """Return a copy of the member's fields, or None."""
+        return self.member_shard(member_id).call("get_member", member_id)
+
+    # Circulation
+
+    def _two_phase(self, book_shard, book_prepare, member_shard, member_prepare, isbn, member_id, now=None):
+        """Run a cross-shard change as a two-phase commit; returns None, or the failed Result to report.
+
+        If a shard fails (ShardError) in either phase, the transaction is
+        aborted wherever it is still prepared before the error is raised.
+        """
+        txid = next(self._transaction_ids)
+        try:
+            book_vote = book_shard.submit(book_prepare, txid, isbn, member_id, now)
+            member_vote = member_shard.submit(member_prepare, txid, member_id, isbn, now)
+            book_problem, member_problem = book_vote.result(), member_vote.result()
+            if book_problem is None and member_problem is None:
+                decisions = [book_shard.submit("commit", txid), member_shard.submit("commit", txid)]
+            else:
+                decisions = [shard.submit("abort", txid) for shard, problem in
+                             ((book_shard, book_problem), (member_shard, member_problem)) if problem is None]
+            for decision in decisions:
+                decision.result()
+        except ShardError:
+            self._abort(txid, (book_shard, member_shard))
+            raise
+        # Report the problem mainoperations would have found first
+        problems = [(_PROBLEM_ORDER.get((side, problem.code), len(_PROBLEM_ORDER)), problem)
+                    for side, problem in (("book", book_problem), ("member", member_problem)) if problem is not None]
+        return min(problems, key=itemgetter(0))[1] if problems else None
+
+    def _abort(self, txid, shards):
+        """Roll a transaction back on every shard still running; a shard where it is not prepared ignores this."""
+        aborts = []
+        for shard in shards:
+            try:
+                aborts.append(shard.submit("abort", txid))
+            except ShardError:
+                pass
+        for future in aborts:
+            try:
+                future.result()
+            except ShardError:
+                pass
+
+    def borrow_book(self, isbn, member_id, detailed=False, now=None):
+        """Borrow across shards: the copy count and the 3-book limit hold even when the two are apart."""
+        book_shard, member_shard = self.book_shard(isbn), self.member_shard(member_id)
+        if book_shard is member_shard:
+            return self._outcome(book_shard.call("borrow_book", isbn, member_id, now), detailed)
+        if now is None:
+            now = time.time()
+        problem = self._two_phase(book_shard, "prepare_lend", member_shard, "prepare_borrow", isbn, member_id, now)
+        if problem is not None:
+            return self._fail(problem, detailed)
+        return SUCCESS if detailed else True
+
+    def return_book(self, isbn, member_id, detailed=False):
+        """Return across shards (hold queues are not sharded, so there is no hand-off)."""
+        book_shard, member_shard = self.book_shard(isbn), self.member_shard(member_id)
+        if book_shard is member_shard:
+            return self._outcome(book_shard.call("return_book", isbn, member_id), detailed)
+        problem = self._two_phase(book_shard, "prepare_receive", member_shard, "prepare_give_back", isbn, member_id)
+        if problem is not None:
+            return self._fail(problem, detailed)
+        return SUCCESS if detailed else True
+
+    # Search
+
+    def search_books(self, query, by="title"):
+        """search_books on every shard at once, merged into the order the books were added."""
+        futures = [shard.submit("search", query, by) for shard in self._shards]
+        return [book for _, book in heapq.merge(*(future.result() for future in futures), key=itemgetter(0))]
+
+    # Monitoring
+
+    def shard_sizes(self):
+        """Return [{books, members, loans}] per shard, to check the partitioning is even."""
+        return [future.result() for future in [shard.submit("sizes") for shard in self._shards]]
+
+    def shard_stats(self):
+        """Return each shard's mainoperations.stats()."""
+        return [future.result() for future in [shard.submit("stats") for shard in self._shards]]
+
+    def consistency_problems(self):
+        """Check the invariants across shards; returns a list of problems (empty if consistent).
+
+        Every listed loan has exactly one ledger entry on the book's shard, copy
+        counts match the ledger, nobody exceeds the borrowing limit, and no
+        transaction is left prepared. Call it while no operations are running.
+        """
+        audits = [future.result() for future in [shard.submit("audit") for shard in self._shards]]
+        copies, loans, borrowed, problems = {}, set(), {}, []
+        for audit in audits:
+            copies.update(audit["copies"])
+            loans.update(audit["loans"])
+            borrowed.update(audit["borrowed"])
+            if audit["prepared"]:
+                problems.append(f"{audit['prepared']} transaction(s) left prepared on a shard.")
+        listed = set()
+        for member_id, isbns in borrowed.items():
+            if len(isbns) > mainoperations.MAX_BORROWED_BOOKS:
+                problems.append(f"Member {member_id} holds {len(isbns)} books.")
+            listed.update((isbn, member_id) for isbn in isbns)
+        for isbn, member_id in listed - loans:
+            problems.append(f"Member {member_id} lists {isbn} without a ledger entry.")
+        for isbn, member_id in loans - listed:
+            problems.append(f"Ledger lends {isbn} to {member_id}, who does not list it.")
+        on_loan = {}
+        for isbn, _ in loans:
+            on_loan[isbn] = on_loan.get(isbn, 0) + 1
+        for isbn, (available, owned) in copies.items():
+            if available < 0 or owned - available != on_loan.get(isbn, 0):
+                problems.append(f"Book {isbn} has {available} of {owned} copies available "
+                                f"but {on_loan.get(isbn, 0)} loan(s).")
+        return problems
+
+
+def _merge_report(report, shard_report, lines, max_rejects):
+    """Add a shard's import report, mapping its row numbers back to the caller's line numbers."""
+    report["accepted"] += shard_report["accepted"]
+    report["rejected"] += shard_report["rejected"]
+    for reject in shard_report["rejects"]:
+        if len(report["rejects"]) < max_rejects:
+            report["rejects"].append(dict(reject, line=lines[reject["line"] - 1]))
@@ -0,0 +1,287 @@
+# snapshots.py - copy-on-write, point-in-time views of books and members
+#
+# SnapshotStore mirrors mainoperations.books and members from the mutation
+# listener into chunked tables: a list of fixed-size chunks holding
+# (key, read-only record image) entries in insertion order. snapshot() copies
+# only the list of chunk references and starts a new epoch. The first write to a
+# chunk in the new epoch copies that chunk (chunk_size entries) and leaves the
+# original to the snapshots sharing it. A snapshot therefore costs
+# O(records / chunk_size), writers are only held up that long, and readers can
+# walk a fixed state for as long as they like while the library keeps changing.
+#
+# Listeners run while the operation holds its locks, and each notification is
+# applied under the store lock, so a snapshot shows every operation entirely or
+# not at all. Holds are not mirrored.
+
+import gc
+import threading
+import time
+from collections.abc import Mapping
+from types import MappingProxyType
+
+import mainoperations
+
+# Operations that change neither books nor members
+_UNMIRRORED_OPS = ("place_hold", "cancel_hold")
+
+
+class _CowTable:
+    """Live side of a chunked copy-on-write table (guarded by the store lock)."""
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self.chunk_epochs = []    # epoch each chunk was last copied in; older chunks are shared
+        self.positions = {}       # key -> every position it has had, ascending
+        self.length = 0           # entries ever appended, deleted ones included
+        self.count = 0            # live entries
+        self.copies = 0           # chunks copied on write
+
+    def _writable(self, index, epoch):
+        if self.chunk_epochs[index] != epoch:
+            self.chunks[index] = self.chunks[index].copy()
+            self.chunk_epochs[index] = epoch
+            self.copies += 1
+        return self.chunks[index]
+
+    def put(self, key, image, epoch):
+        positions = self.positions.get(key)
+        if positions:
+            index, offset = divmod(positions[-1], self.chunk_size)
+            if self.chunks[index][offset] is not None:
+                self._writable(index, epoch)[offset] = (key, image)
+                return
+        position = self.length
+        index = position // self.chunk_size
+        if index == len(self.chunks):
+            self.chunks.append([])
+            self.chunk_epochs.append(epoch)
+        self._writable(index, epoch).append((key, image))
+        self.length += 1
+        self.count += 1
+        # Appending keeps older snapshots correct: they ignore positions past their length
+        if positions is None:
+            self.positions[key] = [position]
+        else:
+            positions.append(position)
+
+    def delete(self, key, epoch):
+        positions = self.positions.get(key)
+        if not positions:
+            return
+        index, offset = divmod(positions[-1], self.chunk_size)
+        if self.chunks[index][offset] is None:
+            return
+        self._writable(index, epoch)[offset] = None
+        self.count -= 1
+        # Compact once deleted entries outnumber live ones (snapshots keep the old chunks and positions)
+        if self.length - self.count > max(self.count, self.chunk_size):
+            self._compact(epoch)
+
+    def _compact(self, epoch):
+        entries = [entry for chunk in self.chunks for entry in chunk if entry is not None]
+        size = self.chunk_size
+        self.chunks = [entries[start:start + size] for start in range(0, len(entries), size)]
+        self.chunk_epochs = [epoch] * len(self.chunks)
+        self.positions = {key: [position] for position, (key, _) in enumerate(entries)}
+        self.length = self.count = len(entries)
+
+    def freeze(self, table_type=None):
+        table_type = _FrozenTable if table_type is None else table_type
+        return table_type(tuple(self.chunks), self.positions, self.length, self.count, self.chunk_size)
+
+
+class _FrozenTable(Mapping):
+    """Read-only mapping over the chunks of a table as they were when the snapshot was taken."""
+
+    __slots__ = ("_chunks", "_positions", "_length", "_count", "_chunk_size")
+
+    def __init__(self, chunks, positions, length, count, chunk_size):
+        self._chunks = chunks
+        self._positions = positions
+        self._length = length
+        self._count = count
+        self._chunk_size = chunk_size
+
+    def __getitem__(self, key):
+        # Only the latest position the key had before the snapshot can hold it
+        for position in reversed(self._positions.get(key, ())):
+            if position < self._length:
+                entry = self._chunks[position // self._chunk_size][position % self._chunk_size]
+                if entry is not None:
+                    return entry[1]
+                break
+        raise KeyError(key)
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            for entry in chunk:
+                if entry is not None:
+                    yield entry[0]
+
+    def __len__(self):
+        return self._count
+
+    def items(self):
+        """Iterate (key, record) pairs in insertion order without a lookup per key."""
+        for chunk in self._chunks:
+            for entry in chunk:
+                if entry is not None:
+                    yield entry
+
+    def values(self):
+        for chunk in self._chunks:
+            for entry in chunk:
+                if entry is not None:
+                    yield entry[1]
+
+
+class _FrozenMembers(_FrozenTable):
+    """Frozen member table that iterates over the records, like mainoperations.members."""
+
+    __slots__ = ()
+
+    __iter__ = _FrozenTable.values
+
+    def ids(self):
+        """Iterate the member IDs in insertion order."""
+        for chunk in self._chunks:
+            for entry in chunk:
+                if entry is not None:
+                    yield entry[0]
+
+    keys = ids
+
+
+class Snapshot:
+    """A consistent view of the library at one point in time.
+
+    books (ISBN -> book) and members (member ID -> member) are read-only
+    mappings in insertion order; the records have the same keys as in
+    mainoperations, and books also carry their "isbn". Like
+    mainoperations.members, iterating members yields the records (ids()
+    gives the member IDs). sequence counts the
+    mutations applied before the snapshot, taken_at is its epoch time.
+    """
+
+    __slots__ = ("sequence", "taken_at", "books", "members")
+
+    def __init__(self, sequence, taken_at, books, members):
+        self.sequence = sequence
+        self.taken_at = taken_at
+        self.books = books
+        self.members = members
+
+    def __repr__(self):
+        return f"Snapshot(sequence={self.sequence}, books={len(self.books)}, members={len(self.members)})"
+
+
+def _book_image(isbn, book):
+    return MappingProxyType({"isbn": isbn, "title": book.title, "author": book.author, "genre": book.genre,
+                             "total_copies": book.total_copies, "original_copies": book.original_copies})
+
+
+def _member_image(member):
+    return MappingProxyType({"member_id": member.member_id, "name": member.name, "email": member.email,
+                             "borrowed_books": member.borrowed_books})
+
+
+class SnapshotStore:
+    """Copy-on-write mirror of books and members that hands out Snapshots.
+
+    Create it with attach(), which loads the current library and subscribes
+    to later changes. chunk_size trades snapshot cost (one reference per
+    chunk) against the cost of the first write to a chunk after a snapshot.
+    """
+
+    def __init__(self, chunk_size=256):
+        self.chunk_size = chunk_size
+        self._lock = threading.Lock()
+        self._epoch = 0
+        self._sequence = 0
+        self.snapshots_taken = 0
+        self._books = _CowTable(chunk_size)
+        self._members = _CowTable(chunk_size)
+
+    # Synchronization
+
+    def attach(self):
+        """Load the current library and start following mutations."""
+        with mainoperations.exclusive():
+            self._reload()
+            mainoperations.add_listener(self._on_change)
+        return self
+
+    def detach(self):
+        mainoperations.remove_listener(self._on_change)
+
+    def _reload(self):
+        """Replace the mirror with the current library (snapshots already taken are unaffected).
+
+        The cyclic garbage collector is paused meanwhile: the millions of new
+        images cannot form cycles, but would trigger many collection passes.
+        """
+        was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with self._lock:
+                books, members = _CowTable(self.chunk_size), _CowTable(self.chunk_size)
+                books.copies, members.copies = self._books.copies, self._members.copies
+                for isbn, book in list(mainoperations.books.items()):
+                    books.put(isbn, _book_image(isbn, book), self._epoch)
+                for member_id, member in list(mainoperations.members.items()):
+                    members.put(member_id, _member_image(member), self._epoch)
+                self._books, self._members = books, members
+                self._sequence += 1
+        finally:
+            if was_enabled:
+                gc.enable()
+
+    def _on_change(self, op, details):
+        if op == "reset":
+            self._reload()
+            return
+        if op in _UNMIRRORED_OPS:
+            return
+        isbns = details.get("isbns") or ((details["isbn"],) if "isbn" in details else ())
+        member_id = details.get("member_id")
+        with self._lock:
+            epoch = self._epoch
+            for isbn in isbns:
+                book = mainoperations.books.get(isbn)
+                if book is None:
+                    self._books.delete(isbn, epoch)
+                else:
+                    self._books.put(isbn, _book_image(isbn, book), epoch)
+            if member_id is not None:
+                member = mainoperations.members.get(member_id)
+                if member is None:
+                    self._members.delete(member_id, epoch)
+                else:
+                    self._members.put(member_id, _member_image(member), epoch)
+            self._sequence += 1
+
+    # Snapshots
+
+    def snapshot(self):
+        """Return a Snapshot of the library as of now."""
+        with self._lock:
+            self._epoch += 1
+            self.snapshots_taken += 1
+            return Snapshot(self._sequence, time.time(), self._books.freeze(), self._members.freeze(_FrozenMembers))
+
+    def stats(self):
+        """Return record and chunk counts, chunks copied on write and snapshots taken."""
+        with self._lock:
+            return {
+                "books": self._books.count,
+                "members": self._members.count,
+                "chunks": len(self._books.chunks) + len(self._members.chunks),
+                "chunk_copies": self._books.copies + self._members.copies,
+                "snapshots_taken": self.snapshots_taken,
+            }
+
+
+def attach_snapshot_store(chunk_size=256):
+    """Create a SnapshotStore that stays in sync with later changes."""
+    return SnapshotStore(chunk_size).attach()
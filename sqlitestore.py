@@ -0,0 +1,547 @@
+# sqlitestore.py - SQLite storage backend for catalogs larger than memory
+#
+# SQLiteLibrary keeps books, members and loans in one SQLite database instead
+# of the mainoperations dictionaries, with the same operations, results and
+# error messages. Lookups go through indexes (ISBN, member ID, email, the loan
+# keys and due dates), and title/author searches through an FTS5 trigram index,
+# which answers the same case-insensitive substring queries as the in-memory
+# n-gram index. SQLite only folds ASCII case, so the index covers shadow
+# title_key/author_key columns lowercased in Python with str.lower(), exactly
+# as mainoperations lowercases, and matches them case-sensitively.
+#
+# The database runs in WAL mode: one writer connection (behind a lock, every
+# change is one transaction) works alongside a small pool of reader
+# connections, so searches and lookups do not wait for writes. Statements are
+# fixed SQL strings with parameters, prepared once per connection and reused
+# from its statement cache. Bulk loads validate a batch in Python and insert it
+# with a single executemany.
+
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import bulk_import
+import diagnostics
+import mainoperations
+from records import Loan
+from results import (
+    ALREADY_BORROWED, ALREADY_EXISTS, BATCH_REJECTED, COPIES_ON_LOAN, DUPLICATE_EMAIL, DUPLICATE_ITEM, HAS_LOANS,
+    INVALID_COPIES, INVALID_GENRE, LIMIT_REACHED, NO_COPIES, NOT_BORROWED, NOT_FOUND, SUCCESS, Result,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,   -- catalog order: search results come back in it
+    isbn TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL,
+    genre TEXT NOT NULL,
+    total_copies INTEGER NOT NULL,
+    original_copies INTEGER NOT NULL,
+    title_key TEXT NOT NULL DEFAULT '',    -- title.lower(), what searches match
+    author_key TEXT NOT NULL DEFAULT ''    -- author.lower()
+);
+CREATE TABLE IF NOT EXISTS members (
+    member_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    email_key TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS loans (
+    isbn TEXT NOT NULL,
+    member_id TEXT NOT NULL,
+    borrowed_at REAL NOT NULL,
+    due_at REAL NOT NULL,
+    UNIQUE (isbn, member_id)
+);
+CREATE INDEX IF NOT EXISTS loans_by_member ON loans (member_id);
+CREATE INDEX IF NOT EXISTS loans_by_due_date ON loans (due_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+    title_key, author_key, content='books', content_rowid='seq', tokenize='trigram case_sensitive 1'
+);
+CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+    INSERT INTO books_fts (rowid, title_key, author_key) VALUES (new.seq, new.title_key, new.author_key);
+END;
+CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+    INSERT INTO books_fts (books_fts, rowid, title_key, author_key)
+        VALUES ('delete', old.seq, old.title_key, old.author_key);
+END;
+CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title_key, author_key ON books BEGIN
+    INSERT INTO books_fts (books_fts, rowid, title_key, author_key)
+        VALUES ('delete', old.seq, old.title_key, old.author_key);
+    INSERT INTO books_fts (rowid, title_key, author_key) VALUES (new.seq, new.title_key, new.author_key);
+END;
+"""
+
+# Databases created before the key columns existed: their index covered title and author
+_UPGRADE_SQL = (
+    "DROP TRIGGER IF EXISTS books_fts_insert",
+    "DROP TRIGGER IF EXISTS books_fts_delete",
+    "DROP TRIGGER IF EXISTS books_fts_update",
+    "DROP TABLE IF EXISTS books_fts",
+    "ALTER TABLE books ADD COLUMN title_key TEXT NOT NULL DEFAULT ''",
+    "ALTER TABLE books ADD COLUMN author_key TEXT NOT NULL DEFAULT ''",
+)
+
+_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",   # WAL stays consistent; only the last commits may be lost on power loss
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",     # 64 MiB page cache per connection
+)
+
+_BOOK_COLUMNS = "b.isbn, b.title, b.author, b.genre, b.total_copies, b.original_copies"
+_BOOK_FIELDS = ("isbn", "title", "author", "genre", "total_copies", "original_copies")
+
+# FTS5 trigram GLOB (case-sensitive, on the lowercased keys) uses the index for
+# patterns with three or more characters
+_SEARCH_SQL = {
+    field: f"SELECT {_BOOK_COLUMNS} FROM books_fts f JOIN books b ON b.seq = f.rowid "
+           f"WHERE f.{field}_key GLOB ? ORDER BY b.seq"
+    for field in mainoperations.SEARCH_FIELDS
+}
+_COUNT_SQL = {field: f"SELECT COUNT(*) FROM books_fts WHERE {field}_key GLOB ?"
+              for field in mainoperations.SEARCH_FIELDS}
+# Queries containing GLOB wildcards are matched literally by a scan instead
+_SCAN_SQL = {
+    field: f"SELECT {_BOOK_COLUMNS} FROM books b WHERE instr(b.{field}_key, ?) ORDER BY b.seq"
+    for field in mainoperations.SEARCH_FIELDS
+}
+_GLOB_WILDCARDS = frozenset("*?[")
+
+_BORROW_CHECK_SQL = """
+SELECT (SELECT total_copies FROM books WHERE isbn = :isbn),
+       EXISTS (SELECT 1 FROM members WHERE member_id = :member_id),
+       (SELECT COUNT(*) FROM loans WHERE member_id = :member_id),
+       EXISTS (SELECT 1 FROM loans WHERE isbn = :isbn AND member_id = :member_id)
+"""
+_RETURN_CHECK_SQL = """
+SELECT EXISTS (SELECT 1 FROM books WHERE isbn = :isbn),
+       EXISTS (SELECT 1 FROM members WHERE member_id = :member_id),
+       EXISTS (SELECT 1 FROM loans WHERE isbn = :isbn AND member_id = :member_id)
+"""
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False, cached_statements=256)
+    for pragma in _PRAGMAS:
+        connection.execute(pragma)
+    return connection
+
+
+def _book_dict(row):
+    return dict(zip(_BOOK_FIELDS, row))
+
+
+def _search_key(text):
+    """Lowercase a title, author or query the way mainoperations does (full Unicode case)."""
+    return str(text).lower()
+
+
+def _glob_pattern(key):
+    return f"*{key}*"
+
+
+def _upgrade(db):
+    """Add the search key columns to a database created without them; returns True if it did."""
+    columns = [row[1] for row in db.execute("PRAGMA table_info(books)")]
+    if not columns or "title_key" in columns:
+        return False
+    for statement in _UPGRADE_SQL:
+        db.execute(statement)
+    db.executemany("UPDATE books SET title_key = ?, author_key = ? WHERE seq = ?",
+                   [(_search_key(title), _search_key(author), seq)
+                    for seq, title, author in db.execute("SELECT seq, title, author FROM books").fetchall()])
+    return True
+
+
+class SQLiteLibrary:
+    """Library stored in the SQLite database at path, with the mainoperations operations.
+
+    Mutating calls return True/False, or a Result with detailed=True, and send
+    rejections to the diagnostics sink, like mainoperations. Use it as a
+    context manager, or call close(), to release the connections.
+    """
+
+    def __init__(self, path, readers=4, diagnostics_sink=diagnostics.DEFAULT):
+        self.path = path
+        self.diagnostics = diagnostics.resolve(diagnostics_sink)
+        self._writer = _connect(path)
+        self._write_lock = threading.Lock()
+        with self._writing() as db:
+            upgraded = _upgrade(db)
+        self._writer.executescript(SCHEMA)
+        if upgraded:
+            self._writer.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+        self._readers = queue.LifoQueue()
+        self._reader_count = readers
+        for _ in range(readers):
+            self._readers.put(_connect(path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close every connection (waits for readers in use to be returned)."""
+        with self._write_lock:
+            self._writer.close()
+        for _ in range(self._reader_count):
+            self._readers.get().close()
+
+    @contextmanager
+    def _reading(self):
+        """Borrow a reader connection from the pool."""
+        connection = self._readers.get()
+        try:
+            yield connection
+        finally:
+            self._readers.put(connection)
+
+    @contextmanager
+    def _writing(self):
+        """Run the block as one write transaction on the writer connection."""
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._writer.execute("COMMIT")
+
+    def _fail(self, problem, detailed):
+        if self.diagnostics is not None:
+            self.diagnostics.emit(problem.message)
+        return problem if detailed else False
+
+    # Create
+
+    def add_book(self, isbn, title, author, genre, total_copies, detailed=False):
+        """Add a new book if ISBN is unique and genre is valid."""
+        with self._writing() as db:
+            if db.execute("SELECT 1 FROM books WHERE isbn = ?", (isbn,)).fetchone():
+                problem = Result(ALREADY_EXISTS, f"Error: Book with ISBN {isbn} already exists.")
+            elif not mainoperations.is_valid_genre(genre):
+                problem = Result(INVALID_GENRE, f"Error: Invalid genre '{genre}'. Must be one of "
+                                                f"{list(mainoperations.GENRES)}.")
+            elif not isinstance(total_copies, int) or total_copies < 0:
+                problem = Result(INVALID_COPIES, "Error: Total copies must be a non-negative integer.")
+            else:
+                problem = None
+                db.execute("INSERT INTO books (isbn, title, author, genre, total_copies, original_copies, title_key, "
+                           "author_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           (isbn, title, author, genre, total_copies, total_copies, _search_key(title),
+                            _search_key(author)))
+        return self._fail(problem, detailed) if problem is not None else (SUCCESS if detailed else True)
+
+    def add_member(self, member_id, name, email, detailed=False):
+        """Add a new member if member_id and email are unique."""
+        with self._writing() as db:
+            if db.execute("SELECT 1 FROM members WHERE member_id = ?", (member_id,)).fetchone():
+                problem = Result(ALREADY_EXISTS, f"Error: Member with ID {member_id} already exists.")
+            elif db.execute("SELECT 1 FROM members WHERE email_key = ?", (mainoperations.email_key(email),)).fetchone():
+                problem = Result(DUPLICATE_EMAIL, f"Error: Email {email} is already registered to another member.")
+            else:
+                problem = None
+                db.execute("INSERT INTO members (member_id, name, email, email_key) VALUES (?, ?, ?, ?)",
+                           (member_id, name, email, mainoperations.email_key(email)))
+        return self._fail(problem, detailed) if problem is not None else (SUCCESS if detailed else True)
+
+    def import_books(self, rows, batch_size=5_000, max_rejects=1_000):
+        """Bulk-load book rows (dicts, as for bulk_import.import_book_rows); returns the same report."""
+        report = bulk_import.new_report()
+        for batch in bulk_import.batched(enumerate(rows, start=1), batch_size):
+            isbns = [str(row.get("isbn") or "").strip() for _, row in batch]
+            with self._writing() as db:
+                existing = self._existing(db, "SELECT isbn FROM books WHERE isbn IN ({})", isbns)
+                accepted = bulk_import.validate_book_batch(batch, report, max_rejects, existing)
+                db.executemany("INSERT INTO books (isbn, title, author, genre, total_copies, original_copies, "
+                               "title_key, author_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               [(*book, book[-1], _search_key(book[1]), _search_key(book[2])) for book in accepted])
+            report["accepted"] += len(accepted)
+        return report
+
+    def import_members(self, rows, batch_size=5_000, max_rejects=1_000):
+        """Bulk-load member rows (dicts, as for bulk_import.import_member_rows); returns the same report."""
+        report = bulk_import.new_report()
+        for batch in bulk_import.batched(enumerate(rows, start=1), batch_size):
+            member_ids = [str(row.get("member_id") or "").strip() for _, row in batch]
+            email_keys = [mainoperations.email_key(str(row.get("email") or "")) for _, row in batch]
+            with self._writing() as db:
+                existing_ids = self._existing(db, "SELECT member_id FROM members WHERE member_id IN ({})", member_ids)
+                existing_emails = self._existing(db, "SELECT email_key FROM members WHERE email_key IN ({})",
+                                                 email_keys)
+                accepted = bulk_import.validate_member_batch(batch, report, max_rejects, existing_ids,
+                                                              existing_emails)
+                db.executemany("INSERT INTO members (member_id, name, email, email_key) VALUES (?, ?, ?, ?)",
+                               [(*member, mainoperations.email_key(member[2])) for member in accepted])
+            report["accepted"] += len(accepted)
+        return report
+
+    @staticmethod
+    def _existing(db, sql, keys):
+        """Return which of keys are already stored, with one query per 500 keys."""
+        found = set()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            found.update(key for key, in db.execute(sql.format(", ".join("?" * len(chunk))), chunk))
+        return found
+
+    # Read
+
+    def get_book(self, isbn):
+        """Return the book's fields as a dict (including isbn), or None."""
+        with self._reading() as db:
+            row = db.execute(f"SELECT {_BOOK_COLUMNS} FROM books b WHERE b.isbn = ?", (isbn,)).fetchone()
+        return _book_dict(row) if row else None
+
+    def get_member(self, member_id):
+        """Return the member's fields as a dict, with borrowed_books in borrowing order, or None."""
+        with self._reading() as db:
+            row = db.execute("SELECT member_id, name, email FROM members WHERE member_id = ?", (member_id,)).fetchone()
+            if row is None:
+                return None
+            loans = db.execute("SELECT isbn FROM loans WHERE member_id = ? ORDER BY rowid", (member_id,)).fetchall()
+        return {"member_id": row[0], "name": row[1], "email": row[2], "borrowed_books": tuple(isbn for isbn, in loans)}
+
+    def find_member_by_email(self, email):
+        """Return the member registered with an email (as get_member does), or None."""
+        with self._reading() as db:
+            row = db.execute("SELECT member_id FROM members WHERE email_key = ?",
+                             (mainoperations.email_key(email),)).fetchone()
+        return self.get_member(row[0]) if row else None
+
+    def search_books(self, query, by="title"):
+        """Search books by title or author (case-insensitive, partial matches), in catalog order."""
+        if by not in mainoperations.SEARCH_FIELDS:
+            by = "title"
+        key = _search_key(query)
+        with self._reading() as db:
+            if _GLOB_WILDCARDS.intersection(key):
+                rows = db.execute(_SCAN_SQL[by], (key,)).fetchall()
+            else:
+                rows = db.execute(_SEARCH_SQL[by], (_glob_pattern(key),)).fetchall()
+        return [_book_dict(row) for row in rows]
+
+    def count_matches(self, query, by="title"):
+        """Return how many books search_books would find."""
+        if by not in mainoperations.SEARCH_FIELDS:
+            by = "title"
+        key = _search_key(query)
+        if _GLOB_WILDCARDS.intersection(key):
+            return len(self.search_books(query, by))
+        with self._reading() as db:
+            return db.execute(_COUNT_SQL[by], (_glob_pattern(key),)).fetchone()[0]
+
+    def get_loan(self, isbn, member_id):
+        """Return the Loan record for a member's copy of a book, or None."""
+        with self._reading() as db:
+            row = db.execute("SELECT isbn, member_id, borrowed_at, due_at FROM loans WHERE isbn = ? AND member_id = ?",
+                             (isbn, member_id)).fetchone()
+        return Loan(*row) if row else None
+
+    def holders_of(self, isbn):
+        """Return the IDs of the members currently borrowing a book, sorted."""
+        with self._reading() as db:
+            return [member_id for member_id, in
+                    db.execute("SELECT member_id FROM loans WHERE isbn = ? ORDER BY member_id", (isbn,))]
+
+    def overdue_loans(self, as_of=None, limit=None):
+        """Return loans past their due date at as_of (default: now), most overdue first."""
+        with self._reading() as db:
+            rows = db.execute("SELECT isbn, member_id, borrowed_at, due_at FROM loans WHERE due_at < ? "
+                              "ORDER BY due_at LIMIT ?",
+                              (time.time() if as_of is None else as_of, -1 if limit is None else limit)).fetchall()
+        return [Loan(*row) for row in rows]
+
+    # Update
+
+    def update_book(self, isbn, title=None, author=None, genre=None, total_copies=None, detailed=False):
+        """Update specified fields of a book if it exists and genre is valid.
+
+        total_copies sets how many copies are on the shelf; copies on loan stay
+        owned (original_copies = total_copies + on loan), as in mainoperations.
+        """
+        with self._writing() as db:
+            row = db.execute("SELECT total_copies, original_copies FROM books WHERE isbn = ?", (isbn,)).fetchone()
+            if row is None:
+                problem = Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found.")
+            elif genre is not None and not mainoperations.is_valid_genre(genre):
+                problem = Result(INVALID_GENRE, f"Error: Invalid genre '{genre}'. Update failed.")
+            elif total_copies is not None and (not isinstance(total_copies, int) or total_copies < 0):
+                problem = Result(INVALID_COPIES, "Error: Total copies must be a non-negative integer. Update failed.")
+            elif total_copies is not None and total_copies < row[1] - row[0]:
+                problem = Result(COPIES_ON_LOAN, f"Error: Cannot set total copies to {total_copies}. "
+                                                 f"{row[1] - row[0]} copies are currently borrowed.")
+            else:
+                problem = None
+                db.execute("UPDATE books SET title = coalesce(?, title), author = coalesce(?, author), "
+                           "genre = coalesce(?, genre), total_copies = coalesce(?, total_copies), "
+                           "original_copies = coalesce(? + (original_copies - total_copies), original_copies), "
+                           "title_key = coalesce(?, title_key), author_key = coalesce(?, author_key) "
+                           "WHERE isbn = ?",
+                           (title, author, genre, total_copies, total_copies,
+                            None if title is None else _search_key(title),
+                            None if author is None else _search_key(author), isbn))
+        return self._fail(problem, detailed) if problem is not None else (SUCCESS if detailed else True)
+
+    def update_member(self, member_id, name=None, email=None, detailed=False):
+        """Update specified fields of a member if they exist."""
+        with self._writing() as db:
+            if not db.execute("SELECT 1 FROM members WHERE member_id = ?", (member_id,)).fetchone():
+                problem = Result(NOT_FOUND, f"Error: Member with ID {member_id} not found.")
+            elif email is not None and db.execute(
+                    "SELECT 1 FROM members WHERE email_key = ? AND member_id <> ?",
+                    (mainoperations.email_key(email), member_id)).fetchone():
+                problem = Result(DUPLICATE_EMAIL, f"Error: Email {email} is already registered to another member. "
+                                                  f"Update failed.")
+            else:
+                problem = None
+                db.execute("UPDATE members SET name = coalesce(?, name), email = coalesce(?, email), "
+                           "email_key = coalesce(?, email_key) WHERE member_id = ?",
+                           (name, email, None if email is None else mainoperations.email_key(email), member_id))
+        return self._fail(problem, detailed) if problem is not None else (SUCCESS if detailed else True)
+
+    # Delete
+
+    def delete_book(self, isbn, detailed=False):
+        """Remove a book if it exists and all copies are available."""
+        with self._writing() as db:
+            if not db.execute("SELECT 1 FROM books WHERE isbn = ?", (isbn,)).fetchone():
+                problem = Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found.")
+            elif db.execute("SELECT 1 FROM loans WHERE isbn = ?", (isbn,)).fetchone():
+                holders = [member_id for member_id, in
+                           db.execute("SELECT member_id FROM loans WHERE isbn = ? ORDER BY member_id", (isbn,))]
+                problem = Result(COPIES_ON_LOAN, f"Error: Cannot delete book {isbn}. Some copies are currently "
+                                                 f"borrowed by: {holders}.")
+            else:
+                problem = None
+                db.execute("DELETE FROM books WHERE isbn = ?", (isbn,))
+        return self._fail(problem, detailed) if problem is not None else (SUCCESS if detailed else True)
+
+    def delete_member(self, member_id, detailed=False):
+        """Remove a member if they exist and have no borrowed books."""
+        with self._writing() as db:
+            loans = [isbn for isbn, in db.execute("SELECT isbn FROM loans WHERE member_id = ? ORDER BY rowid",
+                                                  (member_id,))]
+            if not db.execute("SELECT 1 FROM members WHERE member_id = ?", (member_id,)).fetchone():
+                problem = Result(NOT_FOUND, f"Error: Member with ID {member_id} not found.")
+            elif loans:
+                problem = Result(HAS_LOANS, f"Error: Cannot delete member {member_id}. They have borrowed books: "
+                                            f"{loans}.")
+            else:
+                problem = None
+                db.execute("DELETE FROM members WHERE member_id = ?", (member_id,))
+        return self._fail(problem, detailed) if problem is not None else (SUCCESS if detailed else True)
+
+    # Borrow/Return
+
+    @staticmethod
+    def _borrow_problem(db, isbn, member_id, pending_loans=0):
+        available, member_exists, borrowed, already = db.execute(
+            _BORROW_CHECK_SQL, {"isbn": isbn, "member_id": member_id}).fetchone()
+        if available is None:
+            return Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found.")
+        if not member_exists:
+            return Result(NOT_FOUND, f"Error: Member with ID {member_id} not found.")
+        if available <= 0:
+            return Result(NO_COPIES, f"Error: No copies of book {isbn} are currently available.")
+        if borrowed + pending_loans >= mainoperations.MAX_BORROWED_BOOKS:
+            return Result(LIMIT_REACHED, f"Error: Member {member_id} has reached the borrowing limit "
+                                         f"({mainoperations.MAX_BORROWED_BOOKS} books).")
+        if already:
+            return Result(ALREADY_BORROWED, f"Error: Member {member_id} has already borrowed a copy of book {isbn}.")
+        return None
+
+    @staticmethod
+    def _return_problem(db, isbn, member_id):
+        book_exists, member_exists, on_loan = db.execute(
+            _RETURN_CHECK_SQL, {"isbn": isbn, "member_id": member_id}).fetchone()
+        if not book_exists:
+            return Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found.")
+        if not member_exists:
+            return Result(NOT_FOUND, f"Error: Member with ID {member_id} not found.")
+        if not on_loan:
+            return Result(NOT_BORROWED, f"Error: Book {isbn} was not borrowed by member {member_id}.")
+        return None
+
+    @staticmethod
+    def _lend(db, loans):
+        """Record (isbn, member_id, now) loans with two set-based statements."""
+        db.executemany("UPDATE books SET total_copies = total_copies - 1 WHERE isbn = ?",
+                       [(isbn,) for isbn, _, _ in loans])
+        db.executemany("INSERT INTO loans (isbn, member_id, borrowed_at, due_at) VALUES (?, ?, ?, ?)",
+                       [(isbn, member_id, now, now + mainoperations.LOAN_PERIOD_DAYS * 86400)
+                        for isbn, member_id, now in loans])
+
+    @staticmethod
+    def _receive(db, returns):
+        db.executemany("UPDATE books SET total_copies = total_copies + 1 WHERE isbn = ?",
+                       [(isbn,) for isbn, _ in returns])
+        db.executemany("DELETE FROM loans WHERE isbn = ? AND member_id = ?", returns)
+
+    def borrow_book(self, isbn, member_id, detailed=False, now=None):
+        """Borrows a book if available and member has room (loans are due LOAN_PERIOD_DAYS after now)."""
+        with self._writing() as db:
+            problem = self._borrow_problem(db, isbn, member_id)
+            if problem is None:
+                self._lend(db, [(isbn, member_id, time.time() if now is None else now)])
+        return self._fail(problem, detailed) if problem is not None else (SUCCESS if detailed else True)
+
+    def return_book(self, isbn, member_id, detailed=False):
+        """Returns a book if it was actually borrowed by the member."""
+        with self._writing() as db:
+            problem = self._return_problem(db, isbn, member_id)
+            if problem is None:
+                self._receive(db, [(isbn, member_id)])
+        return self._fail(problem, detailed) if problem is not None else (SUCCESS if detailed else True)
+
+    def _batch(self, action, member_id, isbns, check, apply, detailed):
+        """Validate a whole batch inside one transaction and apply it only if every item passes."""
+        isbns = list(isbns)
+        with self._writing() as db:
+            if not db.execute("SELECT 1 FROM members WHERE member_id = ?", (member_id,)).fetchone():
+                missing = Result(NOT_FOUND, f"Error: Member with ID {member_id} not found.")
+                problems = [(isbn, missing) for isbn in isbns]
+            else:
+                problems = []
+                seen = set()
+                for position, isbn in enumerate(isbns):
+                    if not db.execute("SELECT 1 FROM books WHERE isbn = ?", (isbn,)).fetchone():
+                        problem = Result(NOT_FOUND, f"Error: Book with ISBN {isbn} not found.")
+                    elif isbn in seen:
+                        problem = Result(DUPLICATE_ITEM, f"Error: Book {isbn} appears more than once in the batch.")
+                    else:
+                        problem = check(db, isbn, position)
+                    seen.add(isbn)
+                    problems.append((isbn, problem))
+            if all(problem is None for _, problem in problems):
+                apply(db)
+        failed = [isbn for isbn, problem in problems if problem is not None]
+        items = mainoperations.item_results(problems, detailed)
+        if not failed:
+            return (SUCCESS if detailed else True), items
+        summary = Result(BATCH_REJECTED, f"Error: {action} for member {member_id} cancelled. "
+                                         f"{len(failed)} of {len(problems)} item(s) failed: {failed}.")
+        return self._fail(summary, detailed), items
+
+    def borrow_books(self, member_id, isbns, detailed=False, now=None):
+        """Borrow several books for one member, all or nothing; returns (success, per-item results)."""
+        now = time.time() if now is None else now
+        isbns = list(isbns)
+        return self._batch("Checkout", member_id, isbns,
+                           lambda db, isbn, position: self._borrow_problem(db, isbn, member_id, position),
+                           lambda db: self._lend(db, [(isbn, member_id, now) for isbn in isbns]), detailed)
+
+    def return_books(self, member_id, isbns, detailed=False):
+        """Return several books for one member, all or nothing; returns (success, per-item results)."""
+        isbns = list(isbns)
+        return self._batch("Return", member_id, isbns,
+                           lambda db, isbn, position: self._return_problem(db, isbn, member_id),
+                           lambda db: self._receive(db, [(isbn, member_id) for isbn in isbns]), detailed)
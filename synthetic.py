@@ -0,0 +1,119 @@
+# synthetic.py - deterministic synthetic catalogs and memberships for benchmarks
+#
+# The same (count, seed) always produces the same rows. Distributions are
+# skewed the way real libraries are: a few prolific authors write a large
+# share of the books, fiction genres dominate, most titles own one to three
+# copies, and title lengths vary. Rows are generated lazily, so even very
+# large catalogs stream through bulk_import without being held in memory.
+
+import random
+
+import bulk_import
+import mainoperations
+
+_TITLE_WORDS = (
+    "Shadow", "River", "Empire", "Garden", "Winter", "Engine", "Secret", "Silver", "Night", "Storm",
+    "Crown", "Ocean", "Forest", "Machine", "Memory", "Fire", "Glass", "Stone", "Light", "Star",
+    "House", "Journey", "Island", "City", "Dream", "Iron", "Song", "Road", "Mountain", "Letter",
+    "Mirror", "Hunter", "Kingdom", "Harbor", "Lantern", "Orchard", "Signal", "Tide", "Valley", "Window",
+)
+_TITLE_PATTERNS = (
+    "{a}", "The {a}", "{a} and {b}", "The {a} of {b}", "{a} {b}", "A {a} in the {b}",
+    "The Last {a}", "{a} of the {b} {c}", "Beyond the {a}", "{a} {b}, Volume {n}",
+)
+_FIRST_NAMES = (
+    "Ada", "Ben", "Clara", "David", "Elena", "Farid", "Grace", "Hiro", "Ines", "Jonas",
+    "Kemi", "Liam", "Maya", "Nikolai", "Olga", "Priya", "Quinn", "Rosa", "Samir", "Tara",
+    "Umar", "Vera", "Wen", "Ximena", "Yusuf", "Zoe",
+)
+_LAST_NAMES = (
+    "Abbott", "Baptiste", "Chen", "Dubois", "Eriksen", "Fischer", "Garcia", "Haddad", "Ivanova", "Jensen",
+    "Kowalski", "Lindqvist", "Moreau", "Nakamura", "Okafor", "Petrov", "Quispe", "Rossi", "Silva", "Tanaka",
+    "Umarov", "Varga", "Wojcik", "Xu", "Yilmaz", "Zhang",
+)
+# Relative genre frequencies, in mainoperations.GENRES order
+_GENRE_WEIGHTS = (30, 15, 12, 18, 10, 15)
+# Relative frequencies of 1..8 owned copies
+_COPY_WEIGHTS = (40, 25, 15, 8, 5, 3, 2, 2)
+
+
+def _person_name(rng):
+    return f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)}"
+
+
+def _skewed_index(rng, size, skew=2.0):
+    """Pick an index in range(size), heavily favouring small indexes (a few prolific authors)."""
+    return int(size * rng.random() ** skew)
+
+
+def book_isbn(index):
+    """ISBN of the index-th synthetic book."""
+    return f"978-{index:010d}"
+
+
+def member_id(index):
+    """Member ID of the index-th synthetic member."""
+    return f"M{index:08d}"
+
+
+def author_pool(book_count, seed=0):
+    """Return the list of author names used for a catalog of book_count books (about 8 books each)."""
+    rng = random.Random(f"authors-{seed}")
+    count = max(20, book_count // 8)
+    # The index suffix keeps authors distinct even when the name lists repeat
+    return [f"{_person_name(rng)} {index}" if index >= 500 else _person_name(rng) for index in range(count)]
+
+
+def generate_books(count, seed=0):
+    """Yield count book rows {"isbn", "title", "author", "genre", "total_copies"}, deterministically."""
+    rng = random.Random(f"books-{seed}")
+    authors = author_pool(count, seed)
+    genres = mainoperations.GENRES
+    for index in range(count):
+        title = rng.choice(_TITLE_PATTERNS).format(
+            a=rng.choice(_TITLE_WORDS), b=rng.choice(_TITLE_WORDS), c=rng.choice(_TITLE_WORDS), n=index % 12 + 1)
+        yield {
+            "isbn": book_isbn(index),
+            "title": title,
+            "author": authors[_skewed_index(rng, len(authors))],
+            "genre": rng.choices(genres, _GENRE_WEIGHTS)[0],
+            "total_copies": rng.choices(range(1, len(_COPY_WEIGHTS) + 1), _COPY_WEIGHTS)[0],
+        }
+
+
+def generate_members(count, seed=0):
+    """Yield count member rows {"member_id", "name", "email"} with unique emails, deterministically."""
+    rng = random.Random(f"members-{seed}")
+    for index in range(count):
+        name = _person_name(rng)
+        yield {
+            "member_id": member_id(index),
+            "name": name,
+            "email": f"{name.replace(' ', '.').lower()}.{index}@example.test",
+        }
+
+
+def search_terms(count, book_count, seed=0):
+    """Return count realistic search queries as (query, by): title words, phrases and author names."""
+    rng = random.Random(f"queries-{seed}")
+    authors = author_pool(book_count, seed)
+    terms = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.4:
+            terms.append((rng.choice(_TITLE_WORDS).lower(), "title"))
+        elif roll < 0.6:
+            terms.append((f"{rng.choice(_TITLE_WORDS)} of".lower(), "title"))
+        elif roll < 0.9:
+            terms.append((authors[_skewed_index(rng, len(authors))], "author"))
+        else:
+            terms.append((rng.choice(_LAST_NAMES), "author"))
+    return terms
+
+
+def build_library(book_count, member_count, seed=0):
+    """Replace the library with a synthetic one; returns the bulk import reports (books, members)."""
+    mainoperations.reset_data()
+    books_report = bulk_import.import_book_rows(generate_books(book_count, seed))
+    members_report = bulk_import.import_member_rows(generate_members(member_count, seed))
+    return books_report, members_report
@@ -1,6 +1,25 @@
 # test_code.py or added to main.py
 
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import bulk_import
+import changefeed
+import circulation
+import diagnostics
+import inventory
 import mainoperations
+import metrics
+import persistence
+import querycache
+import sharding
+import snapshots
+import sqlitestore
 
 # Helper function to find a member's current book count
 def _get_borrowed_count(member_id):
@@ -15,8 +34,7 @@ def run_constraint_tests():
     print("="*50)
 
     # Reset data structures for clean testing environment
-    mainoperations.books = {}
-    mainoperations.members = []
+    mainoperations.reset_data()
     
     # --- SETUP: Add valid records for testing ---
     mainoperations.add_book("978-A", "The Test Book", "Test Author", "Fiction", 2)
@@ -46,6 +64,10 @@ def run_constraint_tests():
     # T01c: Test valid genre check on update
     result_c = mainoperations.update_book("978-A", genre="INVALID")
     print(f"  T01c (Update to Invalid Genre): Expected False, Got {result_c}")
+
+    # T01d: Test unique email constraint (add_member)
+    result_c2 = mainoperations.add_member("M003", "Alice Clone", "ALICE@test.com")
+    print(f"  T01d (Duplicate Email 'ALICE@test.com'): Expected False, Got {result_c2}")
     
     print("-" * 50)
 
@@ -122,6 +144,378 @@ def run_constraint_tests():
     result_j = mainoperations.delete_member("M002")
     print(f"  T05b Success (Delete M002 cleared): Expected True, Got {result_j}")
 
+    # T07: Test all-or-nothing batch checkout
+    # M001 holds 978-B and 978-A, so two more books would exceed the limit of 3.
+    result_k, _ = mainoperations.borrow_books("M001", ["978-C", "978-D"])
+    count_k = _get_borrowed_count("M001")
+    print(f"  T07a (M001 batch of 2, only 1 slot left): Expected False, Got {result_k} (Count: {count_k})")
+    result_l, _ = mainoperations.borrow_books("M001", ["978-C"])
+    print(f"  T07b (M001 batch of 1): Expected True, Got {result_l}")
+
+    # T08: Test the loan ledger's overdue query
+    # M001's 3 loans were just made, so none is overdue yet; 30 days from now all are.
+    now = time.time()
+    overdue_m = len(mainoperations.overdue_loans(as_of=now))
+    print(f"  T08a (Overdue loans now): Expected 0, Got {overdue_m}")
+    overdue_n = len(mainoperations.overdue_loans(as_of=now + 30 * 86400))
+    print(f"  T08b (Overdue loans in 30 days): Expected 3, Got {overdue_n}")
+
+    # T09: Test hold queue hand-off
+    # 978-C has its only copy with M001, so M004 waits for it and receives it on return.
+    mainoperations.add_member("M004", "Dana Test", "dana@test.com")
+    result_o = mainoperations.place_hold("978-C", "M004")
+    print(f"  T09a (M004 holds unavailable 978-C): Expected True, Got {result_o} "
+          f"(Position: {mainoperations.hold_position('978-C', 'M004')})")
+    mainoperations.return_book("978-C", "M001")
+    count_p = _get_borrowed_count("M004")
+    print(f"  T09b (978-C returned, handed to M004): Expected 1, Got {count_p}")
+
+    # T10: Test the reverse loan index
+    holders_q = mainoperations.holders_of("978-C")
+    print(f"  T10 (Holders of 978-C): Expected ['M004'], Got {holders_q}")
+
+    # T11: Test paginated search (three "Limit Test" titles, two per page)
+    page_r, cursor_r = mainoperations.search_page("limit test", limit=2)
+    page_s, cursor_s = mainoperations.search_page("limit test", limit=2, after=cursor_r)
+    print(f"  T11 (Pages of 'limit test'): Expected [2, 1] and no further page, "
+          f"Got {[len(page_r), len(page_s)]} and {'no further page' if cursor_s is None else cursor_s}")
+
+    # T12: Test the query cache: a repeat is a hit, a borrow of a shown book invalidates it
+    cache = querycache.attach_query_cache()
+    cache.search("limit test")
+    cache.search("limit test")
+    mainoperations.borrow_book("978-E", "M001")
+    cache.search("limit test")
+    print(f"  T12 (Search, repeat, borrow 978-E, search): Expected 1 hit(s), Got {cache.stats()['hits']} hit(s)")
+    cache.detach()
+
+    # T13: Test operation metrics: every call is counted, failures by their result code
+    mainoperations.reset_stats()
+    mainoperations.return_book("978-E", "M001")
+    mainoperations.return_book("978-E", "M001")
+    return_stats = mainoperations.stats()["return_book"]
+    print(f"  T13 (Return 978-E twice): Expected 2 call(s) {{'NOT_BORROWED': 1}}, "
+          f"Got {return_stats['calls']} call(s) {return_stats['failures_by_reason']}")
+
+    # T14: Test the sharded library: the borrowing limit holds when books and member are on different shards
+    with sharding.ShardedLibrary(2, diagnostics_sink=None) as library:
+        for i in range(4):
+            library.add_book(f"978-S{i}", f"Sharded Title {i}", "Shard Author", "Fiction", 1)
+        library.add_member("M-S", "Shard Reader", "shard.reader@library.test")
+        outcomes = [library.borrow_book(f"978-S{i}", "M-S") for i in range(4)]
+    print(f"  T14 (Sharded, borrow 4 books across 2 shards): Expected [True, True, True, False], Got {outcomes}")
+
+    # T15: Test the SQLite backend: same limit and substring search as the in-memory engine,
+    # including case folding beyond ASCII ('éclair' finds "Éclair", 'CRÈ' finds "crème")
+    with tempfile.TemporaryDirectory() as directory:
+        with sqlitestore.SQLiteLibrary(os.path.join(directory, "library.db"), diagnostics_sink=None) as library:
+            for i in range(4):
+                library.add_book(f"978-Q{i}", f"Stored Title {i}", "Store Author", "Fiction", 1)
+            library.add_book("978-QE", "Éclair au Café crème", "Store Author", "Fiction", 1)
+            library.add_member("M-Q", "Store Reader", "store.reader@library.test")
+            outcomes = [library.borrow_book(f"978-Q{i}", "M-Q") for i in range(4)]
+            matches = len(library.search_books("RED TIT"))
+            accented = [len(library.search_books(query)) for query in ("éclair", "CAFÉ", "CRÈ")]
+    print(f"  T15 (SQLite, borrow 4 books, search 'RED TIT', 'éclair', 'CAFÉ', 'CRÈ'): "
+          f"Expected [True, True, True, False] 4 [1, 1, 1], Got {outcomes} {matches} {accented}")
+
+    # T16: Test the change feed: a borrow and a return arrive as typed events in one batch
+    feed = changefeed.attach_change_feed()
+    subscription = feed.subscribe()
+    mainoperations.borrow_book("978-E", "M001")
+    mainoperations.return_book("978-E", "M001")
+    event_types = [event.type for event in subscription.poll(timeout=0)]
+    print(f"  T16 (Borrow then return 978-E): Expected {[changefeed.LOAN_STARTED, changefeed.LOAN_ENDED]}, "
+          f"Got {event_types}")
+    subscription.close()
+    feed.detach()
+
+    # T17: Test faceted search: available Mystery books by "L Author" (978-C and 978-E are lent out)
+    mainoperations.borrow_book("978-E", "M004")
+    facets = mainoperations.facet_search(genres=["Mystery"], available=True, author="l author")
+    print(f"  T17 (Available Mystery by 'L Author'): Expected ['978-D'] {{True: 1, False: 2}}, "
+          f"Got {[book.isbn for book in facets['books']]} {facets['facets']['available']}")
+    mainoperations.return_book("978-E", "M004")
+
+    # T18: Test snapshots: a snapshot keeps showing 978-D's copies after the book is borrowed
+    store = snapshots.attach_snapshot_store()
+    snapshot = store.snapshot()
+    mainoperations.borrow_book("978-D", "M004")
+    print(f"  T18 (978-D copies in snapshot, then live): Expected 1 0, "
+          f"Got {snapshot.books['978-D']['total_copies']} {store.snapshot().books['978-D']['total_copies']}")
+    mainoperations.return_book("978-D", "M004")
+    store.detach()
+
+    # T19: Test circulation statistics: attaching counts the open loans (978-A by M001, 978-C by M004),
+    # then 978-A is borrowed twice more and 978-D once
+    popularity = circulation.attach_circulation_stats()
+    mainoperations.borrow_book("978-A", "M004")
+    mainoperations.return_book("978-A", "M004")
+    mainoperations.borrow_book("978-A", "M004")
+    mainoperations.borrow_book("978-D", "M004")
+    print(f"  T19 (Most borrowed Fiction, Mystery): Expected [('978-A', 3)] [('978-C', 1), ('978-D', 1)], "
+          f"Got {popularity.most_borrowed(genre='Fiction')} {popularity.most_borrowed(genre='Mystery')}")
+    mainoperations.return_books("M004", ["978-A", "978-D"])
+    popularity.detach()
+
+    # T20: Test copy tracking: restock 978-A (M001 has copy #1) and lend the new copy #3 by barcode
+    mainoperations.update_book("978-A", total_copies=2)
+    mainoperations.borrow_book("978-A", "M004", barcode="978-A#3")
+    print(f"  T20 (Copies of 978-A): Expected [('978-A#1', 'M001'), ('978-A#2', None), ('978-A#3', 'M004')], "
+          f"Got {mainoperations.copies_of('978-A')}")
+    mainoperations.return_book("978-A", "M004", barcode="978-A#3")
+    mainoperations.update_book("978-A", total_copies=1)
+
+    # T21: Test durable storage: log replay, snapshot reload and a torn last log record
+    with tempfile.TemporaryDirectory() as directory:
+        store = persistence.open_store(directory, snapshot_every=0)   # Starts from an empty library
+        mainoperations.add_book("978-P0", "Persisted Title", "Disk Author", "Fiction", 2)
+        mainoperations.add_member("M-P", "Disk Reader", "disk.reader@library.test")
+        store.snapshot()
+        mainoperations.borrow_book("978-P0", "M-P")   # Only in the log
+        store.close()
+        mainoperations.reset_data()
+        store = persistence.open_store(directory)
+        print(f"  T21a (Log replay after a snapshot): Expected ['M-P'] 1, "
+              f"Got {mainoperations.holders_of('978-P0')} {mainoperations.books['978-P0']['total_copies']}")
+
+        store.close(snapshot=True)   # Compacts the log into the snapshot
+        mainoperations.reset_data()
+        store = persistence.open_store(directory)
+        log_path = os.path.join(directory, persistence.LOG_FILE)
+        print(f"  T21b (Snapshot reload, empty log): Expected ['M-P'] ['978-P0'] 0, "
+              f"Got {mainoperations.holders_of('978-P0')} {[book['isbn'] for book in mainoperations.search_books('persisted')]} "
+              f"{os.path.getsize(log_path)}")
+
+        mainoperations.add_book("978-P1", "Logged Title", "Disk Author", "Fiction", 1)
+        store.close()
+        logged_bytes = os.path.getsize(log_path)
+        with open(log_path, "ab") as log_file:
+            log_file.write(b'{"seq":99,"op":"delete_bo')   # A crash in the middle of a write
+        mainoperations.reset_data()
+        store = persistence.open_store(directory)
+        print(f"  T21c (Torn last log record dropped): Expected ['978-P0', '978-P1'] True, "
+              f"Got {sorted(mainoperations.books)} {os.path.getsize(log_path) == logged_bytes}")
+        store.close()
+    mainoperations.reset_data()
+
+    # T22: Test bulk import in batches of 2: bad rows are reported by line (duplicates are caught
+    # across batches too), valid rows inserted, and at most max_rejects details kept
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "books.csv")
+        with open(path, "w", newline="", encoding="utf-8") as csv_file:
+            csv_file.write("isbn,title,author,genre,total_copies\n"
+                           "978-I0,Imported One,Bulk Author,Fiction,2\n"
+                           "978-I1,Imported Two,Bulk Author,Horror,1\n"
+                           "978-I0,Imported Again,Bulk Author,Fiction,1\n"
+                           "978-I2,Imported Three,Bulk Author,Mystery,-1\n"
+                           "978-I3,Imported Four,Bulk Author,Mystery,1\n")
+        report = bulk_import.import_books(path, batch_size=2)
+    rejects = [(reject["line"], reject["key"]) for reject in report["rejects"]]
+    print(f"  T22a (Import 5 book rows, 3 bad): Expected 2 [(3, '978-I1'), (4, '978-I0'), (5, '978-I2')] "
+          f"['978-I0', '978-I3'], Got {report['accepted']} {rejects} {sorted(mainoperations.books)}")
+    report = bulk_import.import_member_rows([
+        {"member_id": "M-I0", "name": "Bulk Reader", "email": "bulk@library.test"},
+        {"member_id": "M-I1", "name": "Bulk Twin", "email": "BULK@library.test"},
+        {"member_id": "M-I0", "name": "Bulk Again", "email": "again@library.test"},
+        {"member_id": "M-I2", "name": "", "email": "blank@library.test"},
+        {"member_id": "M-I3", "name": "Bulk Third", "email": "third@library.test"},
+    ], batch_size=2, max_rejects=2)
+    print(f"  T22b (Import 5 member rows, 3 bad, 2 details kept): Expected 2 3 [2, 3] ['M-I0', 'M-I3'], "
+          f"Got {report['accepted']} {report['rejected']} {[reject['line'] for reject in report['rejects']]} "
+          f"{sorted(mainoperations.members.ids())}")
+
+    # T23: Test thread safety: 8 threads, 2 members each, borrow and return the 2 copies of one book
+    mainoperations.add_book("978-T0", "Threaded Title", "Lock Author", "Fiction", 2)
+    for i in range(16):
+        mainoperations.add_member(f"M-T{i}", f"Thread Reader {i}", f"thread.reader{i}@library.test")
+    peak_loans = []
+
+    def circulate(worker):
+        for round_number in range(2000):
+            member_id = f"M-T{worker * 2 + round_number % 2}"
+            if mainoperations.borrow_book("978-T0", member_id):
+                peak_loans.append(len(mainoperations.holders_of("978-T0")))
+                mainoperations.return_book("978-T0", member_id)
+
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)   # Switch threads as often as possible to provoke races
+    old_sink = mainoperations.set_diagnostics_sink(None)
+    try:
+        workers = [threading.Thread(target=circulate, args=(worker,)) for worker in range(8)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+    finally:
+        sys.setswitchinterval(old_interval)
+        mainoperations.set_diagnostics_sink(old_sink)
+    book = mainoperations.books["978-T0"]
+    print(f"  T23 (Copies after concurrent circulation, at most 2 out): Expected 2 2 "
+          f"[('978-T0#1', None), ('978-T0#2', None)] True, Got {book['total_copies']} {book['original_copies']} "
+          f"{mainoperations.copies_of('978-T0')} {bool(peak_loans) and max(peak_loans) <= 2}")
+
+    # T24: Test the columnar inventory: it follows borrows, returns, updates and deletes
+    if inventory.np is not None:
+        columns = inventory.attach_inventory()
+        mainoperations.borrow_book("978-I0", "M-I0")
+        mainoperations.borrow_book("978-I3", "M-I3")
+        mainoperations.borrow_book("978-I0", "M-I3")
+        mainoperations.return_book("978-I0", "M-I0")
+        mainoperations.update_book("978-T0", genre="Sci-Fi")
+        mainoperations.add_book("978-I4", "Imported Five", "Bulk Author", "Fiction", 3)
+        mainoperations.delete_book("978-I4")
+        # The same report computed by a loop over the records
+        expected = {genre: {"titles": 0, "copies": 0, "available": 0, "on_loan": 0, "fully_checked_out": 0}
+                    for genre in mainoperations.GENRES}
+        for book in mainoperations.books.values():
+            row = expected[book["genre"]]
+            row["titles"] += 1
+            row["copies"] += book["original_copies"]
+            row["available"] += book["total_copies"]
+            row["on_loan"] += book["original_copies"] - book["total_copies"]
+            row["fully_checked_out"] += book["total_copies"] == 0 and book["original_copies"] > 0
+        available = columns.availability_by_genre()
+        print(f"  T24 (Inventory after borrows, a return, an update and a delete): "
+              f"Expected {{'Fiction': 1, 'Sci-Fi': 2, 'Mystery': 0}} 1 {{'Bulk Author': 2}} True, "
+              f"Got {{'Fiction': {available['Fiction']}, 'Sci-Fi': {available['Sci-Fi']}, "
+              f"'Mystery': {available['Mystery']}}} {columns.fully_checked_out_count()} "
+              f"{columns.on_loan_by_author()} {columns.genre_report() == expected}")
+        mainoperations.return_book("978-I3", "M-I3")
+        mainoperations.return_book("978-I0", "M-I3")
+        columns.detach()
+
+    # T25: Test result codes and sinks: the print sink prints each rejection, the buffered sink
+    # writes nothing until flushed and then at most 2 lines (its rate) plus a summary, the quiet sink nothing
+    outcome = mainoperations.borrow_book("978-NONE", "M-I0", detailed=True)
+    printed, buffered = io.StringIO(), io.StringIO()
+    sink = diagnostics.BufferedSink(stream=buffered, max_per_second=2)
+    with contextlib.redirect_stdout(printed):
+        mainoperations.borrow_book("978-I3", "M-NONE")
+        old_sink = mainoperations.set_diagnostics_sink(sink)
+        for _ in range(3):
+            mainoperations.return_book("978-I3", "M-I0")
+        unflushed = buffered.getvalue()
+        sink.close()
+        mainoperations.set_diagnostics_sink(None)
+        quiet = mainoperations.update_book("978-I3", genre="Horror", detailed=True)
+        mainoperations.set_diagnostics_sink(old_sink)
+    print(f"  T25 (Codes, then lines from print, buffered and quiet sinks): Expected NOT_FOUND False 1 '' 3 "
+          f"INVALID_GENRE, Got {outcome.code} {bool(outcome)} {len(printed.getvalue().splitlines())} "
+          f"{unflushed!r} {len(buffered.getvalue().splitlines())} {quiet.code}")
+
+    # T26: Test that only public calls are counted: a refused delete and a return that checks the
+    # member's holds use internal helpers, and the profiler stops at the operation wrappers
+    mainoperations.add_book("978-S0", "Counted Title", "Count Author", "Fiction", 1)
+    mainoperations.add_book("978-S1", "Waited Title", "Count Author", "Fiction", 1)
+    mainoperations.borrow_book("978-S0", "M-I0")
+    mainoperations.borrow_book("978-S1", "M-I3")
+    mainoperations.place_hold("978-S1", "M-I0")
+    mainoperations.reset_stats()
+    profiler = metrics.SamplingProfiler()
+    old_sink = mainoperations.set_diagnostics_sink(None)
+    mainoperations.set_profiler(profiler)
+    mainoperations.delete_book("978-S0")
+    mainoperations.return_book("978-S0", "M-I0")
+    mainoperations.set_profiler(None)
+    mainoperations.set_diagnostics_sink(old_sink)
+    counted = sorted(mainoperations.stats())
+    print(f"  T26 (Calls counted, profiler boundary): Expected ['delete_book', 'return_book'] True, "
+          f"Got {counted} {profiler.boundary is mainoperations.borrow_book.__code__}")
+    mainoperations.cancel_hold("978-S1", "M-I0")
+    mainoperations.return_book("978-S1", "M-I3")
+    mainoperations.delete_book("978-S0")
+    mainoperations.delete_book("978-S1")
+
+    # T27: Test a shard failing mid-borrow: the member's shard has stopped, so the borrow raises and
+    # the copy the book's shard lent in the prepare phase is rolled back
+    with sharding.ShardedLibrary(2, diagnostics_sink=None) as library:
+        isbn = next(f"978-F{i}" for i in range(100) if sharding.shard_index(f"978-F{i}", 2) == 0)
+        member_id = next(f"M-F{i}" for i in range(100) if sharding.shard_index(f"M-F{i}", 2) == 1)
+        library.add_book(isbn, "Stranded Title", "Shard Author", "Fiction", 1)
+        library.add_member(member_id, "Stranded Reader", "stranded.reader@library.test")
+        stopped = library.member_shard(member_id).process
+        stopped.terminate()
+        stopped.join()
+        try:
+            library.borrow_book(isbn, member_id)
+            raised = None
+        except sharding.ShardError as error:
+            raised = type(error).__name__
+        copies = library.get_book(isbn)["total_copies"]
+    print(f"  T27 (Borrow with the member's shard stopped, then copies): Expected ShardError 1, Got {raised} {copies}")
+
+    # T28: Test SQLite copy accounting: with 1 of 2 copies lent, setting the shelf to 1 keeps both owned,
+    # and the book cannot be deleted until the loan is returned
+    with tempfile.TemporaryDirectory() as directory:
+        with sqlitestore.SQLiteLibrary(os.path.join(directory, "library.db"), diagnostics_sink=None) as library:
+            library.add_book("978-Q0", "Counted Copies", "Store Author", "Fiction", 2)
+            library.add_member("M0", "Store Reader", "store.reader@library.test")
+            library.borrow_book("978-Q0", "M0")
+            updated = library.update_book("978-Q0", total_copies=1)
+            stored = library.get_book("978-Q0")
+            refused = library.delete_book("978-Q0", detailed=True)
+            library.return_book("978-Q0", "M0")
+            deleted = library.delete_book("978-Q0")
+    print(f"  T28 (SQLite, update a lent book to 1 copy, delete, return, delete): Expected True 1 2 COPIES_ON_LOAN "
+          f"True, Got {updated} {stored['total_copies']} {stored['original_copies']} {refused.code} {deleted}")
+
+    # T29: Test that ended loans carry their copy's barcode, from a single return and a batch return
+    mainoperations.add_book("978-R0", "Returned Title", "Feed Author", "Fiction", 2)
+    mainoperations.add_book("978-R1", "Returned Again", "Feed Author", "Fiction", 1)
+    mainoperations.borrow_books("M-I0", ["978-R0", "978-R1"])
+    mainoperations.borrow_book("978-R0", "M-I3")
+    feed = changefeed.attach_change_feed()
+    subscription = feed.subscribe()
+    mainoperations.return_book("978-R0", "M-I3")
+    mainoperations.return_books("M-I0", ["978-R0", "978-R1"])
+    ended = [event.data["barcode"] for event in subscription.poll(timeout=0) if event.type == changefeed.LOAN_ENDED]
+    subscription.close()
+    feed.detach()
+    print(f"  T29 (Barcodes of ended loans): Expected ['978-R0#2', '978-R0#1', '978-R1#1'], Got {ended}")
+    mainoperations.delete_book("978-R0")
+    mainoperations.delete_book("978-R1")
+
+    # T30: Test that a title or author that is not a string is rejected before anything changes
+    mainoperations.add_book("978-V0", "Valid Title", "Text Author", "Fiction", 1)
+    before = sorted(mainoperations.books)
+    old_sink = mainoperations.set_diagnostics_sink(None)
+    added = mainoperations.add_book("978-V1", 1984, "Text Author", "Fiction", 1, detailed=True)
+    updated = mainoperations.update_book("978-V0", title="Renamed", author=["Text Author"], detailed=True)
+    mainoperations.set_diagnostics_sink(old_sink)
+    print(f"  T30 (Add and update with a non-string field): Expected INVALID_TEXT INVALID_TEXT True 'Valid Title' 1, "
+          f"Got {added.code} {updated.code} {sorted(mainoperations.books) == before} "
+          f"{mainoperations.books['978-V0']['title']!r} {mainoperations.count_matches('valid title')}")
+    mainoperations.delete_book("978-V0")
+
+    # T31: Test sharded member import: a row rejected for a repeated member ID, or without an email,
+    # leaves no email claimed, so a later member can register that email
+    with sharding.ShardedLibrary(2, diagnostics_sink=None) as library:
+        report = library.import_members([
+            {"member_id": "M-D1", "name": "First Reader", "email": "first.reader@library.test"},
+            {"member_id": "M-D1", "name": "Second Reader", "email": "second.reader@library.test"},
+            {"member_id": "M-D2", "name": "Silent Reader", "email": ""},
+        ])
+        later = library.add_member("M-D3", "Later Reader", "second.reader@library.test")
+        empty_claimed = "" in library._emails
+    print(f"  T31 (Sharded import, 2 bad rows, then reuse the email): Expected 1 2 True False, "
+          f"Got {report['accepted']} {report['rejected']} {later} {empty_claimed}")
+
+    # T32: Test member iteration: looping over members (live or in a snapshot) yields the records
+    # in registration order, while lookups and ids() still use member IDs
+    mainoperations.add_member("M-R1", "Registry First", "registry.first@library.test")
+    mainoperations.add_member("M-R2", "Registry Second", "registry.second@library.test")
+    live = [member["member_id"] for member in mainoperations.members][-2:]
+    store = snapshots.attach_snapshot_store()
+    frozen = [member["member_id"] for member in store.snapshot().members][-2:]
+    store.detach()
+    print(f"  T32 (Iterate members, then look one up): Expected ['M-R1', 'M-R2'] ['M-R1', 'M-R2'] "
+          f"'Registry Second' True, "
+          f"Got {live} {frozen} {mainoperations.members['M-R2']['name']!r} "
+          f"{list(mainoperations.members.ids())[-1] == 'M-R2'}")
+    mainoperations.delete_member("M-R1")
+    mainoperations.delete_member("M-R2")
+
     print("\n" + "="*50)
     print("         TEST SUITE COMPLETE")
     print("="*50)